@@ -72,6 +72,33 @@ let currentViewBounds = null;
     tdi: L.geoJSON(null).addTo(map)
   };
 
+  /* =========================
+     Route LOD (zoom level)
+  ========================= */
+  // metres per screen pixel at the map centre
+  function metresPerPixel() {
+    const lat = map.getCenter().lat * Math.PI / 180;
+    return 156543.03392 * Math.cos(lat) / Math.pow(2, map.getZoom());
+  }
+
+  // coarsest route whose simplification tolerance stays under one pixel
+  function routeForZoom(leg) {
+    const mpp = metresPerPixel();
+    let route = leg.route;
+    (leg.route_lods || []).forEach(lod => {
+      if (lod.tolerance_m <= mpp && lod.route && lod.route.length >= 2) route = lod.route;
+    });
+    return route;
+  }
+
+  map.on("zoomend", () => {
+    layers.tripRoute.eachLayer(group => {
+      group.eachLayer(layer => {
+        if (layer._leg) layer.setLatLngs(routeForZoom(layer._leg));
+      });
+    });
+  });
+
   /* =========================
      Draw OD
   ========================= */
@@ -265,11 +292,12 @@ let currentViewBounds = null;
           : leg.mode === "walk/bike" ? "#15c856ff"
           : "#6b7280";
 
-        const line = L.polyline(leg.route, {
+        const line = L.polyline(routeForZoom(leg), {
           color,
           weight: 3,
           opacity: 0.85
         }).addTo(group).bringToFront();
+        line._leg = leg;
 
         line.on("click", (e) => {
           L.DomEvent.stopPropagation(e);
@@ -601,14 +629,62 @@ let currentViewBounds = null;
   /* =========================
      Load sample JSON
   ========================= */
+  // "json" → {O}_to_{D}.json, "polyline" → {O}_to_{D}.polyline.json
+  // (compact routes, see data/pipeline/route_codec.py)
+  const SAMPLE_FORMAT = "json";
+
+  // encoded polyline → [[lat, lon], ...]
+  function decodePolyline(str, precision) {
+    const factor = Math.pow(10, precision);
+    const coords = [];
+    let index = 0, lat = 0, lon = 0;
+
+    while (index < str.length) {
+      for (let k = 0; k < 2; k++) {
+        let result = 0, shift = 0, b;
+        do {
+          b = str.charCodeAt(index++) - 63;
+          result |= (b & 0x1f) << shift;
+          shift += 5;
+        } while (b >= 0x20);
+        const delta = (result & 1) ? ~(result >> 1) : (result >> 1);
+        if (k === 0) lat += delta;
+        else lon += delta;
+      }
+      coords.push([lat / factor, lon / factor]);
+    }
+    return coords;
+  }
+
+  function decodeSampleRoutes(sampleJson) {
+    const enc = sampleJson.route_encoding;
+    if (!enc) return sampleJson;
+    if (enc.format !== "polyline") {
+      throw new Error(`Unknown route encoding: ${enc.format}`);
+    }
+
+    (sampleJson.linked_trips || []).forEach(lt => {
+      (lt.legs || []).forEach(leg => {
+        [leg, ...(leg.route_lods || [])].forEach(obj => {
+          if (typeof obj.route === "string") {
+            obj.route = decodePolyline(obj.route, enc.precision);
+          }
+        });
+      });
+    });
+    delete sampleJson.route_encoding;
+    return sampleJson;
+  }
+
   async function loadSamplesByOD(originTract, destinationTract) {
-    const filename = `${originTract}_to_${destinationTract}.json`;
+    const suffix = SAMPLE_FORMAT === "polyline" ? ".polyline.json" : ".json";
+    const filename = `${originTract}_to_${destinationTract}${suffix}`;
     const url = `data/samples/${filename}`;
 
     const res = await fetch(url);
     if (!res.ok) throw new Error(`Sample file not found: ${url}`);
 
-    return await res.json();
+    return decodeSampleRoutes(await res.json());
   }
   async function applyODSelection() {
     const o = document.getElementById("originTract").value;
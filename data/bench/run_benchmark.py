@@ -0,0 +1,152 @@
+# ============================================================
+# Build Pipeline Benchmark (synthetic data)
+# - Generates a synthetic BASE_DIR tree once per scale
+# - Runs the sample builder cold (caches / manifest cleared) REPEATS
+#   times; per-stage wall / CPU time and peak RSS from its run report
+# - Result JSON keyed by commit, optional comparison with an older run
+# - Results go outside the source tree (temp dir, or
+#   COMPLETE_TRIP_BENCH_RESULTS to keep them somewhere)
+#
+#   python data/bench/run_benchmark.py [scale] [baseline.json]
+# ============================================================
+
+# =========================
+# CONFIG
+# =========================
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+BUILDER = os.path.join(REPO_DIR, "data", "samples", "select_Jan_remove_far_connection_test.py")
+
+SCALE = sys.argv[1] if len(sys.argv) > 1 else "small"
+COMPARE_TO = sys.argv[2] if len(sys.argv) > 2 else None
+REPEATS = 3
+SEED = 0
+
+DATA_ROOT = os.path.join(tempfile.gettempdir(), "complete_trip_bench", f"{SCALE}-seed{SEED}")
+RESULTS_DIR = os.environ.get(
+    "COMPLETE_TRIP_BENCH_RESULTS",
+    os.path.join(tempfile.gettempdir(), "complete_trip_bench", "results")
+)
+
+# =========================
+# IMPORTS
+# =========================
+import json
+import shutil
+import statistics
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(REPO_DIR, "data", "pipeline"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stage_timer import environment, git_commit
+from synthetic_data import generate
+
+# =========================
+# DATA (generated once per scale / seed)
+# =========================
+summary_path = os.path.join(DATA_ROOT, "synthetic.json")
+if os.path.exists(summary_path):
+    with open(summary_path, "r", encoding="utf-8") as f:
+        data_summary = json.load(f)
+else:
+    shutil.rmtree(DATA_ROOT, ignore_errors=True)
+    print(f"Generating synthetic data ({SCALE}) → {DATA_ROOT}")
+    data_summary = generate(DATA_ROOT, SCALE, seed=SEED)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(data_summary, f, indent=2)
+
+print(f"Synthetic data: {data_summary['legs']:,} legs, {data_summary['links_per_network']:,} links per network")
+
+# =========================
+# RUNS (cold: no tract / network / route caches, no manifest)
+# =========================
+runs = []
+for k in range(REPEATS):
+    shutil.rmtree(os.path.join(DATA_ROOT, "Salt_Lake", "cache"), ignore_errors=True)
+    out_dir = os.path.join(DATA_ROOT, "output")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    report_path = os.path.join(DATA_ROOT, "run_report.json")
+
+    env = dict(
+        os.environ,
+        COMPLETE_TRIP_BASE_DIR=DATA_ROOT,
+        COMPLETE_TRIP_OUTPUT_DIR=out_dir,
+        COMPLETE_TRIP_RUN_REPORT=report_path,
+    )
+    proc = subprocess.run(
+        [sys.executable, BUILDER], cwd=REPO_DIR, env=env,
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Builder failed (run {k + 1}):\n{proc.stdout[-2000:]}\n{proc.stderr[-4000:]}")
+
+    with open(report_path, "r", encoding="utf-8") as f:
+        run = json.load(f)
+    runs.append({"stages": run["stages"], "total": run["total"]})
+    print(f"Run {k + 1}/{REPEATS}: {run['total']['wall_s']:.2f} s")
+
+stages = list(runs[0]["stages"])
+
+
+def median_of(key, stage=None):
+    vals = [
+        (r["total"] if stage is None else r["stages"].get(stage, {})).get(key)
+        for r in runs
+    ]
+    vals = [v for v in vals if v is not None]
+    return round(statistics.median(vals), 6) if vals else None
+
+
+median = {s: median_of("wall_s", s) for s in stages}
+
+# =========================
+# RESULT
+# =========================
+commit, dirty = git_commit(REPO_DIR)
+result = {
+    "schema": "nova.complete_trip.bench.v1",
+    "generated_at": datetime.utcnow().isoformat() + "Z",
+    "commit": commit,
+    "dirty": dirty,
+    "data": data_summary,
+    "environment": environment(),
+    "repeats": REPEATS,
+    "median_s": median,
+    "median_cpu_s": {s: median_of("cpu_s", s) for s in stages},
+    "peak_rss_mb": max((r["total"]["peak_rss_mb"] or 0) for r in runs) or None,
+    "total_median_s": median_of("wall_s"),
+    "runs": runs,
+}
+
+os.makedirs(RESULTS_DIR, exist_ok=True)
+stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+result_path = os.path.join(RESULTS_DIR, f"{stamp}_{(commit or 'nogit')[:10]}_{SCALE}.json")
+with open(result_path, "w", encoding="utf-8") as f:
+    json.dump(result, f, indent=2)
+
+print(f"\n{'stage':<12}{'median s':>12}")
+for s in stages:
+    print(f"{s:<12}{median[s]:>12.3f}")
+print(f"{'total':<12}{result['total_median_s']:>12.3f}")
+print(f"\n✓ Benchmark written → {result_path}")
+
+# =========================
+# COMPARE (optional)
+# =========================
+if COMPARE_TO:
+    with open(COMPARE_TO, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    if base.get("data", {}).get("params") != data_summary["params"]:
+        print("⚠ baseline was run at a different scale; ratios are not comparable")
+
+    print(f"\nvs {(base.get('commit') or 'nogit')[:10]}")
+    print(f"{'stage':<12}{'before':>10}{'after':>10}{'ratio':>8}")
+    for s in stages + ["total"]:
+        before = base["total_median_s"] if s == "total" else base["median_s"].get(s)
+        after = result["total_median_s"] if s == "total" else median[s]
+        if before:
+            print(f"{s:<12}{before:>10.3f}{after:>10.3f}{after / before:>8.2f}")
@@ -0,0 +1,276 @@
+# ============================================================
+# Synthetic BASE_DIR Tree (benchmarks, no private data needed)
+# - Month Parquet files with the builders' trip schema
+# - Matching auto / walk / transit link.csv grid networks
+# - Tract polygon layer (includes the builders' default OD tracts)
+# - Vectorized: scale is set by SCALES, not by Python loops
+# ============================================================
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from shapely import box
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from geohash_codec import encode_geohashes
+
+# =========================
+# CONFIG
+# =========================
+SCALES = {
+    # linked trips per month, grid nodes per side, tract grid (x, y)
+    "small": {"linked_trips": 5_000, "grid": 80, "tracts": (4, 3)},
+    "medium": {"linked_trips": 50_000, "grid": 200, "tracts": (8, 6)},
+    "large": {"linked_trips": 500_000, "grid": 400, "tracts": (16, 12)},
+}
+
+LON0, LAT0 = -111.95, 40.60
+STEP = 0.002                    # deg between grid nodes (~200 m)
+MAX_STEPS = 12                  # links per leg (1..MAX_STEPS)
+FILES_PER_MONTH = 2
+
+# node id bases: OSM ids do not fit in 32 bits, transit ids are small
+NETWORKS = {
+    "auto": ("auto-biggest-connected-graph", "link.csv", "from_osm_node_id", "to_osm_node_id", 9_000_000_000),
+    "walk": ("walk-biggest-connected-graph", "link.csv", "from_osm_node_id", "to_osm_node_id", 5_000_000_000),
+    "transit": ("UTA", "link with flow.csv", "from_node_id", "to_node_id", 100),
+}
+MODES = np.array(["car", "walk/bike", "bus", "rail", "other"])
+MODE_NETWORK = np.array(["auto", "walk", "transit", "transit", "auto"])
+
+# the builders' default OD_PAIRS tracts come first
+GEOIDS = ["49035114000", "49035980000", "49035110106", "49035101402"]
+
+PURPOSES = np.array(["home", "work", "shop", "school", "other"], dtype=object)
+N_STOPS = 200
+
+# noise, as seen in deliveries
+P_BAD_WKT = 0.005
+P_NULL_ROUTE = 0.02
+P_BAD_TOKEN = 0.02
+P_FAR_DEST = 0.03
+P_NEG_DURATION = 0.01
+
+MONTH_NUM = {m: i + 1 for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+)}
+
+TRACT_SHP = "Manuscript/Figure/Visualization-RL/2-OD patterns by census track/six_counties_track.shp"
+
+
+def _pos(i, j):
+    return LON0 + i * STEP, LAT0 + j * STEP
+
+
+# =========================
+# Networks
+# =========================
+def write_networks(root, grid, rng):
+    n = grid
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing="xy")
+    i, j = i.ravel(), j.ravel()
+
+    a_i, a_j, b_i, b_j = [], [], [], []
+    for di, dj in ((1, 0), (0, 1), (-1, 0), (0, -1)):
+        ok = (i + di >= 0) & (i + di < n) & (j + dj >= 0) & (j + dj < n)
+        a_i.append(i[ok]); a_j.append(j[ok]); b_i.append(i[ok] + di); b_j.append(j[ok] + dj)
+    a_i, a_j, b_i, b_j = (np.concatenate(x) for x in (a_i, a_j, b_i, b_j))
+
+    x0, y0 = _pos(a_i, a_j)
+    x1, y1 = _pos(b_i, b_j)
+    xm, ym = (x0 + x1) / 2 + STEP * 0.1, (y0 + y1) / 2
+
+    wkt = [
+        f"LINESTRING ({p!r} {q!r}, {r!r} {s!r}, {t!r} {u!r})"
+        for p, q, r, s, t, u in zip(x0.tolist(), y0.tolist(), xm.tolist(), ym.tolist(), x1.tolist(), y1.tolist())
+    ]
+    wkt = np.array(wkt, dtype=object)
+    wkt[rng.random(len(wkt)) < P_BAD_WKT] = "LINESTRING (bad"
+
+    for folder, name, from_col, to_col, base in NETWORKS.values():
+        out = f"{root}/Salt_Lake/supplementInputs/network/{folder}"
+        os.makedirs(out, exist_ok=True)
+        pd.DataFrame({
+            from_col: base + a_j * n + a_i,
+            to_col: base + b_j * n + b_i,
+            "geometry": wkt,
+        }).to_csv(f"{out}/{name}", index=False)
+
+    return len(wkt)
+
+
+# =========================
+# Tracts
+# =========================
+def write_tracts(root, grid, tracts):
+    tx, ty = tracts
+    x_min, y_min = _pos(-0.5, -0.5)
+    x_max, y_max = _pos(grid - 0.5, grid - 0.5)
+    w, h = (x_max - x_min) / tx, (y_max - y_min) / ty
+
+    cells = [(cx, cy) for cy in range(ty) for cx in range(tx)]
+    geoids = GEOIDS + [f"490351{k:05d}" for k in range(len(cells) - len(GEOIDS))]
+    geoms = [box(x_min + cx * w, y_min + cy * h, x_min + (cx + 1) * w, y_min + (cy + 1) * h) for cx, cy in cells]
+
+    path = f"{root}/{TRACT_SHP}"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gpd.GeoDataFrame({"GEOID": geoids[:len(cells)]}, geometry=geoms, crs="EPSG:4326").to_file(path)
+
+
+# =========================
+# Trips
+# =========================
+def _segment_cumsum(values, seg_sizes):
+    """Exclusive cumulative sum restarting at every segment"""
+    total = np.cumsum(values) - values
+    starts = np.repeat(total[np.cumsum(seg_sizes) - seg_sizes], seg_sizes)
+    return total - starts
+
+
+def month_trips(month, n_linked, grid, rng):
+    """One month of legs as an Arrow table (builders' trip schema)"""
+    # ---- linked trips: legs, steps per leg, monotone staircase walk ----
+    legs_per = rng.choice([1, 1, 2, 3], size=n_linked)
+    n_legs = int(legs_per.sum())
+    trip_of_leg = np.repeat(np.arange(n_linked), legs_per)
+    steps = rng.integers(1, MAX_STEPS + 1, size=n_legs)
+
+    total_steps = np.bincount(trip_of_leg, weights=steps, minlength=n_linked).astype(np.int64)
+    sx = rng.choice([-1, 1], size=n_linked)
+    sy = rng.choice([-1, 1], size=n_linked)
+    span = grid - 1 - total_steps
+    i0 = np.where(sx > 0, 0, total_steps) + (rng.random(n_linked) * (span + 1)).astype(np.int64)
+    j0 = np.where(sy > 0, 0, total_steps) + (rng.random(n_linked) * (span + 1)).astype(np.int64)
+
+    # ---- node positions: trip t has total_steps[t] + 1 nodes ----
+    nodes_per_trip = total_steps + 1
+    node_trip = np.repeat(np.arange(n_linked), nodes_per_trip)
+    is_first = np.zeros(len(node_trip), dtype=bool)
+    is_first[np.cumsum(nodes_per_trip) - nodes_per_trip] = True
+    x_axis = rng.random(len(node_trip)) < 0.5
+    di = np.where(is_first, 0, np.where(x_axis, sx[node_trip], 0))
+    dj = np.where(is_first, 0, np.where(x_axis, 0, sy[node_trip]))
+    node_i = i0[node_trip] + _segment_cumsum(di, nodes_per_trip) + di
+    node_j = j0[node_trip] + _segment_cumsum(dj, nodes_per_trip) + dj
+
+    # ---- legs: consecutive slices of the walk sharing end nodes ----
+    trip_base = np.cumsum(nodes_per_trip) - nodes_per_trip
+    leg_first = trip_base[trip_of_leg] + _segment_cumsum(steps, legs_per)
+    leg_nodes = steps + 1
+    leg_of_node = np.repeat(np.arange(n_legs), leg_nodes)
+    node_idx = np.repeat(leg_first, leg_nodes) + _segment_cumsum(np.ones(int(leg_nodes.sum()), dtype=np.int64), leg_nodes)
+
+    mode = rng.integers(0, len(MODES), size=n_legs)
+    base = np.array([NETWORKS[net][4] for net in MODE_NETWORK], dtype=np.int64)[mode]
+    ids = base[leg_of_node] + node_j[node_idx] * grid + node_i[node_idx]
+
+    offsets = np.concatenate([[0], np.cumsum(leg_nodes)]).astype(np.int32)
+    tokens = pa.ListArray.from_arrays(pa.array(offsets), pa.array(ids).cast(pa.string()))
+    route = pc.binary_join(tokens, ",").to_numpy(zero_copy_only=False).astype(object)
+
+    bad = rng.random(n_legs) < P_BAD_TOKEN
+    route[bad] = ["x12," + r for r in route[bad]]
+    route[rng.random(n_legs) < P_NULL_ROUTE] = None
+
+    # ---- anchors: geohash7 near the route ends ----
+    first_node = node_idx[np.cumsum(leg_nodes) - leg_nodes]
+    last_node = node_idx[np.cumsum(leg_nodes) - 1]
+    ox, oy = _pos(node_i[first_node], node_j[first_node])
+    dx, dy = _pos(node_i[last_node], node_j[last_node])
+    dx = dx + np.where(rng.random(n_legs) < P_FAR_DEST, 0.05, 0.0)
+    jitter = STEP * 0.3
+    gh_o = encode_geohashes(oy + rng.uniform(-jitter, jitter, n_legs), ox + rng.uniform(-jitter, jitter, n_legs))
+    gh_d = encode_geohashes(dy + rng.uniform(-jitter, jitter, n_legs), dx + rng.uniform(-jitter, jitter, n_legs))
+
+    # ---- times: legs follow each other inside a linked trip ----
+    dur_s = rng.integers(60, 90 * 60, size=n_legs)
+    dur_s[rng.random(n_legs) < P_NEG_DURATION] *= -1
+    gap_s = rng.integers(60, 20 * 60, size=n_legs)
+    month_start = np.datetime64(f"2020-{month:02d}-01T00:00:00", "ns")
+    trip_start = month_start + (rng.random(n_linked) * 27 * 86400).astype("timedelta64[s]")
+    offset_s = _segment_cumsum(np.abs(dur_s) + gap_s, legs_per)
+    start = trip_start[trip_of_leg] + offset_s.astype("timedelta64[s]")
+    end = start + dur_s.astype("timedelta64[s]")
+
+    # ---- ids / labels ----
+    lt = pd.Series(np.arange(n_linked)).astype(str).str.zfill(7).radd(f"LT{month:02d}_").to_numpy()
+    leg_index = _segment_cumsum(np.ones(n_legs, dtype=np.int64), legs_per)
+    transit = MODE_NETWORK[mode] == "transit"
+    stop_a = rng.integers(0, N_STOPS, size=n_legs)
+    stop_e = rng.integers(0, N_STOPS, size=n_legs)
+    stop_names = np.array([f"Stop {k}" for k in range(N_STOPS)], dtype=object)
+
+    def maybe(values, keep):
+        out = np.asarray(values, dtype=object).copy()
+        out[~keep] = None
+        return out
+
+    def maybe_num(values, keep):
+        return np.where(keep, values, np.nan).astype(np.float64)
+
+    weight = rng.uniform(1, 30, size=n_legs)
+
+    return pa.table({
+        "linked_trip_id": pa.array(lt[trip_of_leg], type=pa.string()),
+        "trip_id": pa.array(lt[trip_of_leg] + "_" + leg_index.astype(str).astype(object), type=pa.string()),
+        "tour_id": pa.array(("T" + pd.Series(np.arange(n_linked) // 3).astype(str)).to_numpy()[trip_of_leg], type=pa.string()),
+        "travel_mode": pa.array(MODES[mode], type=pa.string()),
+        "local_datetime_start": pa.array(start, type=pa.timestamp("ns")),
+        "local_datetime_end": pa.array(end, type=pa.timestamp("ns")),
+        "network_distance": pa.array(steps * STEP * 69.0 * rng.uniform(0.9, 1.2, size=n_legs)),
+        "route_distance": pa.array(maybe_num(steps * STEP * 69.0, rng.random(n_legs) < 0.5)),
+        "geohash7_orig": pa.array(gh_o, type=pa.string()),
+        "geohash7_dest": pa.array(gh_d, type=pa.string()),
+        "access_stop": pa.array(maybe(stop_names[stop_a], transit), type=pa.string()),
+        "access_stop_id": pa.array(maybe_num(stop_a.astype(np.float64), transit)),
+        "egress_stop": pa.array(maybe(stop_names[stop_e], transit), type=pa.string()),
+        "egress_stop_id": pa.array(maybe_num(stop_e.astype(np.float64), transit)),
+        "trip_purpose": pa.array(maybe(PURPOSES[rng.integers(0, len(PURPOSES), size=n_legs)], rng.random(n_legs) < 0.75), type=pa.string()),
+        "trip_weight": pa.array(maybe_num(weight, rng.random(n_legs) < 0.9)),
+        "route_taken": pa.array(route, type=pa.string()),
+    })
+
+
+# =========================
+# Tree
+# =========================
+def generate(root, scale="small", months=("Jan",), seed=0):
+    """Write a synthetic BASE_DIR tree under root → summary dict"""
+    params = SCALES[scale] if isinstance(scale, str) else scale
+    rng = np.random.default_rng(seed)
+    grid = params["grid"]
+    if grid <= 3 * MAX_STEPS:
+        raise ValueError(f"grid must be > {3 * MAX_STEPS} nodes per side")
+
+    n_links = write_networks(root, grid, rng)
+    write_tracts(root, grid, params["tracts"])
+
+    n_legs = 0
+    for m in months:
+        table = month_trips(MONTH_NUM[m], params["linked_trips"], grid, rng)
+        n_legs += table.num_rows
+        out = f"{root}/Salt_Lake/delivery/Salt_Lake-{m}-2020"
+        os.makedirs(out, exist_ok=True)
+        step = -(-table.num_rows // FILES_PER_MONTH)
+        for k in range(FILES_PER_MONTH):
+            pq.write_table(table.slice(k * step, step), f"{out}/part-{k:05d}.snappy.parquet", compression="snappy")
+
+    return {
+        "scale": scale if isinstance(scale, str) else "custom",
+        "params": params,
+        "months": list(months),
+        "seed": seed,
+        "legs": n_legs,
+        "links_per_network": n_links,
+    }
+
+
+if __name__ == "__main__":
+    # python data/bench/synthetic_data.py <root> [scale]
+    print(generate(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "small"))
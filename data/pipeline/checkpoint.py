@@ -0,0 +1,166 @@
+# ============================================================
+# Checkpointed Stage Pipeline (resumable builds)
+# - Named stages run in order; each stage's output is written to
+#   Parquet (GeoParquet for GeoDataFrames) under a cache directory
+# - A checkpoint is valid only for the run key it was written with
+#   (input digests + build params), so stale artifacts are never reused
+# - Reruns skip the longest prefix of stages with valid checkpoints and
+#   load only the outputs the remaining stages need
+# - Data file written atomically, metadata written last
+# ============================================================
+
+import inspect
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import geopandas as gpd
+
+# bump when a stage's output layout changes (old checkpoints are ignored)
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointPipeline:
+    """
+    pipe = CheckpointPipeline(cache_dir, key=params_hash(...), timer=timer)
+
+    @pipe.stage("load")
+    def load():
+        return df
+
+    @pipe.stage("geometry")
+    def geometry(load):                 # parameters = upstream stage names
+        return gdf
+
+    @pipe.stage("assembly", to_frame=encode, from_frame=decode)
+    def assembly(geometry):             # non-DataFrame output + codec
+        return buckets
+
+    @pipe.stage("export", checkpoint=False)
+    def export(assembly):
+        ...
+
+    results = pipe.run()
+
+    Stage functions only see the outputs they name; an output that is not
+    in memory (stage skipped on resume) is read from its checkpoint.
+    """
+
+    def __init__(self, cache_dir, key, timer=None):
+        self.cache_dir = cache_dir
+        self.key = f"v{CHECKPOINT_VERSION}:{key}"
+        self.timer = timer
+        self.stages = []
+        self._specs = {}
+
+    def stage(self, name, checkpoint=True, to_frame=None, from_frame=None):
+        def register(fn):
+            inputs = list(inspect.signature(fn).parameters)
+            unknown = [p for p in inputs if p not in self._specs]
+            if unknown:
+                raise ValueError(f"stage {name!r} depends on unknown stages {unknown}")
+
+            self.stages.append(name)
+            self._specs[name] = {
+                "fn": fn, "inputs": inputs, "checkpoint": checkpoint,
+                "to_frame": to_frame, "from_frame": from_frame,
+            }
+            return fn
+        return register
+
+    # =========================
+    # Checkpoint files
+    # =========================
+    def _paths(self, name):
+        base = os.path.join(self.cache_dir, name)
+        return f"{base}.parquet", f"{base}.json"
+
+    def valid(self, name):
+        """Checkpoint exists, is complete and was written for this run key"""
+        data_path, meta_path = self._paths(name)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get("key") == self.key and meta.get("size") == os.path.getsize(data_path)
+
+    def save(self, name, output):
+        spec = self._specs[name]
+        frame = spec["to_frame"](output) if spec["to_frame"] else output
+        data_path, meta_path = self._paths(name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # metadata of an older run must not vouch for a half-written file
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        tmp = f"{data_path}.tmp"
+        frame.to_parquet(tmp)
+        os.replace(tmp, data_path)
+
+        meta = {
+            "key": self.key,
+            "stage": name,
+            "format": "geoparquet" if isinstance(frame, gpd.GeoDataFrame) else "parquet",
+            "rows": len(frame),
+            "size": os.path.getsize(data_path),
+            "written_at": datetime.utcnow().isoformat() + "Z",
+        }
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def load(self, name):
+        spec = self._specs[name]
+        data_path, meta_path = self._paths(name)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            fmt = json.load(f)["format"]
+
+        frame = gpd.read_parquet(data_path) if fmt == "geoparquet" else pd.read_parquet(data_path)
+        return spec["from_frame"](frame) if spec["from_frame"] else frame
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    # =========================
+    # Run
+    # =========================
+    def resume_index(self):
+        """Index of the first stage to run (after the valid checkpoint prefix)"""
+        for i, name in enumerate(self.stages):
+            if not (self._specs[name]["checkpoint"] and self.valid(name)):
+                return i
+        return len(self.stages)
+
+    def _timed(self, label, fn, *args):
+        if self.timer is not None:
+            self.timer.start(label)
+        out = fn(*args)
+        if self.timer is not None:
+            self.timer.stop(rows_out=len(out) if hasattr(out, "__len__") else None)
+        return out
+
+    def run(self):
+        """Run the stages after the last valid checkpoint; {stage: output} of the run"""
+        start = self.resume_index()
+        if start:
+            print(f"Resuming after checkpoint '{self.stages[start - 1]}' ({self.cache_dir})")
+
+        results = {}
+        for name in self.stages[start:]:
+            spec = self._specs[name]
+            for dep in spec["inputs"]:
+                if dep not in results:
+                    results[dep] = self._timed("checkpoint", self.load, dep)
+
+            results[name] = spec["fn"](*(results[dep] for dep in spec["inputs"]))
+
+            if spec["checkpoint"]:
+                self._timed("checkpoint", self.save, name, results[name])
+
+        return results
@@ -0,0 +1,215 @@
+# ============================================================
+# Batch Geohash Decoder / Encoder (NumPy, bit operations)
+# - Whole columns at once: list / ndarray / Series / Arrow
+# - Same values as pgh.decode (or exact cell centres)
+# - Invalid / null geohash → NaN (never raises)
+# - Encoder: same strings as pgh.encode (same bisection)
+# - Integer prefix keys (first p characters) for cell lookups
+# ============================================================
+
+import math
+
+import numpy as np
+import pyarrow as pa
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+
+# byte → base32 value, -1 for anything else
+_LUT = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate(_BASE32):
+    _LUT[ord(_c)] = _i
+
+
+# pgh.decode keeps max(1, round(-log10(err))) - 1 decimals
+def _decimals(err):
+    return max(1, int(round(-math.log10(err)))) - 1
+
+
+_MAX_BITS = 5 * MAX_PRECISION
+_LAT_DECIMALS = np.array([_decimals(90.0 / 2 ** (b // 2)) for b in range(0, _MAX_BITS + 1, 5)])
+_LON_DECIMALS = np.array([_decimals(180.0 / 2 ** ((b + 1) // 2)) for b in range(0, _MAX_BITS + 1, 5)])
+
+
+# =========================
+# Input → Arrow string array
+# =========================
+def to_arrow(geohashes):
+    """Any geohash column → Arrow string array (Arrow-backed pandas columns zero-copy)"""
+    ext = getattr(geohashes, "array", None)     # pandas Series / Index
+    if hasattr(ext, "__arrow_array__"):
+        geohashes = pa.array(ext)
+    if isinstance(geohashes, pa.ChunkedArray):
+        geohashes = geohashes.combine_chunks()
+    if isinstance(geohashes, pa.Array):
+        return geohashes.cast(pa.string())
+
+    values = np.asarray(geohashes, dtype=object)
+    try:
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([g if isinstance(g, str) else None for g in values], type=pa.string())
+
+
+def _char_matrix(arr):
+    """Arrow strings → (n, 12) base32 codes (-1 = invalid), lengths"""
+    n = len(arr)
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int32)[arr.offset:arr.offset + n + 1]
+    data = arr.buffers()[2]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+
+    lengths = np.diff(offsets).astype(np.int64)
+    cols = np.arange(MAX_PRECISION)
+    inside = cols[None, :] < lengths[:, None]
+
+    pos = offsets[:-1, None].astype(np.int64) + cols[None, :]
+    pos = np.where(inside, pos, 0)
+    raw = data[pos] if len(data) else np.zeros(pos.shape, dtype=np.uint8)
+
+    codes = np.where(inside, _LUT[raw], 0)
+    return codes, lengths
+
+
+def _round_like_pgh(num, bits, decimals):
+    """num / 2**bits rounded half-even to `decimals` places, exactly like '%.*f'"""
+    scale = 10 ** decimals
+    den = np.left_shift(1, bits)
+    q, r = np.divmod(num * scale, den)
+    q = q + ((2 * r > den) | ((2 * r == den) & (q % 2 == 1)))
+    out = q / scale
+    # '%.2f' % -0.001 == '-0.00'
+    return np.where((q == 0) & (num < 0), -0.0, out)
+
+
+# =========================
+# Decode
+# =========================
+def decode_geohashes(geohashes, exact=False):
+    """
+    Decode a column of geohashes → (lat, lon) float64 arrays.
+
+    exact=False matches pgh.decode (value rounded to the known decimals);
+    exact=True returns the cell centre (pgh.decode_exactly).
+    Null, empty, over-long or non-base32 geohashes give NaN.
+    """
+    arr = to_arrow(geohashes)
+    n = len(arr)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    if n == 0:
+        return lat, lon
+
+    codes, lengths = _char_matrix(arr)
+    valid = (
+        ~arr.is_null().to_numpy(zero_copy_only=False)
+        & (lengths >= 1) & (lengths <= MAX_PRECISION)
+        & (codes >= 0).all(axis=1)
+    )
+
+    codes = codes[valid]
+    lengths = lengths[valid]
+
+    # ---- de-interleave: even bits → lon, odd bits → lat ----
+    lat_int = np.zeros(len(codes), dtype=np.int64)
+    lon_int = np.zeros(len(codes), dtype=np.int64)
+    for j in range(int(lengths.max(initial=0))):
+        active = j < lengths
+        cd = codes[:, j]
+        for k in range(5):
+            bit = (cd >> (4 - k)) & 1
+            if (5 * j + k) % 2 == 0:
+                lon_int = np.where(active, (lon_int << 1) | bit, lon_int)
+            else:
+                lat_int = np.where(active, (lat_int << 1) | bit, lat_int)
+
+    total_bits = 5 * lengths
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+
+    # centre = num / 2**bits with an integer numerator (exact in float64)
+    lat_num = (2 * lat_int + 1) * 90 - 90 * np.left_shift(1, lat_bits)
+    lon_num = (2 * lon_int + 1) * 180 - 180 * np.left_shift(1, lon_bits)
+
+    if exact:
+        lat[valid] = lat_num / np.left_shift(1, lat_bits).astype(np.float64)
+        lon[valid] = lon_num / np.left_shift(1, lon_bits).astype(np.float64)
+    else:
+        lat[valid] = _round_like_pgh(lat_num, lat_bits, _LAT_DECIMALS[lengths])
+        lon[valid] = _round_like_pgh(lon_num, lon_bits, _LON_DECIMALS[lengths])
+
+    return lat, lon
+
+
+def decode_rounding(precision):
+    """
+    Largest (lat, lon) distance in degrees between decode_geohashes()
+    of a geohash of this length and the exact centre of its cell
+    """
+    return 0.5 * 10.0 ** -_LAT_DECIMALS[precision], 0.5 * 10.0 ** -_LON_DECIMALS[precision]
+
+
+# =========================
+# Prefix keys
+# =========================
+def prefix_keys(geohashes, precisions):
+    """
+    {p: int64 key of the first p characters} for every p in precisions
+    (base32 digits concatenated = the interleaved lon / lat bits), plus the
+    geohash lengths (0 for null). Geohashes that decode to NaN (null,
+    over-long, any non-base32 character) or are shorter than p get key -1.
+    """
+    arr = to_arrow(geohashes)
+    codes, lengths = _char_matrix(arr)
+    lengths = np.where(arr.is_null().to_numpy(zero_copy_only=False), 0, lengths)
+    ok = (lengths <= MAX_PRECISION) & (codes >= 0).all(axis=1)
+
+    keys = {}
+    key = np.zeros(len(arr), dtype=np.int64)
+    for j in range(max(precisions)):
+        key = (key << 5) | np.maximum(codes[:, j], 0)
+        if j + 1 in precisions:
+            keys[j + 1] = np.where(ok & (lengths >= j + 1), key, -1)
+    return keys, lengths
+
+
+# =========================
+# Encode
+# =========================
+def encode_geohashes(lat, lon, precision=7):
+    """(lat, lon) arrays → object array of geohash strings, same as pgh.encode"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+
+    lat_lo, lat_hi = np.full(n, -90.0), np.full(n, 90.0)
+    lon_lo, lon_hi = np.full(n, -180.0), np.full(n, 180.0)
+    codes = np.zeros((n, precision), dtype=np.int64)
+
+    # bits alternate lon / lat; upper half when strictly above the midpoint
+    for b in range(5 * precision):
+        if b % 2 == 0:
+            mid = (lon_lo + lon_hi) / 2
+            bit = lon > mid
+            lon_lo = np.where(bit, mid, lon_lo)
+            lon_hi = np.where(bit, lon_hi, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            bit = lat > mid
+            lat_lo = np.where(bit, mid, lat_lo)
+            lat_hi = np.where(bit, lat_hi, mid)
+        codes[:, b // 5] |= bit.astype(np.int64) << (4 - b % 5)
+
+    return _strings(codes)
+
+
+def geohashes_from_keys(keys, precision):
+    """prefix_keys() values of length `precision` → object array of geohash strings"""
+    keys = np.asarray(keys, dtype=np.int64)
+    shifts = 5 * np.arange(precision - 1, -1, -1)
+    return _strings((keys[:, None] >> shifts) & 31)
+
+
+def _strings(codes):
+    """(n, p) base32 values → object array of strings"""
+    chars = np.frombuffer(_BASE32.encode("ascii"), dtype=np.uint8)[codes]
+    return np.array(chars.view(f"S{codes.shape[1]}").ravel().astype(str), dtype=object)
@@ -0,0 +1,357 @@
+# ============================================================
+# Route Geometry Engine
+# - Parse every link WKT ONCE into flat coordinate arrays
+# - Links keyed by packed int64 node-pair codes (searchsorted lookup),
+#   cached as .npy and memory-mapped on later runs
+# - route_taken column → flat node array + offsets (Arrow compute)
+# - Assemble leg LineStrings with batched gathers
+# - Optional content-keyed cache of repeated routes (route_cache.py)
+# - Same coordinates as the old per-row build_geometry
+# ============================================================
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import shapely
+
+from route_cache import route_key
+
+# travel_mode → network key (same mapping as the old build_geometry)
+MODE_NETWORK = {
+    "car": "auto",
+    "walk/bike": "walk",
+    "bus": "transit",
+    "rail": "transit",
+}
+
+# legs per Arrow string array (keeps each block's text well under 2 GB)
+ROUTE_PARSE_BLOCK = 1_000_000
+
+# geometry types that expose .coords (Point, LineString, LinearRing)
+_COORD_TYPES = (0, 1, 2)
+
+
+# =========================
+# ROUTE PARSING
+# =========================
+def parse_route_nodes(route_taken):
+    """Comma-separated route_taken → list of int node ids (malformed tokens dropped)"""
+    return [int(x) for x in str(route_taken).split(",") if x.strip().isdigit()]
+
+
+def _parse_route_block(text):
+    tokens = pc.split_pattern(pa.array(text, type=pa.string()), ",")
+
+    flat = pc.utf8_trim_whitespace(tokens.flatten())
+    valid = pc.utf8_is_digit(flat).to_numpy(zero_copy_only=False)
+    token_leg = pc.list_parent_indices(tokens).to_numpy()
+
+    digits = flat.filter(pa.array(valid))
+    if pc.all(pc.string_is_ascii(digits)).as_py() is False:
+        # non-ASCII digits (rare): Python int() like parse_route_nodes
+        nodes = np.array([int(x) for x in digits.to_pylist()], dtype=np.int64)
+    else:
+        nodes = pc.cast(digits, pa.int64()).to_numpy(zero_copy_only=False)
+
+    return nodes, np.bincount(token_leg[valid], minlength=len(text))
+
+
+def parse_route_column(routes, block=ROUTE_PARSE_BLOCK):
+    """
+    Whole route_taken column → (nodes, offsets): leg i's node ids are
+    nodes[offsets[i]:offsets[i + 1]]. Same rules as parse_route_nodes
+    (str() of non-strings, tokens kept when strip().isdigit()).
+    """
+    text = [r if isinstance(r, str) else str(r) for r in routes]
+
+    nodes, counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for i in range(0, len(text), block):
+        n, c = _parse_route_block(text[i:i + block])
+        nodes.append(n)
+        counts.append(c)
+
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))]).astype(np.int64)
+    return np.concatenate(nodes).astype(np.int64), offsets
+
+
+def route_node_pairs(nodes, offsets):
+    """Consecutive node pairs inside every leg → (a, b, leg index)"""
+    node_leg = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    same_leg = node_leg[:-1] == node_leg[1:]
+    return nodes[:-1][same_leg], nodes[1:][same_leg], node_leg[:-1][same_leg]
+
+
+# =========================
+# LINK TABLE
+# =========================
+def _pack(a, b):
+    """Two int32 node codes → one sortable int64 key"""
+    return (a.astype(np.int64) << 32) | b.astype(np.int64)
+
+
+class LinkGeometryTable:
+    """
+    All link geometries of one network as a single (N, 2) coordinate array.
+
+    nodes:   sorted unique node ids (int64); a node's code = its position
+    keys:    sorted packed (from_code << 32 | to_code), one per link
+    offsets: link i owns coords[offsets[i]:offsets[i + 1]]
+
+    Node ids are coded first because OSM ids do not fit in 32 bits. Links
+    whose WKT cannot be parsed (or has no .coords) own an empty range,
+    which matches the old `except: continue`. All four arrays can be
+    memory-mapped (see cached).
+    """
+
+    _ARRAYS = ("nodes", "keys", "offsets", "coords")
+    _FORMAT = 1
+
+    def __init__(self, nodes, keys, offsets, coords):
+        self.nodes = nodes
+        self.keys = keys
+        self.offsets = offsets
+        self.coords = coords
+
+    # =========================
+    # Build
+    # =========================
+    @classmethod
+    def from_wkt(cls, from_nodes, to_nodes, wkts):
+        a = np.asarray(from_nodes, dtype=np.int64)
+        b = np.asarray(to_nodes, dtype=np.int64)
+
+        nodes = np.unique(np.concatenate([a, b]))
+        keys = _pack(np.searchsorted(nodes, a), np.searchsorted(nodes, b))
+
+        # dict comprehension semantics: last duplicate wins
+        keep = ~pd.Series(keys).duplicated(keep="last").to_numpy()
+        order = np.flatnonzero(keep)[np.argsort(keys[keep], kind="stable")]
+
+        wkts = np.asarray(wkts, dtype=object)[order]
+        wkts = np.array([w if isinstance(w, str) else None for w in wkts], dtype=object)
+
+        geoms = shapely.from_wkt(wkts, on_invalid="ignore")
+        geoms[~np.isin(shapely.get_type_id(geoms), _COORD_TYPES)] = None
+
+        coords, owner = shapely.get_coordinates(geoms, return_index=True)
+        counts = np.bincount(owner, minlength=len(geoms))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(nodes, keys[order], offsets, coords)
+
+    @classmethod
+    def from_csv(cls, path, from_col, to_col):
+        links = pd.read_csv(path, usecols=[from_col, to_col, "geometry"])
+        return cls.from_wkt(links[from_col], links[to_col], links["geometry"])
+
+    # =========================
+    # IO
+    # =========================
+    def save(self, cache_dir, meta=None):
+        """One .npy per array + meta.json (written last = cache complete)"""
+        os.makedirs(cache_dir, exist_ok=True)
+        meta_path = os.path.join(cache_dir, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        for name in self._ARRAYS:
+            np.save(os.path.join(cache_dir, f"{name}.npy"), getattr(self, name))
+
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"format": self._FORMAT, **(meta or {})}, f, indent=2)
+
+    @classmethod
+    def load(cls, cache_dir, mmap_mode="r"):
+        return cls(*(
+            np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls._ARRAYS
+        ))
+
+    @classmethod
+    def cached(cls, path, from_col, to_col, cache_dir):
+        """
+        Memory-mapped table for a link CSV; parsed (and the cache written)
+        only when the CSV's size / mtime or the columns changed.
+        """
+        st = os.stat(path)
+        meta = {
+            "format": cls._FORMAT,
+            "source": os.path.normpath(path),
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "columns": [from_col, to_col],
+        }
+
+        meta_path = os.path.join(cache_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f) == meta:
+                    return cls.load(cache_dir)
+
+        cls.from_csv(path, from_col, to_col).save(cache_dir, meta)
+        return cls.load(cache_dir)
+
+    # =========================
+    # Lookup
+    # =========================
+    def __len__(self):
+        return len(self.keys)
+
+    def _codes(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.nodes, ids), max(len(self.nodes) - 1, 0))
+        found = self.nodes[pos] == ids if len(self.nodes) else np.zeros(len(ids), dtype=bool)
+        return pos, found
+
+    def lookup(self, a, b):
+        """Link index for each (a, b) node pair, -1 when the link is unknown"""
+        if len(a) == 0 or len(self.keys) == 0:
+            return np.full(len(a), -1, dtype=np.int64)
+
+        ca, fa = self._codes(a)
+        cb, fb = self._codes(b)
+        key = _pack(ca, cb)
+
+        pos = np.minimum(np.searchsorted(self.keys, key), len(self.keys) - 1)
+        hit = fa & fb & (self.keys[pos] == key)
+        return np.where(hit, pos, -1).astype(np.int64)
+
+
+# =========================
+# ENGINE
+# =========================
+class RouteGeometryEngine:
+    """
+    Builds leg LineStrings for whole columns of (travel_mode, route_taken).
+
+    networks: {"auto": LinkGeometryTable, "walk": ..., "transit": ...}
+    """
+
+    def __init__(self, networks, mode_network=MODE_NETWORK):
+        self.mode_network = dict(mode_network)
+        self.network_names = list(networks)
+        # coordinates stay per network: no stacked copy, so memory-mapped
+        # tables are only paged in where legs actually use them
+        self.networks = networks
+
+    def build(self, modes, routes, cache=None):
+        """
+        Object array of LineString (or None) aligned with the input legs.
+
+        cache: optional RouteGeometryCache; then every distinct
+        (network, node sequence) is built at most once and kept for
+        later calls / runs.
+        """
+        if cache is None:
+            return self._build(modes, routes)
+
+        modes = np.asarray(modes, dtype=object)
+        out = np.full(len(modes), None, dtype=object)
+        nets = np.array(
+            [self.mode_network.get(m) if isinstance(m, str) else None for m in modes],
+            dtype=object,
+        )
+        legs = np.flatnonzero([net in self.networks for net in nets])
+        if len(legs) == 0:
+            return out
+
+        # ---- distinct (network, route_taken) → node sequence → key ----
+        text = pd.Series([r if isinstance(r, str) else str(r) for r in np.asarray(routes, dtype=object)[legs]])
+        codes, _ = pd.factorize(pd.Series(nets[legs]).astype(str) + "\x1f" + text)
+        first = np.unique(codes, return_index=True)[1]
+        u_mode = modes[legs[first]]
+        u_net = nets[legs[first]]
+        u_text = text.to_numpy(dtype=object)[first]
+
+        nodes, offsets = parse_route_column(u_text)
+        keys = [route_key(net, nodes[offsets[i]:offsets[i + 1]]) for i, net in enumerate(u_net)]
+
+        # ---- cache lookups; build each missing key once ----
+        geoms = np.full(len(keys), None, dtype=object)
+        pending = {}
+        for i, key in enumerate(keys):
+            if key in cache:
+                geoms[i] = cache.get(key)
+            else:
+                pending.setdefault(key, []).append(i)
+
+        if pending:
+            rep = [idx[0] for idx in pending.values()]
+            built = self._build(u_mode[rep], u_text[rep])
+            for (key, idx), geom in zip(pending.items(), built):
+                cache.put(key, geom)
+                geoms[idx] = geom
+
+        cache.misses += len(pending)
+        cache.hits += len(legs) - len(pending)
+
+        out[legs] = geoms[codes]
+        return out
+
+    def _build(self, modes, routes):
+        modes = np.asarray(modes, dtype=object)
+
+        n = len(modes)
+        out = np.full(n, None, dtype=object)
+        if n == 0:
+            return out
+
+        # ---- nodes: flat array + offsets → consecutive pairs per leg ----
+        a, b, pair_leg = route_node_pairs(*parse_route_column(routes))
+
+        # ---- pair → link id inside its network ----
+        leg_net = np.array(
+            [self.mode_network.get(m) if isinstance(m, str) else None for m in modes],
+            dtype=object,
+        )
+        pair_net = leg_net[pair_leg]
+        link = np.full(len(pair_leg), -1, dtype=np.int64)
+        net = np.full(len(pair_leg), -1, dtype=np.int64)
+
+        for i, name in enumerate(self.network_names):
+            mask = pair_net == name
+            if not mask.any():
+                continue
+            link[mask] = self.networks[name].lookup(a[mask], b[mask])
+            net[mask] = i
+
+        found = link >= 0
+        link = link[found]
+        net = net[found]
+        pair_leg = pair_leg[found]
+
+        # ---- gather coordinates of all links, in leg/pair order ----
+        starts = np.zeros(len(link), dtype=np.int64)
+        lens = np.zeros(len(link), dtype=np.int64)
+        for i, name in enumerate(self.network_names):
+            mask = net == i
+            offsets = self.networks[name].offsets
+            starts[mask] = offsets[link[mask]]
+            lens[mask] = offsets[link[mask] + 1] - starts[mask]
+
+        total = int(lens.sum())
+        seg_start = np.cumsum(lens) - lens
+        gather = np.repeat(starts - seg_start, lens) + np.arange(total)
+        coord_leg = np.repeat(pair_leg, lens)
+        coord_net = np.repeat(net, lens)
+
+        xy = np.empty((total, 2), dtype=np.float64)
+        for i, name in enumerate(self.network_names):
+            mask = coord_net == i
+            if mask.any():
+                xy[mask] = self.networks[name].coords[gather[mask]]
+
+        # ---- LineString only when > 1 coordinate ----
+        leg_counts = np.bincount(coord_leg, minlength=n)
+        ok = leg_counts > 1
+        keep = ok[coord_leg]
+        if not keep.any():
+            return out
+
+        dense = np.cumsum(ok) - 1
+        out[ok] = shapely.linestrings(xy[keep], indices=dense[coord_leg[keep]])
+        return out
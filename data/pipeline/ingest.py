@@ -0,0 +1,242 @@
+# ============================================================
+# Streaming Parquet Ingestion (Arrow datasets)
+# - Column projection: only the columns a stage needs
+# - Predicate pushdown: end > start, non-null geohashes
+# - Record batches → pandas chunks (bounded memory)
+# - Optional typed schema: categoricals, Arrow strings, native
+#   timestamps, lossless float32 (several × smaller than object)
+# ============================================================
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+BATCH_ROWS = 256_000
+
+GEOHASH_COLS = ["geohash7_orig", "geohash7_dest"]
+TIME_COLS = ["local_datetime_start", "local_datetime_end"]
+
+# typed schema (typed=True): low-cardinality labels → categoricals,
+# floats → float32 when exact for the values read, other strings
+# (ids, geohashes, route_taken) → Arrow-backed pandas strings
+CATEGORY_COLS = ["travel_mode", "trip_purpose", "access_stop", "egress_stop"]
+FLOAT32_COLS = ["network_distance", "route_distance", "access_stop_id", "egress_stop_id"]
+ARROW_STRING = pd.StringDtype("pyarrow")
+
+
+# =========================
+# File discovery
+# =========================
+def month_files(parquet_dir, months, year=2020):
+    """delivery/Salt_Lake-{Mon}-{year}/*.snappy.parquet, months in the given order"""
+    files = []
+    for m in months:
+        files.extend(glob.glob(f"{parquet_dir}/Salt_Lake-{m}-{year}/*.snappy.parquet"))
+    return files
+
+
+def month_folders(delivery_root):
+    """{folder: [parquet files]} for every Salt_Lake-* month folder"""
+    out = {}
+    for folder in os.listdir(delivery_root):
+        if not folder.startswith("Salt_Lake-"):
+            continue
+        month_dir = os.path.join(delivery_root, folder)
+        out[folder] = [
+            os.path.join(month_dir, f)
+            for f in os.listdir(month_dir)
+            if f.endswith(".parquet")
+        ]
+    return out
+
+
+# =========================
+# Filters
+# =========================
+def _is_timestamp(schema, col):
+    return schema.get_field_index(col) >= 0 and pa.types.is_timestamp(schema.field(col).type)
+
+
+def scan_filter(schema, geohash_notnull=True, positive_duration=True, extra=None):
+    """
+    Arrow expression pushed down to the scan.
+
+    end > start can only be pushed down when both columns are stored as
+    timestamps; for string datetimes it is applied per chunk instead
+    (see iter_trip_batches).
+    """
+    expr = None
+
+    def _and(e):
+        nonlocal expr
+        expr = e if expr is None else expr & e
+
+    if geohash_notnull:
+        for col in GEOHASH_COLS:
+            _and(ds.field(col).is_valid())
+
+    if positive_duration and all(_is_timestamp(schema, c) for c in TIME_COLS):
+        _and(ds.field("local_datetime_end") > ds.field("local_datetime_start"))
+
+    if extra is not None:
+        _and(extra)
+
+    return expr
+
+
+def isin_filter(schema, col, values):
+    """ds expression col ∈ values, typed like the stored column"""
+    return ds.field(col).isin(pa.array(list(values), type=schema.field(col).type))
+
+
+# =========================
+# Typed schema
+# =========================
+def _typed_chunk(batch):
+    """Record batch → pandas chunk with the typed schema (no Python str objects)"""
+    arrays = [
+        pc.dictionary_encode(col)
+        if name in CATEGORY_COLS and pa.types.is_string(col.type) else col
+        for name, col in zip(batch.schema.names, batch.columns)
+    ]
+    chunk = pa.RecordBatch.from_arrays(arrays, names=batch.schema.names).to_pandas(
+        types_mapper={pa.string(): ARROW_STRING, pa.large_string(): ARROW_STRING}.get
+    )
+
+    # timestamps stay native; string datetimes are parsed once, here
+    for col in TIME_COLS:
+        if col in chunk and not pd.api.types.is_datetime64_any_dtype(chunk[col]):
+            chunk[col] = pd.to_datetime(chunk[col], errors="coerce")
+
+    for col in FLOAT32_COLS:
+        if col in chunk and chunk[col].dtype == np.float64:
+            x = chunk[col].to_numpy()
+            y = x.astype(np.float32)
+            if np.array_equal(y.astype(np.float64), x, equal_nan=True):
+                chunk[col] = y
+
+    return chunk
+
+
+def _concat_typed(chunks):
+    """pd.concat that keeps categoricals (union of every chunk's categories)"""
+    for col in CATEGORY_COLS:
+        if col not in chunks[0] or not isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            continue
+        cats = sorted(set().union(*(c[col].cat.categories for c in chunks)))
+        for c in chunks:
+            c[col] = c[col].cat.set_categories(cats)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+# =========================
+# Streaming reader
+# =========================
+def iter_trip_batches(
+    files,
+    columns,
+    geohash_notnull=True,
+    positive_duration=True,
+    extra_filter=None,
+    batch_rows=BATCH_ROWS,
+    typed=False,
+    measure=None,
+):
+    """
+    Yield pandas chunks of `columns` from all files (file order kept).
+
+    extra_filter: callable(schema) → ds expression, e.g. an isin filter.
+    typed: apply the typed schema (see CATEGORY_COLS / FLOAT32_COLS).
+    measure: optional dict; "object_mb" / "typed_mb" are accumulated
+             (the chunk is also converted untyped, for the comparison).
+    """
+    if not files:
+        return
+
+    dataset = ds.dataset(files, format="parquet")
+    schema = dataset.schema
+
+    extra = extra_filter(schema) if extra_filter is not None else None
+    expr = scan_filter(schema, geohash_notnull, positive_duration, extra)
+
+    # string datetimes: compare after parsing, per chunk
+    post_duration = positive_duration and not all(_is_timestamp(schema, c) for c in TIME_COLS)
+    read_cols = list(columns)
+    if post_duration:
+        read_cols += [c for c in TIME_COLS if c not in read_cols]
+
+    for batch in dataset.to_batches(columns=read_cols, filter=expr, batch_size=batch_rows):
+        if batch.num_rows == 0:
+            continue
+
+        chunk = _typed_chunk(batch) if typed else batch.to_pandas()
+
+        if post_duration:
+            t0 = pd.to_datetime(chunk["local_datetime_start"], errors="coerce")
+            t1 = pd.to_datetime(chunk["local_datetime_end"], errors="coerce")
+            keep = (t1 > t0).to_numpy()
+            chunk = chunk[keep]
+            if chunk.empty:
+                continue
+        else:
+            keep = slice(None)
+
+        if measure is not None:
+            plain = batch.to_pandas()[keep][list(columns)]
+            measure["object_mb"] = measure.get("object_mb", 0.0) + frame_memory_mb(plain)
+            measure["typed_mb"] = measure.get("typed_mb", 0.0) + frame_memory_mb(chunk[list(columns)])
+
+        yield chunk[list(columns)]
+
+
+def _empty_frame(files, columns, typed):
+    """Zero-row frame with the dtypes a non-empty read of `columns` would have"""
+    if files:
+        schema = ds.dataset(files, format="parquet").schema
+        batch = pa.RecordBatch.from_pylist([], schema=pa.schema([schema.field(c) for c in columns]))
+        return _typed_chunk(batch) if typed else batch.to_pandas()
+
+    # no files → no stored schema: declared types only
+    df = pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+    for col in TIME_COLS:
+        if col in df:
+            df[col] = pd.Series(dtype="datetime64[ns]")
+    if typed:
+        for col in CATEGORY_COLS:
+            if col in df:
+                df[col] = pd.Series(dtype="category")
+        for col in FLOAT32_COLS:
+            if col in df:
+                df[col] = pd.Series(dtype=np.float32)
+    return df
+
+
+def read_trips(files, columns, typed=False, report=False, **kwargs):
+    """
+    All chunks concatenated (for stages that need the full filtered table).
+    report=True prints the footprint as object columns vs typed (diagnostic:
+    every chunk is also converted untyped, so it costs time and memory).
+    """
+    measure = {} if report and typed else None
+    chunks = list(iter_trip_batches(files, columns, typed=typed, measure=measure, **kwargs))
+    if not chunks:
+        return _empty_frame(files, list(columns), typed)
+
+    df = _concat_typed(chunks) if typed else pd.concat(chunks, ignore_index=True)
+
+    if measure:
+        typed_mb = frame_memory_mb(df)
+        print(
+            f"Loaded {len(df):,} rows: {measure['object_mb']:.1f} MB as object columns "
+            f"→ {typed_mb:.1f} MB typed ({measure['object_mb'] / max(typed_mb, 1e-9):.1f}× smaller)"
+        )
+    return df
@@ -0,0 +1,236 @@
+# ============================================================
+# Streaming JSON Writer (sample / stats outputs)
+# - Iterators (e.g. a generator of linked trips) are written as JSON
+#   arrays one element at a time, never materialized as a list
+# - indent=2 → same text as json.dump(indent=2); indent=None →
+#   compact (no whitespace at all)
+# - Optional rounding of coordinates (numbers under lat / lon /
+#   route / coordinates) to a number of decimals
+# - Number arrays / coordinate rows rendered by one join each;
+#   compact full-precision containers go to the C encoder
+# - NaN / ±Infinity raise ValueError (as allow_nan=False)
+# ============================================================
+
+import json
+from collections.abc import Iterator
+from itertools import chain, cycle
+
+# numbers under these keys (at any depth) are coordinates
+COORD_KEYS = frozenset({"lat", "lon", "route", "coordinates"})
+
+_encode_str = json.encoder.encode_basestring_ascii
+
+
+def _key_text(key):
+    """JSON object key (same conversions as json.dumps)"""
+    if isinstance(key, str):
+        return _encode_str(key)
+    if key is True or key is False or key is None:
+        return _encode_str(json.dumps(key))
+    if isinstance(key, (int, float)):
+        return _encode_str(float.__repr__(key) if isinstance(key, float) else int.__repr__(key))
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+
+def _finite(text):
+    """Rendered numbers (+ separators) → text; repr of a finite number has no "n" (nan, inf)"""
+    if "n" in text:
+        raise ValueError("Out of range float values are not JSON compliant")
+    return text
+
+
+class JSONStreamWriter:
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        JSONStreamWriter(f, indent=None, coord_decimals=6).write(out)
+
+    With coord_decimals=None the text equals
+    json.dump(out, f, indent=indent, allow_nan=False) (indent=None uses
+    the compact separators "," and ":"). Text is written to f after
+    every element of a streamed iterator.
+    """
+
+    def __init__(self, f, indent=2, coord_decimals=None):
+        self.f = f
+        self.indent = indent
+        self.coord_decimals = coord_decimals
+        self._key_sep = ": " if indent is not None else ":"
+        self._keys = {}
+        self._buf = []
+
+        # compact → json's C encoder does whole containers (coordinates
+        # rounded into a copy first)
+        self._c_encode = (
+            json.JSONEncoder(separators=(",", ":"), allow_nan=False).encode
+            if indent is None else None
+        )
+
+    def write(self, obj):
+        self._encode(obj, 0, False)
+        self._flush()
+
+    def _flush(self):
+        self.f.write("".join(self._buf))
+        self._buf.clear()
+
+    def _newline(self, level):
+        return "" if self.indent is None else "\n" + " " * (self.indent * level)
+
+    # =========================
+    # Values
+    # =========================
+    def _encode(self, obj, level, coord):
+        t = type(obj)
+        if isinstance(obj, str):
+            self._buf.append(_encode_str(obj))
+        elif obj is None:
+            self._buf.append("null")
+        elif obj is True:
+            self._buf.append("true")
+        elif obj is False:
+            self._buf.append("false")
+        elif t is float or t is int:
+            self._buf.append(self._numbers([obj], coord))
+        elif t is dict or t is list or t is tuple:
+            if self._c_encode is not None:
+                try:
+                    rounded = obj if self.coord_decimals is None else self._rounded(obj, coord)
+                    self._buf.append(self._c_encode(rounded))
+                    return
+                except TypeError:       # holds an iterator (or a bad type)
+                    pass
+            if t is dict:
+                self._dict(obj, level, coord)
+            else:
+                self._list(obj, level, coord)
+        elif isinstance(obj, Iterator):
+            self._stream(obj, level, coord)
+        elif isinstance(obj, float):
+            self._encode(float(obj), level, coord)
+        elif isinstance(obj, int):
+            self._encode(int(obj), level, coord)
+        else:
+            raise TypeError(f"Object of type {t.__name__} is not JSON serializable")
+
+    def _rounded(self, obj, coord):
+        """Copy of obj with coordinates rounded (iterators raise TypeError)"""
+        t = type(obj)
+        if t is dict:
+            out = {}
+            for k, v in obj.items():
+                tv = type(v)
+                if tv is str or v is None or tv is bool or tv is int:
+                    out[k] = v
+                elif tv is float:
+                    out[k] = round(v, self.coord_decimals) if coord or k in COORD_KEYS else v
+                else:
+                    out[k] = self._rounded(v, coord or k in COORD_KEYS)
+            return out
+        if t is list or t is tuple:
+            if not coord:
+                return [self._rounded(v, False) for v in obj]
+            d = self.coord_decimals
+            types = set(map(type, obj))
+            if types <= {int, float}:
+                return [round(v, d) for v in obj]
+            if types <= {list, tuple} and {type(v) for row in obj for v in row} <= {int, float}:
+                return [[round(v, d) for v in row] for row in obj]
+            return [self._rounded(v, True) for v in obj]
+        if t is float:
+            return round(obj, self.coord_decimals) if coord else obj
+        if isinstance(obj, Iterator):
+            raise TypeError("iterator")
+        return obj
+
+    def _texts(self, values, coord):
+        if coord and self.coord_decimals is not None:
+            d = self.coord_decimals
+            return [repr(round(v, d)) for v in values]
+        return list(map(repr, values))
+
+    def _numbers(self, values, coord, sep=","):
+        """Numbers → their JSON texts joined by sep"""
+        return _finite(sep.join(self._texts(values, coord)))
+
+    def _dict(self, obj, level, coord):
+        if not obj:
+            self._buf.append("{}")
+            return
+        buf, keys = self._buf, self._keys
+        inner = self._newline(level + 1)
+        sep = "," + inner
+        buf.append("{" + inner)
+        for k, (key, value) in enumerate(obj.items()):
+            if k:
+                buf.append(sep)
+            text = keys.get(key)
+            if text is None:
+                text = keys[key] = _key_text(key) + self._key_sep
+            buf.append(text)
+
+            # plain strings / nulls inline (most leaf values)
+            if type(value) is str:
+                buf.append(_encode_str(value))
+            elif value is None:
+                buf.append("null")
+            else:
+                self._encode(value, level + 1, coord or key in COORD_KEYS)
+        buf.append(self._newline(level) + "}")
+
+    def _list(self, obj, level, coord):
+        if not obj:
+            self._buf.append("[]")
+            return
+        inner = self._newline(level + 1)
+        types = set(map(type, obj))
+
+        # [number, ...]
+        if types <= {int, float}:
+            body = self._numbers(obj, coord, "," + inner)
+            self._buf.append("[" + inner + body + self._newline(level) + "]")
+            return
+
+        # [[number, ...], ...] with equal row lengths (routes, GeoJSON rings)
+        if types <= {list, tuple}:
+            widths = set(map(len, obj))
+            if len(widths) == 1 and 0 not in widths:
+                flat = list(chain.from_iterable(obj))
+                if set(map(type, flat)) <= {int, float}:
+                    self._buf.append(self._rows(flat, widths.pop(), level, coord))
+                    return
+
+        sep = "," + inner
+        self._buf.append("[" + inner)
+        for k, value in enumerate(obj):
+            if k:
+                self._buf.append(sep)
+            self._encode(value, level + 1, coord)
+        self._buf.append(self._newline(level) + "]")
+
+    def _rows(self, flat, width, level, coord):
+        """Equal-width number rows, flattened → JSON array of arrays"""
+        texts = self._texts(flat, coord)
+        outer, inner = self._newline(level + 1), self._newline(level + 2)
+        number_sep = "," + inner
+        row_sep = outer + "]," + outer + "[" + inner
+
+        seps = cycle((number_sep,) * (width - 1) + (row_sep,))
+        body = _finite("".join(chain.from_iterable(zip(texts, seps)))[:-len(row_sep)])
+        return "[" + outer + "[" + inner + body + outer + "]" + self._newline(level) + "]"
+
+    def _stream(self, items, level, coord):
+        """Iterator → JSON array, text flushed after every element"""
+        inner = self._newline(level + 1)
+        first = True
+        for value in items:
+            self._buf.append(("[" if first else ",") + inner)
+            self._encode(value, level + 1, coord)
+            self._flush()
+            first = False
+        self._buf.append("[]" if first else self._newline(level) + "]")
+
+
+def write_json(obj, path, indent=2, coord_decimals=None):
+    """Stream obj to path as UTF-8 JSON (see JSONStreamWriter)"""
+    with open(path, "w", encoding="utf-8") as f:
+        JSONStreamWriter(f, indent, coord_decimals).write(obj)
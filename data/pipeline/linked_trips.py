@@ -0,0 +1,195 @@
+# ============================================================
+# Columnar Linked Trips (legs → linked trips, no per-leg dicts)
+# - One leg table sorted trip by trip; trips = contiguous row ranges
+#   given by group-boundary offsets
+# - First / last leg, max weight, OD pair via grouped reductions
+# - Trips kept only for the exported OD pairs, in export order
+#   (pair, then weight descending)
+# - Nested JSON records generated one trip at a time while a pair is
+#   serialized (see json_stream.py)
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from od_stats import trip_arrays
+
+# leg table columns (one row per leg, JSON-ready: float NaN / None = null)
+LEG_COLUMNS = [
+    "id", "mode", "route", "route_lods",
+    "start_time", "end_time", "duration_min",
+    "network_distance_km", "route_distance_km",
+    "orig_lon", "orig_lat", "orig_geohash",
+    "dest_lon", "dest_lat", "dest_geohash",
+    "access_stop_id", "access_stop_name",
+    "egress_stop_id", "egress_stop_name",
+    "linked_trip_id", "tour_id", "purpose", "weight",
+]
+# added by assemble_linked_trips
+TRIP_COLUMNS = ["leg_index", "trip_weight", "od_orig", "od_dest"]
+
+
+# =========================
+# Offsets
+# =========================
+def trip_starts(legs):
+    """First row of every linked trip of an assembled leg table, plus len(legs)"""
+    first = np.flatnonzero(legs["leg_index"].to_numpy() == 0)
+    return np.append(first, len(legs))
+
+
+def _ranges(starts, lengths):
+    """Row indices of the ranges [start, start + length), concatenated"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _pair_codes(legs, rows, pairs):
+    """Position in pairs of the (od_orig, od_dest) of the given rows (-1 = not listed)"""
+    od = pd.MultiIndex.from_arrays([
+        legs["od_orig"].to_numpy(dtype=object)[rows],
+        legs["od_dest"].to_numpy(dtype=object)[rows],
+    ])
+    return pd.MultiIndex.from_tuples(pairs).get_indexer(od) if pairs else np.full(len(rows), -1)
+
+
+# =========================
+# Assembly
+# =========================
+def assemble_linked_trips(legs, pairs, order_by):
+    """
+    Leg table (rows of a linked trip may be anywhere) → leg table of the
+    linked trips whose (od_orig, od_dest) is in pairs, trip by trip:
+
+    - trips grouped by pair (in `pairs` order), then by trip weight
+      descending, ties in order of first appearance of linked_trip_id
+    - legs of a trip stably sorted by `order_by`
+    - leg_index = position in the trip, trip_weight = max leg weight,
+      null weights counting as 0 (0 when no leg has a non-zero weight)
+
+    od_orig / od_dest must be constant within a linked trip.
+    """
+    if len(legs) == 0:
+        return legs.assign(leg_index=np.zeros(0, dtype=np.int64), trip_weight=np.zeros(0))
+
+    trip, _ = pd.factorize(legs["linked_trip_id"])
+    when = pd.factorize(legs[order_by], sort=True)[0]
+    rows = np.lexsort((when, trip))
+
+    trip = trip[rows]
+    starts = np.flatnonzero(np.diff(trip, prepend=-1))
+    lengths = np.diff(np.append(starts, len(rows)))
+
+    weight = legs["weight"].to_numpy(dtype=np.float64)[rows]
+    trip_weight = np.maximum.reduceat(np.where(np.isnan(weight), 0.0, weight), starts)
+
+    pair = _pair_codes(legs, rows[starts], list(dict.fromkeys(pairs)))
+
+    kept = np.flatnonzero(pair >= 0)
+    kept = kept[np.lexsort((-trip_weight[kept], pair[kept]))]
+
+    out = legs.iloc[rows[_ranges(starts[kept], lengths[kept])]].reset_index(drop=True)
+    out["leg_index"] = np.arange(len(out)) - np.repeat(np.cumsum(lengths[kept]) - lengths[kept], lengths[kept])
+    out["trip_weight"] = np.repeat(trip_weight[kept], lengths[kept])
+    return out
+
+
+def pair_ranges(legs, pairs):
+    """{pair: (first row, end row)} of an assembled leg table (empty range if no trips)"""
+    pairs = list(dict.fromkeys(pairs))
+    starts = trip_starts(legs)
+    pair = _pair_codes(legs, starts[:-1], pairs)     # ascending: trips grouped by pair
+
+    codes = np.arange(len(pairs))
+    first = starts[np.searchsorted(pair, codes, side="left")]
+    end = starts[np.searchsorted(pair, codes, side="right")]
+    return {p: (int(first[k]), int(end[k])) for k, p in enumerate(pairs)}
+
+
+def trip_months(legs):
+    """Per leg: "YYYY-MM" of its linked trip's start_time ("" when unknown)"""
+    starts = trip_starts(legs)
+    month = legs["start_time"].fillna("").astype(str).str[:7].to_numpy(dtype=object)
+    return np.repeat(month[starts[:-1]], np.diff(starts))
+
+
+def trip_table(legs, pairs):
+    """od_stats.trip_arrays() of an assembled leg table (pairs with trips, in `pairs` order)"""
+    pairs = list(dict.fromkeys(pairs))
+    starts = trip_starts(legs)
+    counts = np.bincount(_pair_codes(legs, starts[:-1], pairs), minlength=len(pairs))
+
+    return trip_arrays(
+        [p for p, n in zip(pairs, counts) if n],
+        counts[counts > 0],
+        np.diff(starts),
+        legs["duration_min"].to_numpy(dtype=np.float64),
+        legs["mode"].to_numpy(dtype=str)
+    )
+
+
+# =========================
+# Serialization
+# =========================
+def _values(column):
+    """Column → Python values, float NaN → None"""
+    if column.dtype.kind == "f":
+        return [None if v != v else v for v in column.tolist()]
+    return column.tolist()
+
+
+def linked_trip_records(legs, lod_tolerances):
+    """
+    Assembled legs of whole trips → linked trip dicts in table order
+    (nova.complete_trip.sample.v2 "linked_trips"), yielded one at a
+    time; lod_tolerances name the routes in route_lods.
+    """
+    if len(legs) == 0:
+        return
+    c = {name: _values(legs[name]) for name in LEG_COLUMNS + ["leg_index", "trip_weight"]}
+
+    starts = trip_starts(legs).tolist()
+    for a, b in zip(starts[:-1], starts[1:]):
+        trip_legs = [
+            {
+                "id": c["id"][i],
+                "mode": c["mode"][i],
+                "route": c["route"][i],
+                "route_lods": [
+                    {"tolerance_m": tol, "route": route}
+                    for tol, route in zip(lod_tolerances, c["route_lods"][i])
+                ],
+                "start_time": c["start_time"][i],
+                "end_time": c["end_time"][i],
+                "duration_min": c["duration_min"][i],
+                "network_distance_km": c["network_distance_km"][i],
+                "route_distance_km": c["route_distance_km"][i],
+                "origin": {"lon": c["orig_lon"][i], "lat": c["orig_lat"][i], "geohash": c["orig_geohash"][i]},
+                "destination": {"lon": c["dest_lon"][i], "lat": c["dest_lat"][i], "geohash": c["dest_geohash"][i]},
+                "access": {"stop_id": c["access_stop_id"][i], "stop_name": c["access_stop_name"][i]},
+                "egress": {"stop_id": c["egress_stop_id"][i], "stop_name": c["egress_stop_name"][i]},
+                "meta": {
+                    "linked_trip_id": c["linked_trip_id"][i],
+                    "tour_id": c["tour_id"][i],
+                    "purpose": c["purpose"][i],
+                    "weight": c["weight"][i]
+                },
+                "leg_index": c["leg_index"][i]
+            }
+            for i in range(a, b)
+        ]
+        first, last = trip_legs[0], trip_legs[-1]
+        weight = c["trip_weight"][a]
+
+        yield {
+            "linked_trip_id": c["linked_trip_id"][a],
+            "origin": {**first["origin"], "start_time": first["start_time"]},
+            "destination": {**last["destination"], "end_time": last["end_time"]},
+            "transfers": [
+                {"lat": leg["destination"]["lat"], "lon": leg["destination"]["lon"], "geohash": leg["destination"]["geohash"]}
+                for leg in trip_legs[:-1]
+                if leg["destination"]["lat"] is not None and leg["destination"]["lon"] is not None
+            ],
+            "legs": trip_legs,
+            "weight": 0 if weight == 0 else weight
+        }
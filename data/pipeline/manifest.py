@@ -0,0 +1,122 @@
+# ============================================================
+# Build Manifest (incremental rebuilds)
+# - Input fingerprints: size, mtime, sha256
+# - Output → (input content hashes, build params) it was made from
+# - Rebuild only outputs whose inputs / params changed
+# ============================================================
+
+import hashlib
+import json
+import os
+
+_CHUNK = 1 << 20
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def params_hash(params):
+    """Stable hash of JSON-serialisable build parameters"""
+    blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def _key(path):
+    return os.path.normpath(path)
+
+
+class Manifest:
+    """
+    JSON manifest:
+        {"inputs":  {path: {"size", "mtime", "sha256"}},
+         "outputs": {path: {"inputs": {path: sha256}, "params": hash}}}
+
+    Content hashes are only recomputed when size or mtime changed, so an
+    unchanged delivery costs one stat() per file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.inputs = {}
+        self.outputs = {}
+        self._current = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            self.inputs = stored.get("inputs", {})
+            self.outputs = stored.get("outputs", {})
+
+    # =========================
+    # Inputs
+    # =========================
+    def fingerprint(self, path):
+        """Current {size, mtime, sha256} of an input (None if missing), memoised per run"""
+        key = _key(path)
+        if key in self._current:
+            return self._current[key]
+
+        fp = None
+        if os.path.exists(path):
+            st = os.stat(path)
+            known = self.inputs.get(key)
+            if known and known["size"] == st.st_size and known["mtime"] == st.st_mtime:
+                sha = known["sha256"]
+            else:
+                sha = file_sha256(path)
+            fp = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+
+        self._current[key] = fp
+        return fp
+
+    def digest(self, path):
+        fp = self.fingerprint(path)
+        return fp["sha256"] if fp else None
+
+    # =========================
+    # Outputs
+    # =========================
+    def is_stale(self, output, inputs, params=None):
+        """True if output is missing, unrecorded, or built from other inputs/params"""
+        if not os.path.exists(output):
+            return True
+
+        rec = self.outputs.get(_key(output))
+        if rec is None:
+            return True
+        if rec.get("params") != params_hash(params):
+            return True
+
+        used = rec.get("inputs", {})
+        if set(used) != {_key(p) for p in inputs}:
+            return True
+
+        return any(used[_key(p)] != self.digest(p) for p in inputs)
+
+    def stale(self, outputs, inputs, params=None):
+        """True if ANY of the outputs needs a rebuild"""
+        return any(self.is_stale(o, inputs, params) for o in outputs)
+
+    def record(self, output, inputs, params=None):
+        """Remember which input contents/params produced output"""
+        for p in inputs:
+            fp = self.fingerprint(p)
+            if fp is not None:
+                self.inputs[_key(p)] = fp
+
+        self.outputs[_key(output)] = {
+            "inputs": {_key(p): self.digest(p) for p in inputs},
+            "params": params_hash(params),
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"inputs": self.inputs, "outputs": self.outputs}, f, indent=2)
+        os.replace(tmp, self.path)
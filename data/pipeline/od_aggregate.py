@@ -0,0 +1,309 @@
+# ============================================================
+# Parallel OD Aggregation (linked + unlinked, per month)
+# - Months (or single Parquet files) → process pool
+# - Workers return compact, mergeable partial aggregates
+# - Parent merges partials → same table as the serial notebook loop
+#   (+ the same aggregates per start hour, for the OD cube)
+# - Optional per-month Parquet cache driven by a build manifest
+#   (keyed by the month files, the tract layer and its lookup signature)
+# ============================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from tqdm import tqdm
+
+from ingest import read_trips
+from tract_lookup import load_lookup, lookup_signature
+
+OD_KEYS = ["month", "origin_tract", "destination_tract", "travel_mode"]
+HOURLY_KEYS = ["month", "hour", "origin_tract", "destination_tract", "travel_mode"]
+
+# only the columns the OD aggregation uses
+OD_COLS = [
+    "trip_id", "linked_trip_id", "travel_mode",
+    "local_datetime_start", "trip_weight",
+    "geohash7_orig", "geohash7_dest"
+]
+
+# global order of a leg: serial code sorts (linked_trip_id, start) stably
+# over the month's rows in file order → tie-break on (unit, row)
+_ORDER = ["linked_trip_id", "local_datetime_start", "_unit", "_row"]
+
+
+# =========================
+# Cleaning (same rules as the serial loop)
+# =========================
+def clean_trips(df, lookup):
+    df["local_datetime_start"] = pd.to_datetime(df["local_datetime_start"])
+    df["month"] = df["local_datetime_start"].dt.to_period("M").astype(str)
+    df["hour"] = df["local_datetime_start"].dt.hour
+    df["trip_weight"] = df["trip_weight"].fillna(1.0)
+
+    df["origin_tract"] = df["geohash7_orig"].map(lookup)
+    df["destination_tract"] = df["geohash7_dest"].map(lookup)
+
+    return df[
+        df["origin_tract"].notna() &
+        df["destination_tract"].notna()
+    ]
+
+
+# =========================
+# Partial aggregates
+# =========================
+def unlinked_partial(df, keys=OD_KEYS):
+    return (
+        df
+        .groupby(keys, as_index=False)
+        .agg(
+            unlinked_count=("trip_id", "count"),
+            unlinked_weighted_flow=("trip_weight", "sum")
+        )
+    )
+
+
+def linked_partial(df, unit):
+    """
+    Per linked trip: candidate first leg, first leg with a travel_mode and
+    last leg, each with its sort position, so partials from several files
+    reduce to exactly groupby(...).first()/.last() on the whole month.
+    """
+    df = df[df["linked_trip_id"].notna()].copy()
+    df["_unit"] = unit
+    df["_row"] = range(len(df))
+    df = df.sort_values(_ORDER, kind="stable")
+
+    first = df.drop_duplicates("linked_trip_id", keep="first")[
+        _ORDER + ["month", "origin_tract", "trip_weight"]
+    ]
+    mode = df[df["travel_mode"].notna()].drop_duplicates("linked_trip_id", keep="first")[
+        _ORDER + ["travel_mode"]
+    ]
+    last = df.drop_duplicates("linked_trip_id", keep="last")[
+        _ORDER + ["destination_tract"]
+    ]
+    return {"first": first, "mode": mode, "last": last}
+
+
+def aggregate_unit(files, lookup, unit=0):
+    """One month folder (or one file) → (unlinked, linked, unlinked per hour) partials"""
+    df = read_trips(files, OD_COLS, positive_duration=False)
+    df = clean_trips(df, lookup)
+    return unlinked_partial(df), linked_partial(df, unit), unlinked_partial(df, HOURLY_KEYS)
+
+
+# =========================
+# Merge
+# =========================
+def _reduce(parts, keep):
+    return (
+        pd.concat(parts, ignore_index=True)
+        .sort_values(_ORDER, kind="stable")
+        .drop_duplicates("linked_trip_id", keep=keep)
+        .set_index("linked_trip_id")
+    )
+
+
+def _merge_unlinked(parts, keys):
+    if len(parts) == 1:
+        return parts[0]
+    return (
+        pd.concat(parts, ignore_index=True)
+        .groupby(keys, as_index=False)
+        .agg(
+            unlinked_count=("unlinked_count", "sum"),
+            unlinked_weighted_flow=("unlinked_weighted_flow", "sum")
+        )
+    )
+
+
+def _linked_od(linked_base, keys):
+    return (
+        linked_base
+        .groupby(keys, as_index=False)
+        .agg(
+            linked_count=("linked_trip_id", "count"),
+            linked_weighted_flow=("linked_weight", "sum")
+        )
+    )
+
+
+def merge_partials(partials):
+    """
+    Partials of ONE month folder → (OD table, OD table per start hour),
+    each the outer merge of linked + unlinked. A linked trip counts in
+    the hour its first leg starts.
+    """
+    unlinked_od = _merge_unlinked([p[0] for p in partials], OD_KEYS)
+    unlinked_hourly = _merge_unlinked([p[2] for p in partials], HOURLY_KEYS)
+    linked_parts = [p[1] for p in partials]
+
+    first = _reduce([p["first"] for p in linked_parts], "first")
+    mode = _reduce([p["mode"] for p in linked_parts], "first")
+    last = _reduce([p["last"] for p in linked_parts], "last")
+
+    linked_base = pd.DataFrame({
+        "month": first["month"],
+        "travel_mode": mode["travel_mode"].reindex(first.index),
+        "origin_tract": first["origin_tract"],
+        "destination_tract": last["destination_tract"].reindex(first.index),
+        "linked_weight": first["trip_weight"],
+        "hour": first["local_datetime_start"].dt.hour,
+    }).sort_index()
+    linked_base.index.name = "linked_trip_id"
+    linked_base = linked_base.reset_index()
+
+    od = pd.merge(unlinked_od, _linked_od(linked_base, OD_KEYS), on=OD_KEYS, how="outer")
+    hourly = pd.merge(
+        unlinked_hourly, _linked_od(linked_base, HOURLY_KEYS), on=HOURLY_KEYS, how="outer"
+    )
+    return od, hourly
+
+
+# =========================
+# Process pool
+# =========================
+_LOOKUP = None
+
+
+def _init_worker(lookup_path):
+    global _LOOKUP
+    _LOOKUP = load_lookup(lookup_path)
+
+
+def _run_unit(task):
+    folder, unit, files = task
+    return folder, aggregate_unit(files, _LOOKUP, unit)
+
+
+def aggregate_od_months(month_files, lookup_path, workers=None, split="month", signature=None):
+    """
+    → {folder: (OD table, OD table per start hour)}
+
+    month_files: {folder: [parquet files]} (see ingest.month_folders)
+    lookup_path: saved GeohashTractCache Parquet file
+    signature:   GeohashTractCache.signature the lookup must have been
+                 saved with (None = not checked)
+    workers:     pool size (None = all cores, 1 = run in this process)
+    split:       "month" → one task per month folder (bit-identical to the
+                 serial loop); "file" → one task per Parquet file (finer
+                 load balancing; unlinked weighted flows then differ from
+                 the serial sums only by float summation order)
+    """
+    if split == "month":
+        tasks = [(folder, 0, files) for folder, files in month_files.items() if files]
+    elif split == "file":
+        tasks = [
+            (folder, unit, [f])
+            for folder, files in month_files.items()
+            for unit, f in enumerate(files)
+        ]
+    else:
+        raise ValueError(f"split must be 'month' or 'file', got {split!r}")
+
+    if signature is not None and lookup_signature(lookup_path) != signature:
+        raise ValueError(
+            f"{lookup_path} was not built from this tract layer; update and save the GeohashTractCache first"
+        )
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(lookup_path)
+        results = [_run_unit(t) for t in tqdm(tasks, desc="Processing months")]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(lookup_path,)
+        ) as pool:
+            results = list(tqdm(pool.map(_run_unit, tasks), total=len(tasks), desc="Processing months"))
+
+    by_folder = {}
+    for folder, partial in results:
+        by_folder.setdefault(folder, []).append(partial)
+
+    return {f: merge_partials(by_folder[f]) for f in month_files if f in by_folder}
+
+
+def _concat(tables, keys):
+    if not tables:
+        return pd.DataFrame(columns=keys)
+    return pd.concat(tables, ignore_index=True)
+
+
+def aggregate_od(month_files, lookup_path, workers=None, split="month"):
+    """All months → (OD table, OD table per start hour), months in month_files order"""
+    months = aggregate_od_months(month_files, lookup_path, workers, split)
+    return (
+        _concat([od for od, _ in months.values()], OD_KEYS),
+        _concat([hourly for _, hourly in months.values()], HOURLY_KEYS),
+    )
+
+
+# =========================
+# Incremental (manifest-driven)
+# =========================
+def _month_cache(cache_dir, folder):
+    return (
+        os.path.join(cache_dir, f"{folder}.parquet"),
+        os.path.join(cache_dir, f"{folder}.hourly.parquet"),
+    )
+
+
+def _tract_params(signature):
+    return None if signature is None else {"tract_layer": signature}
+
+
+def stale_months(month_files, cache_dir, manifest, shared_inputs=(), signature=None):
+    """
+    Month folders whose cached OD tables are missing or out of date, i.e.
+    their Parquet files or shared_inputs (e.g. the tract layer) changed,
+    or they were built with a geohash → tract lookup of another tract
+    layer (signature = GeohashTractCache.signature).
+
+    The lookup drops its assignments when the layer's signature changes,
+    so every month it marks stale is re-joined against the new layer.
+    """
+    return {
+        folder: files
+        for folder, files in month_files.items()
+        if files and manifest.stale(
+            _month_cache(cache_dir, folder), list(files) + list(shared_inputs),
+            _tract_params(signature)
+        )
+    }
+
+
+def aggregate_od_incremental(month_files, lookup_path, cache_dir, manifest,
+                             shared_inputs=(), workers=None, signature=None):
+    """
+    Like aggregate_od, but every month's OD tables are kept as
+    {cache_dir}/{folder}.parquet / {folder}.hourly.parquet and only
+    stale months are recomputed.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stale = stale_months(month_files, cache_dir, manifest, shared_inputs, signature)
+    print(f"OD months to rebuild: {len(stale)} / {sum(1 for f in month_files.values() if f)}")
+
+    fresh = aggregate_od_months(stale, lookup_path, workers, signature=signature) if stale else {}
+    for folder, tables in fresh.items():
+        for table, out in zip(tables, _month_cache(cache_dir, folder)):
+            table.to_parquet(out, index=False)
+            manifest.record(out, list(month_files[folder]) + list(shared_inputs), _tract_params(signature))
+    manifest.save()
+
+    all_months = [
+        fresh[folder] if folder in fresh
+        else tuple(pd.read_parquet(p) for p in _month_cache(cache_dir, folder))
+        for folder, files in month_files.items()
+        if files
+    ]
+    return (
+        _concat([od for od, _ in all_months], OD_KEYS),
+        _concat([hourly for _, hourly in all_months], HOURLY_KEYS),
+    )
@@ -0,0 +1,201 @@
+# ============================================================
+# Sparse OD Cube (month × hour × mode × origin × destination)
+# - Integer-coded dimensions + COO measure arrays in one .npz
+# - Two blocks: "month" (all hours, = the monthly OD table, same
+#   row order) and "hour" (per start hour)
+# - Query API: filtered rows, top-K, marginals — NumPy only
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+# query name → table column
+DIMS = {
+    "month": "month",
+    "hour": "hour",
+    "origin": "origin_tract",
+    "destination": "destination_tract",
+    "mode": "travel_mode",
+}
+
+MEASURES = [
+    "unlinked_count", "unlinked_weighted_flow",
+    "linked_count", "linked_weighted_flow",
+]
+
+# derived measure (same definition as the dashboard)
+TOTAL = "total_flow"
+
+_LABELS = {"month": "months", "mode": "modes", "origin": "tracts", "destination": "tracts"}
+
+
+def _codes(values, labels):
+    return pd.Index(labels).get_indexer(pd.Index(values)).astype(np.int32)
+
+
+class ODCube:
+    """
+    cube = ODCube.load("od_cube.npz")
+    cube.top_k(20, per="month")                       # dashboard table
+    cube.top_k(10, month="2020-03", mode="bus")
+    cube.marginal(["origin"], month="2020-01")        # outflow per tract
+    cube.marginal(["hour", "mode"], origin="49035114000")
+
+    Filters take a label or a list of labels. Queries without an hour
+    filter / hour dimension use the month block, so they return exactly
+    the monthly OD table's numbers.
+    """
+
+    def __init__(self, months, modes, tracts, blocks):
+        self.months = np.asarray(months)
+        self.modes = np.asarray(modes)
+        self.tracts = np.asarray(tracts)
+        # {"month" | "hour": {dim or measure: ndarray}}
+        self.blocks = blocks
+
+    # =========================
+    # Build / IO
+    # =========================
+    @classmethod
+    def from_frames(cls, od, hourly):
+        """od: monthly OD table, hourly: same per start hour (see od_aggregate)"""
+        frames = {"month": od, "hour": hourly}
+
+        months = np.array(sorted(set(od["month"].astype(str)) | set(hourly["month"].astype(str))))
+        modes = np.array(sorted(set(od["travel_mode"].astype(str)) | set(hourly["travel_mode"].astype(str))))
+        tracts = np.array(sorted(
+            set(od["origin_tract"].astype(str)) | set(od["destination_tract"].astype(str)) |
+            set(hourly["origin_tract"].astype(str)) | set(hourly["destination_tract"].astype(str))
+        ))
+        labels = {"months": months, "modes": modes, "tracts": tracts}
+
+        blocks = {}
+        for name, df in frames.items():
+            b = {}
+            for dim, col in DIMS.items():
+                if dim == "hour":
+                    if name == "hour":
+                        b[dim] = df[col].to_numpy().astype(np.int8)
+                    continue
+                b[dim] = _codes(df[col].astype(str), labels[_LABELS[dim]])
+            for m in MEASURES:
+                b[m] = df[m].fillna(0).to_numpy(dtype=np.float64)
+            blocks[name] = b
+
+        return cls(months, modes, tracts, blocks)
+
+    def save(self, path):
+        arrays = {"months": self.months, "modes": self.modes, "tracts": self.tracts}
+        for name, b in self.blocks.items():
+            for k, v in b.items():
+                arrays[f"{name}/{k}"] = v
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            blocks = {}
+            for key in z.files:
+                if "/" in key:
+                    name, k = key.split("/", 1)
+                    blocks.setdefault(name, {})[k] = z[key]
+            return cls(z["months"], z["modes"], z["tracts"], blocks)
+
+    # =========================
+    # Queries
+    # =========================
+    def _labels(self, dim):
+        return getattr(self, _LABELS[dim]) if dim in _LABELS else None
+
+    def _select(self, filters, need_hour=False):
+        unknown = set(filters) - set(DIMS)
+        if unknown:
+            raise ValueError(f"unknown cube dimension(s): {sorted(unknown)}")
+
+        name = "hour" if need_hour or filters.get("hour") is not None else "month"
+        b = self.blocks[name]
+        mask = np.ones(len(b["month"]), dtype=bool)
+
+        for dim, want in filters.items():
+            if want is None:
+                continue
+            want = np.atleast_1d(want)
+            labels = self._labels(dim)
+            if labels is not None:
+                want = _codes(want.astype(str), labels)
+            mask &= np.isin(b[dim], want)
+
+        return b, mask
+
+    def _frame(self, b, idx):
+        out = {}
+        for dim, col in DIMS.items():
+            if dim not in b:
+                continue
+            labels = self._labels(dim)
+            out[col] = labels[b[dim][idx]] if labels is not None else b[dim][idx]
+        df = pd.DataFrame(out)
+        for m in MEASURES:
+            df[m] = b[m][idx]
+        df[TOTAL] = df["linked_weighted_flow"] + df["unlinked_weighted_flow"]
+        return df
+
+    def _measure(self, b, measure, idx=slice(None)):
+        if measure == TOTAL:
+            return b["linked_weighted_flow"][idx] + b["unlinked_weighted_flow"][idx]
+        return b[measure][idx]
+
+    def rows(self, **filters):
+        """Matching cells as a DataFrame (table column names + total_flow)"""
+        b, mask = self._select(filters)
+        return self._frame(b, np.flatnonzero(mask))
+
+    def top_k(self, k, by=TOTAL, per=None, exclude_self=True, **filters):
+        """
+        k largest cells by `by`, optionally per value of a dimension
+        (e.g. per="month"), in descending order overall.
+        Ties keep table order.
+        """
+        b, mask = self._select(filters, need_hour=per == "hour")
+        if exclude_self:
+            mask &= b["origin"] != b["destination"]
+
+        idx = np.flatnonzero(mask)
+        val = self._measure(b, by, idx)
+
+        if per is None:
+            groups = [np.arange(len(idx))]
+        else:
+            g = b[per][idx]
+            order = np.argsort(g, kind="stable")
+            groups = np.split(order, np.flatnonzero(np.diff(g[order])) + 1)
+
+        picked = []
+        for grp in groups:
+            if len(grp) > k:
+                kth = np.partition(val[grp], len(grp) - k)[len(grp) - k]
+                grp = grp[val[grp] >= kth]
+            picked.append(grp[np.argsort(-val[grp], kind="stable")][:k])
+
+        sel = np.sort(np.concatenate(picked)) if picked else np.array([], dtype=np.int64)
+        sel = sel[np.argsort(-val[sel], kind="stable")]
+        return self._frame(b, idx[sel]).reset_index(drop=True)
+
+    def marginal(self, by, measure=TOTAL, **filters):
+        """Sum of `measure` over all dimensions not in `by` → DataFrame"""
+        by = [by] if isinstance(by, str) else list(by)
+        b, mask = self._select(filters, need_hour="hour" in by)
+        idx = np.flatnonzero(mask)
+
+        sizes = [len(self._labels(d)) if self._labels(d) is not None else 24 for d in by]
+        key = np.ravel_multi_index([b[d][idx].astype(np.int64) for d in by], sizes)
+        # only occupied cells (origin × destination is far too big to allocate densely)
+        cells, inv = np.unique(key, return_inverse=True)
+        sums = np.bincount(inv, weights=self._measure(b, measure, idx), minlength=len(cells))
+
+        out = {}
+        for d, codes in zip(by, np.unravel_index(cells, sizes)):
+            labels = self._labels(d)
+            out[DIMS[d]] = labels[codes] if labels is not None else codes
+        out[measure] = sums
+        return pd.DataFrame(out)
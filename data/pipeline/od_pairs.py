@@ -0,0 +1,97 @@
+# ============================================================
+# OD Pair Index
+# - linked_trip_id → (origin tract, destination tract), built ONCE
+# - Streamed first/last tract per linked trip (OD-first filter)
+# - OD pair lists from od_dashboard_topk.json / CSV / JSON
+# ============================================================
+
+import json
+import os
+
+import pandas as pd
+
+
+def build_od_index(df):
+    """
+    DataFrame indexed by linked_trip_id: GEOID_orig of the first leg,
+    GEOID_dest of the last leg (look legs up with .reindex(ids)).
+
+    df must already be sorted by (linked_trip_id, local_datetime_start);
+    first/last are positional (same as .iloc[0] / .iloc[-1]), NaN included.
+    """
+    first = df.drop_duplicates("linked_trip_id", keep="first").set_index("linked_trip_id")
+    last = df.drop_duplicates("linked_trip_id", keep="last").set_index("linked_trip_id")
+
+    return pd.DataFrame({
+        "GEOID_orig": first["GEOID_orig"].to_numpy(dtype=object),
+        "GEOID_dest": last["GEOID_dest"].reindex(first.index).to_numpy(dtype=object),
+    }, index=first.index)
+
+
+def first_last_tracts(chunks):
+    """
+    Streamed equivalent of
+        df.sort_values(["linked_trip_id", "local_datetime_start"])
+          .groupby("linked_trip_id")[["GEOID_orig", "GEOID_dest"]].first()/.last()
+
+    chunks: iterable of DataFrames with linked_trip_id, local_datetime_start,
+    GEOID_orig, GEOID_dest. Each chunk is reduced to one candidate row per
+    linked trip, so memory grows with linked trips, not with legs.
+    Returns DataFrame indexed by linked_trip_id (GEOID_orig, GEOID_dest).
+    """
+    keys = ["linked_trip_id", "local_datetime_start"]
+    firsts, lasts = [], []
+
+    for c in chunks:
+        c = c.sort_values(keys, kind="stable")
+        firsts.append(
+            c.loc[c["GEOID_orig"].notna(), keys + ["GEOID_orig"]]
+            .drop_duplicates("linked_trip_id", keep="first")
+        )
+        lasts.append(
+            c.loc[c["GEOID_dest"].notna(), keys + ["GEOID_dest"]]
+            .drop_duplicates("linked_trip_id", keep="last")
+        )
+
+    if not firsts:
+        return pd.DataFrame(columns=["GEOID_orig", "GEOID_dest"])
+
+    first = (
+        pd.concat(firsts).sort_values(keys, kind="stable")
+        .drop_duplicates("linked_trip_id", keep="first")
+        .set_index("linked_trip_id")["GEOID_orig"]
+    )
+    last = (
+        pd.concat(lasts).sort_values(keys, kind="stable")
+        .drop_duplicates("linked_trip_id", keep="last")
+        .set_index("linked_trip_id")["GEOID_dest"]
+    )
+
+    return pd.concat([first, last], axis=1)
+
+
+def load_od_pairs(path, months=None):
+    """
+    [(origin tract, destination tract)] from a pair list, deduplicated,
+    in order of first appearance.
+
+    path: od_dashboard_topk.json (records with origin_tract /
+          destination_tract / month), a JSON list of [orig, dest], or a
+          CSV with origin_tract, destination_tract columns
+    months: keep only rows of these months (e.g. ["2020-01"]), if the
+            file has a month column
+    """
+    if os.path.splitext(path)[1].lower() == ".csv":
+        df = pd.read_csv(path, dtype=str)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        if rows and not isinstance(rows[0], dict):
+            rows = [{"origin_tract": o, "destination_tract": d} for o, d in rows]
+        df = pd.DataFrame(rows, columns=None if rows else ["origin_tract", "destination_tract"])
+
+    if months is not None and "month" in df.columns:
+        df = df[df["month"].isin(months)]
+
+    pairs = zip(df["origin_tract"].astype(str), df["destination_tract"].astype(str))
+    return list(dict.fromkeys(pairs))
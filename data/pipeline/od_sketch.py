@@ -0,0 +1,260 @@
+# ============================================================
+# Mergeable OD Stats Sketches (per month → any range / year)
+# - Exact, additive parts: counts, duration sum/min/max, mode
+#   involvement, segment-count histogram, travel-time histogram
+# - Trip duration percentiles: log-bucket sketch (DDSketch style),
+#   relative error ≤ RELATIVE_ACCURACY, merged by adding buckets
+# - Saved as one .npz per month; merge → od_stats.v1 fields
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from od_stats import INVOLVEMENT_MODES, MAX_TIME, BIN_WIDTH, travel_time_bins, stats_fields
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+
+# bucket of zero-length trips
+ZERO_KEY = np.iinfo(np.int32).min
+
+PAIR = ["origin", "destination"]
+N_TT_BINS = MAX_TIME // BIN_WIDTH
+TT_COLS = [f"tt_{i}" for i in range(N_TT_BINS)]
+SUMS = ["n", "dur_sum", "seg_sum"] + list(INVOLVEMENT_MODES) + TT_COLS
+
+
+def duration_keys(dur):
+    """Duration (min) → log bucket key; every value in bucket k is within ±α of its centre"""
+    dur = np.asarray(dur, dtype=np.float64)
+    keys = np.full(len(dur), ZERO_KEY, dtype=np.int64)
+    pos = dur > 0
+    keys[pos] = np.ceil(np.log(dur[pos]) / _LOG_GAMMA)
+    return keys
+
+
+def duration_values(keys):
+    """Bucket key → representative value (relative error ≤ α for anything in the bucket)"""
+    keys = np.asarray(keys, dtype=np.int64)
+    out = 2 * np.power(_GAMMA, keys.astype(np.float64)) / (_GAMMA + 1)
+    return np.where(keys == ZERO_KEY, 0.0, out)
+
+
+def _buckets(pairs, trips_per_od, keys):
+    od = np.repeat(np.arange(len(pairs)), trips_per_od)
+    df = pd.DataFrame({"od": od, "key": keys, "count": 1})
+    df = df.groupby(["od", "key"], as_index=False)["count"].sum()
+    origin, destination = zip(*pairs)
+    df.insert(0, "destination", np.asarray(destination)[df["od"]])
+    df.insert(0, "origin", np.asarray(origin)[df["od"]])
+    return df.drop(columns="od")
+
+
+class ODSketch:
+    """
+    Per-OD summary of linked trips that merges across months.
+
+    sketch = ODSketch.from_table(linked_trips.trip_table(legs, pairs), ["2020-01"])
+    year = ODSketch.merge([ODSketch.load(p) for p in month_files])
+    year.stats()[(orig, dest)]   → od_stats.v1 fields
+
+    Error bound: duration percentiles are within RELATIVE_ACCURACY (1%)
+    relative error of np.percentile on the full data. Counts, min, max,
+    segment stats, mode involvement and the travel-time histogram are
+    exact; the mean is exact up to float summation order.
+    """
+
+    def __init__(self, summary, dur_buckets, seg_buckets, months):
+        self.summary = summary            # index (origin, destination); SUMS + dur_min / dur_max
+        self.dur_buckets = dur_buckets    # origin, destination, key, count
+        self.seg_buckets = seg_buckets    # origin, destination, key (= legs), count
+        self.months = sorted(months)
+
+    # =========================
+    # Build
+    # =========================
+    @classmethod
+    def from_table(cls, table, months):
+        """Trip table (od_stats.trip_arrays / linked_trips.trip_table) → sketch"""
+        pairs, trips_per_od, dur, legs_per_trip, involved = table
+        if not pairs:
+            return cls.empty(months)
+
+        od = np.repeat(np.arange(len(pairs)), trips_per_od)
+        index = pd.MultiIndex.from_tuples(pairs, names=PAIR)
+        starts = np.concatenate([[0], np.cumsum(trips_per_od)[:-1]])
+
+        summary = pd.DataFrame({
+            "n": trips_per_od,
+            "dur_sum": np.add.reduceat(dur, starts),
+            "dur_min": np.minimum.reduceat(dur, starts),
+            "dur_max": np.maximum.reduceat(dur, starts),
+            "seg_sum": np.add.reduceat(legs_per_trip, starts),
+            **{key: np.add.reduceat(flag.astype(np.int64), starts) for key, flag in involved.items()},
+        }, index=index)
+
+        bin_idx, _ = travel_time_bins(dur)
+        tt = np.bincount(od * N_TT_BINS + bin_idx, minlength=len(pairs) * N_TT_BINS)
+        summary[TT_COLS] = tt.reshape(len(pairs), N_TT_BINS)
+
+        return cls(
+            summary,
+            _buckets(pairs, trips_per_od, duration_keys(dur)),
+            _buckets(pairs, trips_per_od, legs_per_trip),
+            months
+        )
+
+    @classmethod
+    def empty(cls, months=()):
+        summary = pd.DataFrame(
+            columns=SUMS + ["dur_min", "dur_max"],
+            index=pd.MultiIndex.from_tuples([], names=PAIR)
+        )
+        buckets = pd.DataFrame(columns=PAIR + ["key", "count"])
+        return cls(summary, buckets, buckets.copy(), months)
+
+    # =========================
+    # Merge
+    # =========================
+    @classmethod
+    def merge(cls, sketches):
+        """Sketches of disjoint periods → one sketch of all of them"""
+        sketches = [s for s in sketches if len(s.summary)]
+        if not sketches:
+            return cls.empty()
+
+        summary = pd.concat([s.summary for s in sketches]).groupby(level=PAIR).agg(
+            {**{c: "sum" for c in SUMS}, "dur_min": "min", "dur_max": "max"}
+        )
+
+        def merge_buckets(parts):
+            return pd.concat(parts, ignore_index=True).groupby(PAIR + ["key"], as_index=False)["count"].sum()
+
+        months = sorted({m for s in sketches for m in s.months})
+        return cls(
+            summary,
+            merge_buckets([s.dur_buckets for s in sketches]),
+            merge_buckets([s.seg_buckets for s in sketches]),
+            months
+        )
+
+    def update(self, other, pairs=None):
+        """
+        Same period: OD pairs in other replace those in self (incremental
+        rebuilds). pairs: all rebuilt pairs, incl. ones that are now empty.
+        """
+        pairs = set(other.summary.index) | set(pairs or ())
+
+        def keep(df):
+            return df[[p not in pairs for p in zip(df["origin"], df["destination"])]]
+
+        kept = ODSketch(
+            self.summary[[p not in pairs for p in self.summary.index]],
+            keep(self.dur_buckets), keep(self.seg_buckets), self.months
+        )
+        out = ODSketch.merge([kept, other])
+        out.months = sorted(set(self.months) | set(other.months))
+        return out
+
+    # =========================
+    # IO
+    # =========================
+    def save(self, path):
+        pairs = list(self.summary.index)
+        code = {p: i for i, p in enumerate(pairs)}
+
+        arrays = {
+            "months": np.asarray(self.months, dtype=str),
+            "origin": np.asarray([o for o, _ in pairs], dtype=str),
+            "destination": np.asarray([d for _, d in pairs], dtype=str),
+        }
+        for c in self.summary.columns:
+            arrays[c] = self.summary[c].to_numpy(dtype=np.float64 if c.startswith("dur_") else np.int64)
+        for name, df in (("dur", self.dur_buckets), ("seg", self.seg_buckets)):
+            arrays[f"{name}_od"] = np.asarray(
+                [code[p] for p in zip(df["origin"], df["destination"])], dtype=np.int32
+            )
+            arrays[f"{name}_key"] = df["key"].to_numpy(dtype=np.int64)
+            arrays[f"{name}_count"] = df["count"].to_numpy(dtype=np.int64)
+
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            origin, destination = z["origin"], z["destination"]
+            index = pd.MultiIndex.from_arrays([origin, destination], names=PAIR)
+            summary = pd.DataFrame(
+                {c: z[c] for c in SUMS + ["dur_min", "dur_max"]}, index=index
+            )
+
+            def buckets(name):
+                od = z[f"{name}_od"]
+                return pd.DataFrame({
+                    "origin": origin[od], "destination": destination[od],
+                    "key": z[f"{name}_key"], "count": z[f"{name}_count"],
+                })
+
+            return cls(summary, buckets("dur"), buckets("seg"), [str(m) for m in z["months"]])
+
+    # =========================
+    # Stats
+    # =========================
+    def _percentiles(self, buckets, values, qs):
+        """Linear-interpolated percentiles per OD from (key, count) buckets"""
+        codes = self.summary.index.get_indexer(pd.MultiIndex.from_arrays([buckets["origin"], buckets["destination"]]))
+        order = np.lexsort((buckets["key"].to_numpy(), codes))
+        keys = buckets["key"].to_numpy()[order]
+        cum = np.cumsum(buckets["count"].to_numpy()[order])
+
+        n = self.summary["n"].to_numpy(dtype=np.int64)
+        offset = np.concatenate([[0], np.cumsum(n)[:-1]])
+
+        def at_rank(rank):
+            return values(keys[np.searchsorted(cum, offset + rank, side="right")])
+
+        out = {}
+        for q in qs:
+            q = q / 100
+            vi = n * q + (1 - q) - 1
+            lo = np.floor(vi).astype(np.int64)
+            g = vi - lo
+            a = at_rank(lo)
+            b = at_rank(np.minimum(lo + 1, n - 1))
+            diff = b - a
+            out[q] = np.where(g >= 0.5, b - diff * (1 - g), a + diff * g)
+        return out
+
+    def stats(self):
+        """{(orig, dest): od_stats.v1 fields} for every OD in the sketch"""
+        s = self.summary
+        if len(s) == 0:
+            return {}
+
+        n = s["n"].to_numpy(dtype=np.int64)
+        dmin = s["dur_min"].to_numpy(dtype=np.float64)
+        dmax = s["dur_max"].to_numpy(dtype=np.float64)
+
+        dur_pct = self._percentiles(self.dur_buckets, duration_values, (25, 50, 75))
+        # true percentiles lie in [min, max]: clamping only reduces the error
+        dur_pct = {q: np.clip(v, dmin, dmax) for q, v in dur_pct.items()}
+        seg_p75 = self._percentiles(self.seg_buckets, lambda k: k.astype(np.float64), (75,))[0.75]
+        seg_max = self.seg_buckets.groupby(PAIR)["key"].max().reindex(s.index).to_numpy()
+
+        mean = s["dur_sum"].to_numpy(dtype=np.float64) / n
+        seg_avg = s["seg_sum"].to_numpy(dtype=np.float64) / n
+        shares = {key: s[key].to_numpy(dtype=np.int64) / n for key in INVOLVEMENT_MODES}
+        tt = s[TT_COLS].to_numpy(dtype=np.int64)
+        edges = np.arange(0, MAX_TIME + BIN_WIDTH, BIN_WIDTH)
+
+        return {
+            pair: stats_fields(
+                n[i],
+                (dmin[i], mean[i], dur_pct[0.25][i], dur_pct[0.5][i], dur_pct[0.75][i], dmax[i]),
+                (seg_avg[i], seg_p75[i], seg_max[i]),
+                {key: shares[key][i] for key in INVOLVEMENT_MODES},
+                tt[i], edges
+            )
+            for i, pair in enumerate(s.index)
+        }
@@ -0,0 +1,146 @@
+# ============================================================
+# OD-level Stats for ALL pairs at once (nova.complete_trip.od_stats.v1)
+# - Legs → flat arrays in one pass; trips / ODs = contiguous segments
+# - Durations, segments, mode involvement via bincount / reduceat
+# - Percentiles (numpy "linear") and histograms without per-OD calls
+# - Mergeable per-month summaries: see od_sketch.py
+# ============================================================
+
+import numpy as np
+
+BIN_WIDTH = 5
+MAX_TIME = 180
+
+# dashboard key → leg mode
+INVOLVEMENT_MODES = {"car": "car", "bus": "bus", "rail": "rail", "walk": "walk/bike"}
+
+
+def _segment_percentile(sorted_vals, starts, n, q):
+    """np.percentile(..., q) (method="linear") of every segment of a segment-sorted array"""
+    q = q / 100
+    vi = n * q + (1 - q) - 1
+    lo = np.floor(vi).astype(np.int64)
+    g = vi - lo
+    hi = np.minimum(lo + 1, n - 1)
+
+    a = sorted_vals[starts + lo]
+    b = sorted_vals[starts + hi]
+    diff = b - a
+    # same two-sided lerp as numpy
+    return np.where(g >= 0.5, b - diff * (1 - g), a + diff * g)
+
+
+def trip_arrays(pairs, trips_per_od, legs_per_trip, leg_dur, leg_mode):
+    """
+    Trip table of non-empty OD pairs from leg arrays (legs trip by trip,
+    trips OD by OD; the trips of pair i are the contiguous slice given by
+    trips_per_od), leg_dur NaN = unknown duration.
+
+    → pairs, trips_per_od, dur (sum of known leg durations),
+      legs_per_trip, involved ({dashboard mode: bool per trip})
+    """
+    n_trips = len(legs_per_trip)
+    trip_of_leg = np.repeat(np.arange(n_trips), legs_per_trip)
+
+    # ---- trip level ----
+    known = ~np.isnan(leg_dur)
+    dur = np.bincount(trip_of_leg[known], weights=leg_dur[known], minlength=n_trips)
+
+    involved = {
+        key: np.bincount(trip_of_leg, weights=(leg_mode == mode), minlength=n_trips) > 0
+        for key, mode in INVOLVEMENT_MODES.items()
+    }
+
+    return pairs, trips_per_od, dur, legs_per_trip, involved
+
+
+def travel_time_bins(dur):
+    """Trip duration → travel_time_distribution bin (capped, same bins as np.histogram)"""
+    edges = np.arange(0, MAX_TIME + BIN_WIDTH, BIN_WIDTH)
+    capped = np.clip(dur, 0, MAX_TIME)
+    return np.minimum(np.searchsorted(edges, capped, side="right") - 1, len(edges) - 2), edges
+
+
+def table_stats(table):
+    """
+    Trip table (see trip_arrays) → {(orig, dest): stats fields}
+
+    Only pairs with at least one linked trip get an entry. Fields are the
+    data part of nova.complete_trip.od_stats.v1 (counts, trip_duration_min,
+    segments, mode_involvement, travel_time_distribution), with the same
+    definitions as the per-OD loop: trip duration = sum of known leg
+    durations, segments = number of legs, involvement = share of linked
+    trips with at least one leg of that mode.
+    """
+    pairs, trips_per_od, dur, legs_per_trip, involved = table
+    if not pairs:
+        return {}
+
+    # ---- OD level (trips of an OD are contiguous) ----
+    starts = np.concatenate([[0], np.cumsum(trips_per_od)[:-1]])
+    od_of_trip = np.repeat(np.arange(len(pairs)), trips_per_od)
+
+    order = np.lexsort((dur, od_of_trip))
+    dur_sorted = dur[order]
+    seg_sorted = legs_per_trip[np.lexsort((legs_per_trip, od_of_trip))]
+
+    dur_min = np.minimum.reduceat(dur, starts)
+    dur_max = np.maximum.reduceat(dur, starts)
+    dur_mean = np.add.reduceat(dur, starts) / trips_per_od
+    dur_pct = {q: _segment_percentile(dur_sorted, starts, trips_per_od, q) for q in (25, 50, 75)}
+
+    seg_mean = np.add.reduceat(legs_per_trip.astype(np.float64), starts) / trips_per_od
+    seg_p75 = _segment_percentile(seg_sorted.astype(np.float64), starts, trips_per_od, 75)
+    seg_max = np.maximum.reduceat(legs_per_trip, starts)
+
+    share = {
+        key: np.add.reduceat(flag.astype(np.int64), starts) / trips_per_od
+        for key, flag in involved.items()
+    }
+
+    # ---- travel time histogram ----
+    bin_idx, edges = travel_time_bins(dur)
+    n_bins = len(edges) - 1
+    hist = np.bincount(od_of_trip * n_bins + bin_idx, minlength=len(pairs) * n_bins)
+    hist = hist.reshape(len(pairs), n_bins)
+
+    return {
+        pair: stats_fields(
+            trips_per_od[i],
+            (dur_min[i], dur_mean[i], dur_pct[25][i], dur_pct[50][i], dur_pct[75][i], dur_max[i]),
+            (seg_mean[i], seg_p75[i], seg_max[i]),
+            {key: share[key][i] for key in INVOLVEMENT_MODES},
+            hist[i], edges
+        )
+        for i, pair in enumerate(pairs)
+    }
+
+
+def stats_fields(n, dur, seg, share, hist, edges):
+    """
+    Data part of nova.complete_trip.od_stats.v1 for one OD.
+    dur = (min, mean, p25, median, p75, max), seg = (avg, p75, max)
+    """
+    return {
+        "counts": {"linked_trips": int(n)},
+        "trip_duration_min": {
+            "min": float(dur[0]),
+            "mean": float(dur[1]),
+            "p25": float(dur[2]),
+            "median": float(dur[3]),
+            "p75": float(dur[4]),
+            "max": float(dur[5])
+        },
+        "segments": {
+            "avg": float(seg[0]),
+            "p75": int(seg[1]),
+            "max": int(seg[2])
+        },
+        "mode_involvement": {key: float(share[key]) for key in INVOLVEMENT_MODES},
+        "travel_time_distribution": {
+            "bin_width_min": BIN_WIDTH,
+            "max_time_min": MAX_TIME,
+            "bin_edges_min": edges.tolist(),
+            "counts": np.asarray(hist).tolist()
+        }
+    }
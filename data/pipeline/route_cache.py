@@ -0,0 +1,118 @@
+# ============================================================
+# Route Geometry Cache (content-keyed, LRU)
+# - Key = hash of network + node sequence, so repeated routes
+#   (bus / rail lines, common commutes) are built once
+# - Bounded size, least recently used entries evicted first
+# - Optional Parquet persistence (WKB), invalidated by a signature
+#   of the link tables it was built from
+# ============================================================
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+DEFAULT_MAX_ENTRIES = 500_000
+
+
+def route_key(network, nodes):
+    """network name + int64 node sequence → 16-byte key"""
+    h = hashlib.blake2b(str(network).encode("utf-8"), digest_size=16)
+    h.update(b"\0")
+    h.update(np.ascontiguousarray(nodes, dtype=np.int64).tobytes())
+    return h.digest()
+
+
+class RouteGeometryCache:
+    """
+    key → LineString (or None when the route has no usable links).
+
+    cache = RouteGeometryCache(path, signature=...)
+    engine.build(modes, routes, cache=cache)
+    cache.hits, cache.misses   # legs served from cache / routes built
+    cache.save()
+
+    The signature identifies the link tables; a stored cache with another
+    signature is ignored (and overwritten on save).
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, signature=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.signature = signature
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, key):
+        return key in self.table
+
+    # =========================
+    # LRU
+    # =========================
+    def get(self, key):
+        """Cached geometry (marks it recently used); KeyError when absent"""
+        geom = self.table[key]
+        self.table.move_to_end(key)
+        return geom
+
+    def put(self, key, geom):
+        self.table[key] = geom
+        self.table.move_to_end(key)
+        while len(self.table) > self.max_entries:
+            self.table.popitem(last=False)
+        self.changed = True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.table),
+        }
+
+    # =========================
+    # IO
+    # =========================
+    def _load(self):
+        stored = pq.read_table(self.path)
+        meta = stored.schema.metadata or {}
+        if meta.get(b"signature", b"").decode("utf-8") != str(self.signature):
+            self.changed = True
+            return
+
+        keys = stored.column("key").to_pylist()
+        geoms = shapely.from_wkb(np.asarray(stored.column("wkb").to_pylist(), dtype=object))
+        # stored oldest → newest
+        self.table = OrderedDict(zip(keys, geoms))
+        while len(self.table) > self.max_entries:
+            self.table.popitem(last=False)
+
+    def save(self):
+        """Write the cache atomically (only when something changed)"""
+        if self.path is None or not self.changed:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        geoms = np.asarray(list(self.table.values()), dtype=object)
+        table = pa.table({
+            "key": pa.array(list(self.table.keys()), type=pa.binary()),
+            "wkb": pa.array(list(shapely.to_wkb(geoms)) if len(geoms) else [], type=pa.binary()),
+        }).replace_schema_metadata({"signature": str(self.signature)})
+
+        tmp = f"{self.path}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.path)
+        self.changed = False
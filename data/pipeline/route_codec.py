@@ -0,0 +1,122 @@
+# ============================================================
+# Compact Sample Payloads (encoded polyline routes)
+# - leg["route"] [[lat, lon], ...] → quantized, delta-encoded string
+#   (Google encoded-polyline algorithm, configurable precision)
+# - Small JSON header ("route_encoding") tells readers how to decode
+# - Reader returns the usual sample dict ([[lat, lon], ...] routes)
+# - Writer streams linked trips (one encoded at a time)
+# ============================================================
+
+import json
+
+import numpy as np
+
+from json_stream import write_json
+
+POLYLINE_PRECISION = 5      # 1e-5 deg ≈ 1.1 m
+COMPACT_SUFFIX = ".polyline.json"
+
+
+# =========================
+# Polyline codec
+# =========================
+def _quantize(coords, precision):
+    """[[lat, lon], ...] → int64 (n, 2), rounded half away from zero like JS polyline encoders"""
+    a = np.asarray(coords, dtype=np.float64).reshape(-1, 2) * (10 ** precision)
+    return (np.sign(a) * np.floor(np.abs(a) + 0.5)).astype(np.int64)
+
+
+def encode_polyline(coords, precision=POLYLINE_PRECISION):
+    """[[lat, lon], ...] → encoded polyline string"""
+    q = _quantize(coords, precision)
+    if len(q) == 0:
+        return ""
+
+    deltas = np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # zigzag: sign into the lowest bit
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+
+    out = []
+    for v in values:
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """encoded polyline string → [[lat, lon], ...]"""
+    values = []
+    v = shift = 0
+    for ch in encoded:
+        b = ord(ch) - 63
+        v |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(v >> 1) if v & 1 else v >> 1)
+            v = shift = 0
+
+    q = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return (q / (10 ** precision)).tolist()
+
+
+# =========================
+# Sample files
+# =========================
+def _map_trip_routes(lt, fn):
+    for leg in lt.get("legs", []):
+        for obj in [leg] + leg.get("route_lods", []):
+            if obj.get("route") is not None:
+                obj["route"] = fn(obj["route"])
+
+
+def _map_routes(sample, fn):
+    for lt in sample.get("linked_trips", []):
+        _map_trip_routes(lt, fn)
+
+
+def encode_sample(sample, precision=POLYLINE_PRECISION):
+    """Sample dict → copy with polyline-encoded leg routes + header"""
+    out = json.loads(json.dumps(sample))
+    _map_routes(out, lambda r: encode_polyline(r, precision))
+    out["route_encoding"] = {"format": "polyline", "precision": precision, "order": "lat,lon"}
+    return out
+
+
+def decode_sample(sample):
+    """Inverse of encode_sample (in place); plain samples pass through"""
+    enc = sample.pop("route_encoding", None)
+    if enc is None:
+        return sample
+    if enc.get("format") != "polyline":
+        raise ValueError(f"unknown route encoding: {enc.get('format')!r}")
+
+    precision = enc["precision"]
+    _map_routes(sample, lambda r: decode_polyline(r, precision))
+    return sample
+
+
+def _encoded_trips(linked_trips, precision):
+    for lt in linked_trips:
+        lt = json.loads(json.dumps(lt))
+        _map_trip_routes(lt, lambda r: encode_polyline(r, precision))
+        yield lt
+
+
+def write_compact_sample(sample, path, precision=POLYLINE_PRECISION, coord_decimals=None):
+    """
+    encode_sample(sample) → compact JSON, streamed: sample["linked_trips"]
+    may be a generator and is encoded one linked trip at a time
+    """
+    out = dict(sample)
+    if "linked_trips" in out:
+        out["linked_trips"] = _encoded_trips(out["linked_trips"], precision)
+    out["route_encoding"] = {"format": "polyline", "precision": precision, "order": "lat,lon"}
+    write_json(out, path, indent=None, coord_decimals=coord_decimals)
+
+
+def read_sample(path):
+    """Read a {ORIG}_to_{DEST}.json or .polyline.json sample → decoded dict"""
+    with open(path, "r", encoding="utf-8") as f:
+        return decode_sample(json.load(f))
@@ -0,0 +1,100 @@
+# ============================================================
+# Route Simplification (Douglas–Peucker, metre tolerance, LODs)
+# - All legs at once: shapely.simplify on a local metric projection
+# - Kept vertices are ORIGINAL vertices (index carried in Z)
+# - One route per tolerance → zoom-level LODs (fine → coarse)
+# ============================================================
+
+import numpy as np
+import shapely
+
+EARTH_RADIUS_M = 6371008.8
+
+# fine → coarse; ≈ 1 screen pixel at zoom 14 / 12 / 10 (Salt Lake latitude)
+ROUTE_LOD_TOLERANCES_M = (5.0, 25.0, 100.0)
+
+
+def simplify_routes(geoms, tolerances_m=ROUTE_LOD_TOLERANCES_M):
+    """
+    LineStrings (lon, lat) → one list per tolerance of routes
+    [[lat, lon], ...] (None where a leg has < 2 finite vertices).
+
+    Non-finite vertices are dropped first. First and last vertices are
+    always kept, so route endpoints are the true leg endpoints.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    n = len(geoms)
+    empty = [[None] * n for _ in tolerances_m]
+    if n == 0:
+        return empty
+
+    valid = np.array([g is not None for g in geoms], dtype=bool)
+    coords, owner = shapely.get_coordinates(geoms[valid], return_index=True)
+    owner = np.flatnonzero(valid)[owner]
+
+    ok = np.isfinite(coords).all(axis=1)
+    coords, owner = coords[ok], owner[ok]
+
+    counts = np.bincount(owner, minlength=n)
+    has_line = counts >= 2
+    keep = has_line[owner]
+    coords, owner = coords[keep], owner[keep]
+    if len(coords) == 0:
+        return empty
+
+    # equirectangular metres around each leg's mean latitude
+    lat0 = np.radians(np.bincount(owner, coords[:, 1], minlength=n)[owner] / counts[owner])
+    x = np.radians(coords[:, 0]) * np.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(coords[:, 1]) * EARTH_RADIUS_M
+    z = np.arange(len(coords), dtype=np.float64)
+
+    leg_ids = np.flatnonzero(has_line)
+    dense = np.searchsorted(leg_ids, owner)
+    lines = shapely.linestrings(np.column_stack([x, y, z]), indices=dense)
+
+    out = []
+    for tol in tolerances_m:
+        simple = shapely.simplify(lines, tol, preserve_topology=False)
+        kept, which = shapely.get_coordinates(simple, include_z=True, return_index=True)
+        idx = kept[:, 2].astype(np.int64)
+
+        latlon = np.column_stack([coords[idx, 1], coords[idx, 0]]).tolist()
+        bounds = np.searchsorted(which, np.arange(len(leg_ids) + 1))
+
+        routes = [None] * n
+        for k, leg in enumerate(leg_ids):
+            routes[leg] = latlon[bounds[k]:bounds[k + 1]]
+        out.append(routes)
+
+    return out
+
+
+def route_endpoints(geoms):
+    """
+    LineStrings (lon, lat) → (has_route bool[n], ends float64[m, 4]) with
+    ends = (lat0, lon0, lat1, lon1) of every leg where has_route.
+
+    Same vertex rules as simplify_routes (finite vertices, >= 2 per leg),
+    whose routes always start / end at exactly these points.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    n = len(geoms)
+    valid = np.array([g is not None for g in geoms], dtype=bool)
+    if not valid.any():
+        return np.zeros(n, dtype=bool), np.empty((0, 4))
+
+    coords, owner = shapely.get_coordinates(geoms[valid], return_index=True)
+    owner = np.flatnonzero(valid)[owner]
+    ok = np.isfinite(coords).all(axis=1)
+    coords, owner = coords[ok], owner[ok]
+
+    counts = np.bincount(owner, minlength=n)
+    has_line = counts >= 2
+    last = np.cumsum(counts) - 1
+    first = last - counts + 1
+
+    ends = np.column_stack([
+        coords[first[has_line], 1], coords[first[has_line], 0],
+        coords[last[has_line], 1], coords[last[has_line], 0],
+    ])
+    return has_line, ends
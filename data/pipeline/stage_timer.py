@@ -0,0 +1,211 @@
+# ============================================================
+# Stage Instrumentation (run reports / benchmarks)
+# - start("stage") … stop(): wall time, CPU time, rows in / out,
+#   peak RSS (high-water mark at the end of the stage)
+# - Optional cProfile dump of one named stage
+# - JSON run report with the environment (commit, versions) so runs
+#   can be compared across commits
+# - Disabled timer: start / stop return immediately
+# ============================================================
+
+import cProfile
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def git_commit(repo_dir="."):
+    """(commit sha, dirty) of the repo, (None, None) outside git"""
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_dir,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir,
+            capture_output=True, text=True, check=True
+        ).stdout.strip() != ""
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def environment():
+    import numpy
+    import pandas
+    import pyarrow
+    import shapely
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "pyarrow": pyarrow.__version__,
+        "shapely": shapely.__version__,
+    }
+
+
+# =========================
+# Process probes
+# =========================
+def peak_rss_mb():
+    """Peak resident set size of this process so far (MB), None if unknown"""
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)     # Windows
+        if peak is not None:
+            return peak / 2 ** 20
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    return None
+
+
+def cpu_seconds():
+    """CPU time of this process + finished worker processes (where available)"""
+    cpu = time.process_time()
+    if resource is not None:
+        ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += ch.ru_utime + ch.ru_stime
+    return cpu
+
+
+# =========================
+# Timer
+# =========================
+class StageTimer:
+    """
+    timer = StageTimer(enabled=True, profile_stage="geometry")
+    timer.start("load", rows_in=n)
+    ...
+    timer.stop(rows_out=len(df))
+    timer.save("run_report.json")
+
+    start() closes a stage that is still open. A stage run more than
+    once accumulates time and rows. The profile of profile_stage is
+    dumped to profile_path (default: <report>.<stage>.prof on save).
+    """
+
+    def __init__(self, enabled=True, profile_stage=None, profile_path=None, script=None):
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path
+        self.script = script
+        self.stages = {}
+
+        self._open = None
+        self._profiler = None
+        self._t0 = time.perf_counter()
+        self._cpu0 = cpu_seconds() if enabled else 0.0
+
+    def start(self, stage, rows_in=None):
+        if not self.enabled:
+            return
+        if self._open is not None:
+            self.stop()
+
+        self._open = (stage, rows_in, time.perf_counter(), cpu_seconds())
+        if stage == self.profile_stage:
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self, rows_out=None, rows_in=None):
+        """Close the open stage; rows_in here overrides the one given to start"""
+        if not self.enabled or self._open is None:
+            return
+        stage, started_rows_in, t0, cpu0 = self._open
+        rows_in = started_rows_in if rows_in is None else rows_in
+        wall = time.perf_counter() - t0
+        cpu = cpu_seconds() - cpu0
+        self._open = None
+
+        if self._profiler is not None:
+            self._profiler.disable()
+
+        rec = self.stages.setdefault(stage, {
+            "wall_s": 0.0, "cpu_s": 0.0, "rows_in": None, "rows_out": None, "peak_rss_mb": None
+        })
+        rec["wall_s"] += wall
+        rec["cpu_s"] += cpu
+        if rows_in is not None:
+            rec["rows_in"] = (rec["rows_in"] or 0) + int(rows_in)
+        if rows_out is not None:
+            rec["rows_out"] = (rec["rows_out"] or 0) + int(rows_out)
+        rec["peak_rss_mb"] = peak_rss_mb()
+
+    # =========================
+    # Report
+    # =========================
+    def to_dict(self):
+        def rounded(rec):
+            return {
+                k: round(v, 6) if isinstance(v, float) else v
+                for k, v in rec.items()
+            }
+
+        return {
+            "stages": {k: rounded(v) for k, v in self.stages.items()},
+            "total": rounded({
+                "wall_s": time.perf_counter() - self._t0,
+                "cpu_s": cpu_seconds() - self._cpu0,
+                "peak_rss_mb": peak_rss_mb(),
+            }),
+        }
+
+    def summary(self):
+        """Human-readable table of the stages"""
+        lines = [f"{'stage':<12}{'wall s':>9}{'cpu s':>9}{'rows in':>11}{'rows out':>11}{'peak MB':>9}"]
+        for name, rec in self.to_dict()["stages"].items():
+            rows_in = "" if rec["rows_in"] is None else f"{rec['rows_in']:,}"
+            rows_out = "" if rec["rows_out"] is None else f"{rec['rows_out']:,}"
+            peak = "" if rec["peak_rss_mb"] is None else f"{rec['peak_rss_mb']:.0f}"
+            lines.append(
+                f"{name:<12}{rec['wall_s']:>9.3f}{rec['cpu_s']:>9.3f}{rows_in:>11}{rows_out:>11}{peak:>9}"
+            )
+        return "\n".join(lines)
+
+    def save(self, path):
+        if not self.enabled:
+            return
+        if self._open is not None:
+            self.stop()
+
+        report = {
+            "schema": "nova.complete_trip.run_report.v1",
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "script": self.script,
+            **self.to_dict(),
+        }
+
+        if self._profiler is not None:
+            prof = self.profile_path or f"{os.path.splitext(path)[0]}.{self.profile_stage}.prof"
+            self._profiler.dump_stats(prof)
+            report["profile"] = {"stage": self.profile_stage, "path": prof}
+
+        commit, dirty = git_commit(os.path.dirname(os.path.abspath(self.script or ".")))
+        report["commit"], report["dirty"] = commit, dirty
+        report["environment"] = environment()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
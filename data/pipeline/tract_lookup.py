@@ -0,0 +1,412 @@
+# ============================================================
+# Persistent geohash7 → Census Tract Lookup
+# - One Parquet file per tract layer, shared by every script; the
+#   layer's signature is kept in the file metadata and a lookup built
+#   from another layer (changed shapefile / geojson) is discarded
+# - Only UNSEEN geohashes are spatially joined (grows per month)
+# - Tract assignment = vectorized map, no per-row sjoin
+# - Unseen geohashes resolved by a geohash-prefix coverage index:
+#   cells inside one tract (or outside all) by key lookup, only cells
+#   on tract boundaries tested point-in-polygon (batched STRtree)
+# ============================================================
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from geohash_codec import (
+    decode_geohashes, decode_rounding, geohashes_from_keys, prefix_keys, to_arrow
+)
+
+# prefix lengths of the coverage index (geohash4 ≈ 39 × 20 km … geohash6 ≈ 1.2 × 0.6 km)
+PREFIX_LEVELS = (4, 5, 6)
+# predicates the index reproduces exactly (others fall back to gpd.sjoin)
+PREFIX_PREDICATES = ("within", "intersects")
+INDEX_VERSION = 1
+# geohashes per vectorized block (bounds the (n, 12) char matrix)
+ASSIGN_BLOCK = 1_000_000
+
+
+# Parquet metadata key of the tract-layer signature a lookup was built from
+SIGNATURE_KEY = b"tract_layer"
+
+
+def layer_signature(tracts, tract_col="GEOID", predicate="within"):
+    """Hash of what a geohash → tract assignment depends on (tract ids + geometries + predicate)"""
+    h = hashlib.sha256(repr((tract_col, predicate)).encode("utf-8"))
+    for tract, wkb in zip(tracts[tract_col].astype(str), shapely.to_wkb(tracts.geometry.to_numpy())):
+        h.update(tract.encode("utf-8"))
+        h.update(b"\0")
+        h.update(wkb if wkb is not None else b"")
+    return h.hexdigest()
+
+
+def lookup_signature(path):
+    """Tract-layer signature stored with a saved lookup (None if missing / unsigned)"""
+    if not os.path.exists(path):
+        return None
+    sig = (pq.read_schema(path).metadata or {}).get(SIGNATURE_KEY)
+    return sig.decode("utf-8") if sig is not None else None
+
+
+def load_lookup(path, signature=None):
+    """
+    Stored cache → pd.Series (geohash index → tract), no tract layer needed.
+    With a signature, a lookup built from another tract layer loads empty.
+    """
+    if not os.path.exists(path) or (signature is not None and lookup_signature(path) != signature):
+        return pd.Series([], index=pd.Index([], dtype=object), dtype=object)
+    stored = pd.read_parquet(path, columns=["geohash", "tract"])
+    return pd.Series(
+        stored["tract"].to_numpy(dtype=object),
+        index=stored["geohash"].to_numpy(dtype=object),
+    )
+
+
+# =========================
+# Prefix coverage index
+# =========================
+def _cell_bits(p):
+    """(lon bits, lat bits) of a geohash of length p"""
+    return (5 * p + 1) // 2, 5 * p // 2
+
+
+def _interleave(lon_idx, lat_idx, p):
+    """cell column / row → prefix key (bits alternate lon, lat; lon first)"""
+    key = np.zeros(len(lon_idx), dtype=np.int64)
+    lon_bits, lat_bits = _cell_bits(p)
+    for b in range(5 * p):
+        if b % 2 == 0:
+            lon_bits -= 1
+            bit = (lon_idx >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            bit = (lat_idx >> lat_bits) & 1
+        key = (key << 1) | bit
+    return key
+
+
+def _cell_bounds(keys, p):
+    """prefix keys → (west, south, east, north) of their cells"""
+    lon_idx = np.zeros(len(keys), dtype=np.int64)
+    lat_idx = np.zeros(len(keys), dtype=np.int64)
+    for b in range(5 * p):
+        bit = (keys >> (5 * p - 1 - b)) & 1
+        if b % 2 == 0:
+            lon_idx = (lon_idx << 1) | bit
+        else:
+            lat_idx = (lat_idx << 1) | bit
+
+    lon_bits, lat_bits = _cell_bits(p)
+    w, h = 360.0 / 2 ** lon_bits, 180.0 / 2 ** lat_bits
+    west, south = -180.0 + lon_idx * w, -90.0 + lat_idx * h
+    return west, south, west + w, south + h
+
+
+class TractPrefixIndex:
+    """
+    geohash → tract id with the same result as
+        gpd.sjoin(points(decode_geohashes(g)), tracts, predicate)
+    (a point matching several tracts keeps sjoin's last match).
+
+    index = TractPrefixIndex(tracts, "GEOID", predicate="within")
+    index.assign(geohashes)     # object array, None = outside every tract
+
+    Decoded points are rounded (pgh.decode), so a prefix cell is resolved
+    only if its box, grown by the rounding, lies inside exactly one tract
+    (contains_properly) or touches none. Everything else — boundary cells,
+    other lengths, invalid strings — goes to one batched STRtree query.
+    """
+
+    def __init__(self, tracts, tract_col="GEOID", predicate="within",
+                 precision=7, levels=PREFIX_LEVELS, _cells=None):
+        if predicate not in PREFIX_PREDICATES:
+            raise ValueError(f"predicate must be one of {PREFIX_PREDICATES}, got {predicate!r}")
+        self.tract_ids = tracts[tract_col].to_numpy(dtype=object)
+        self.geoms = np.asarray(tracts.geometry.to_numpy(), dtype=object)
+        self.predicate = predicate
+        self.precision = precision
+        self.levels = tuple(p for p in levels if p < precision)
+        self.tree = shapely.STRtree(self.geoms)
+
+        # {level: (sorted prefix keys, tract position or -1 = outside)}
+        self.cells = _cells if _cells is not None else self._build()
+
+    @classmethod
+    def signature(cls, tracts, tract_col="GEOID", predicate="within",
+                  precision=7, levels=PREFIX_LEVELS):
+        """Hash of everything the index depends on (tract layer + levels)"""
+        h = hashlib.sha256(repr((INDEX_VERSION, precision, tuple(levels))).encode("utf-8"))
+        h.update(layer_signature(tracts, tract_col, predicate).encode("utf-8"))
+        return h.hexdigest()
+
+    # =========================
+    # Build
+    # =========================
+    def _build(self):
+        cells = {}
+        if not self.levels:
+            return cells
+
+        lat_r, lon_r = decode_rounding(self.precision)
+        lat_r, lon_r = lat_r + 1e-9, lon_r + 1e-9
+        minx, miny, maxx, maxy = shapely.total_bounds(self.geoms)
+
+        # coarsest level: every cell over the layer's bounds
+        p = self.levels[0]
+        lon_bits, lat_bits = _cell_bits(p)
+        w, h = 360.0 / 2 ** lon_bits, 180.0 / 2 ** lat_bits
+        cols = np.arange(int((minx - lon_r + 180) // w), int((maxx + lon_r + 180) // w) + 1)
+        rows = np.arange(int((miny - lat_r + 90) // h), int((maxy + lat_r + 90) // h) + 1)
+        cols, rows = np.meshgrid(cols, rows)
+        keys = _interleave(cols.ravel(), rows.ravel(), p)
+
+        for i, p in enumerate(self.levels):
+            west, south, east, north = _cell_bounds(keys, p)
+            boxes = shapely.box(west - lon_r, south - lat_r, east + lon_r, north + lat_r)
+
+            cell, tract = self.tree.query(boxes, predicate="intersects")
+            hits = np.bincount(cell, minlength=len(keys))
+            only = np.full(len(keys), -1, dtype=np.int64)
+            only[cell] = tract      # meaningful where hits == 1
+
+            inside = hits == 1
+            inside[inside] = shapely.contains_properly(self.geoms[only[inside]], boxes[inside])
+            resolved = inside | (hits == 0)
+
+            order = np.argsort(keys[resolved])
+            cells[p] = (keys[resolved][order], np.where(inside, only, -1)[resolved][order])
+
+            if i + 1 < len(self.levels):
+                step = self.levels[i + 1] - p
+                children = np.arange(32 ** step, dtype=np.int64)
+                keys = ((keys[~resolved] << (5 * step))[:, None] | children).ravel()
+
+        return cells
+
+    # =========================
+    # Lookup
+    # =========================
+    def positions(self, geohashes):
+        """geohashes → tract positions in the layer (-1 = none)"""
+        arr = to_arrow(geohashes)
+        out = np.empty(len(arr), dtype=np.int64)
+        for start in range(0, len(arr), ASSIGN_BLOCK):
+            block = arr.slice(start, ASSIGN_BLOCK)
+            out[start:start + len(block)] = self._positions(block)
+        return out
+
+    def _positions(self, arr):
+        keys, lengths = prefix_keys(arr, self.levels + (self.precision,))
+        full = np.where(lengths == self.precision, keys[self.precision], -1)
+        out = np.full(len(arr), -1, dtype=np.int64)
+        done = np.zeros(len(arr), dtype=bool)
+
+        for p in self.levels:
+            cell_keys, cell_tract = self.cells[p]
+            if len(cell_keys) == 0:
+                continue
+            k = np.where(full >= 0, keys[p], -1)
+            at = np.minimum(np.searchsorted(cell_keys, k), len(cell_keys) - 1)
+            hit = ~done & (k >= 0)
+            hit[hit] = cell_keys[at[hit]] == k[hit]
+            out[hit] = cell_tract[at[hit]]
+            done |= hit
+
+        # boundary cells: each distinct geohash decoded once
+        boundary = np.flatnonzero(~done & (full >= 0))
+        if len(boundary):
+            codes, uniq = pd.factorize(full[boundary])
+            lat, lon = decode_geohashes(geohashes_from_keys(uniq, self.precision))
+            out[boundary] = self._point_positions(lat, lon)[codes]
+
+        # other lengths / invalid strings (NaN points match nothing)
+        other = np.flatnonzero(~done & (full < 0))
+        if len(other):
+            lat, lon = decode_geohashes(arr.take(other))
+            out[other] = self._point_positions(lat, lon)
+
+        return out
+
+    def _point_positions(self, lat, lon):
+        """Batched STRtree point-in-polygon, each distinct point tested once"""
+        out = np.full(len(lat), -1, dtype=np.int64)
+        ok = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if len(ok) == 0:
+            return out
+
+        # hash-based dedupe of exact (lon, lat) pairs
+        inverse, xy = pd.factorize(lon[ok] + 1j * lat[ok])
+        point, tract = self.tree.query(shapely.points(xy.real, xy.imag), predicate=self.predicate)
+
+        # sjoin order: "within" sorted by tract, otherwise STRtree order
+        order = (
+            np.lexsort((tract, point)) if self.predicate == "within"
+            else np.argsort(point, kind="stable")
+        )
+        point, tract = point[order], tract[order]
+        last = np.append(point[1:] != point[:-1], True)
+
+        pos = np.full(len(xy), -1, dtype=np.int64)
+        pos[point[last]] = tract[last]
+        out[ok] = pos[inverse]
+        return out
+
+    def assign(self, geohashes):
+        """geohashes → object array of tract ids (None = outside every tract)"""
+        pos = self.positions(geohashes)
+        out = np.full(len(pos), None, dtype=object)
+        out[pos >= 0] = self.tract_ids[pos[pos >= 0]]
+        return out
+
+    def stats(self):
+        """Resolved prefix cells per level (inside a tract / outside all)"""
+        return {
+            p: {"inside": int((tract >= 0).sum()), "outside": int((tract < 0).sum())}
+            for p, (_, tract) in self.cells.items()
+        }
+
+    # =========================
+    # IO
+    # =========================
+    def save(self, path, signature):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {"signature": np.array(signature)}
+        for p, (keys, tract) in self.cells.items():
+            arrays[f"keys_{p}"], arrays[f"tract_{p}"] = keys, tract
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def cached(cls, path, tracts, tract_col="GEOID", predicate="within",
+               precision=7, levels=PREFIX_LEVELS):
+        """Index stored at path if built from the same tract layer, else build + save"""
+        sig = cls.signature(tracts, tract_col, predicate, precision, levels)
+        if os.path.exists(path):
+            with np.load(path) as stored:
+                if str(stored["signature"]) == sig:
+                    cells = {
+                        p: (stored[f"keys_{p}"], stored[f"tract_{p}"])
+                        for p in levels if p < precision
+                    }
+                    return cls(tracts, tract_col, predicate, precision, levels, _cells=cells)
+
+        index = cls(tracts, tract_col, predicate, precision, levels)
+        index.save(path, sig)
+        return index
+
+
+# =========================
+# Persistent cache
+# =========================
+class GeohashTractCache:
+    """
+    geohash7 → tract id, backed by a two-column Parquet file
+    (geohash, tract). Geohashes outside every tract are stored with a
+    null tract so they are never joined again.
+
+    The file carries the signature of the tract layer (+ predicate) it
+    was joined against; when that differs from `tracts`, every stored
+    assignment is dropped and geohashes are joined again.
+
+    Unseen geohashes are resolved with a TractPrefixIndex (built on first
+    use, kept at index_path when given) for "within" / "intersects",
+    otherwise with gpd.sjoin.
+    """
+
+    def __init__(self, path, tracts, tract_col="GEOID", predicate="within", index_path=None):
+        self.path = path
+        self.tract_col = tract_col
+        self.predicate = predicate
+        self.tracts = tracts[[tract_col, "geometry"]]
+        self.index_path = index_path
+        self.index = None
+
+        self.signature = layer_signature(self.tracts, tract_col, predicate)
+        self.stored_signature = lookup_signature(path)
+        if os.path.exists(path) and self.stored_signature != self.signature:
+            print(f"[INFO] {path} was built from another tract layer → rebuilding the lookup")
+
+        self.table = load_lookup(path, self.signature)
+        self.added = 0
+
+    def __len__(self):
+        return len(self.table)
+
+    # =========================
+    # Grow
+    # =========================
+    def update(self, geohashes):
+        """Spatially join geohashes not yet in the cache; returns # added"""
+        uniq = pd.unique(pd.Series(geohashes).dropna())
+        new = uniq[~pd.Index(uniq).isin(self.table.index)]
+        if len(new) == 0:
+            return 0
+
+        if self.predicate in PREFIX_PREDICATES:
+            found = pd.Series(self.prefix_index().assign(new), index=np.asarray(new, dtype=object))
+        else:
+            found = self._sjoin(new)
+
+        self.table = pd.concat([self.table, found])
+        self.added += len(found)
+        return len(found)
+
+    def prefix_index(self):
+        if self.index is None:
+            if self.index_path:
+                self.index = TractPrefixIndex.cached(
+                    self.index_path, self.tracts, self.tract_col, self.predicate
+                )
+            else:
+                self.index = TractPrefixIndex(self.tracts, self.tract_col, self.predicate)
+        return self.index
+
+    def _sjoin(self, new):
+        lat, lon = decode_geohashes(new)
+
+        gh_gdf = gpd.GeoDataFrame(
+            {"geohash": new},
+            geometry=gpd.points_from_xy(lon, lat),
+            crs="EPSG:4326"
+        )
+        joined = gpd.sjoin(gh_gdf, self.tracts, how="left", predicate=self.predicate)
+
+        # dict(zip(...)) semantics: a point matching several tracts keeps the last
+        joined = joined.drop_duplicates("geohash", keep="last")
+        tract = joined[self.tract_col].to_numpy(dtype=object)
+        tract[pd.isna(tract)] = None
+        return pd.Series(tract, index=joined["geohash"].to_numpy(dtype=object))
+
+    def save(self):
+        """Write the cache atomically (only when something was added or the layer changed)"""
+        if not self.added and self.stored_signature == self.signature:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        table = pa.Table.from_pandas(pd.DataFrame({
+            "geohash": self.table.index.astype(str),
+            "tract": self.table.to_numpy(dtype=object),
+        }), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}), SIGNATURE_KEY: self.signature.encode("utf-8")
+        })
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.path)
+        self.added = 0
+        self.stored_signature = self.signature
+
+    # =========================
+    # Lookup
+    # =========================
+    def map(self, geohashes):
+        """Vectorized geohash → tract (NaN when unknown / outside)"""
+        return pd.Series(geohashes).map(self.table)
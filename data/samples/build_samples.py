@@ -1,59 +1,102 @@
 import pandas as pd
-import json
+import numpy as np
+import shapely
+import os
+import sys
 from shapely import wkt
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from route_simplify import simplify_routes
+from json_stream import write_json
+
 # =========================
 # Paths
 # =========================
 CSV_PATH = "./data/samples/selected_linked_trips.csv"
 OUT_JSON = "./data/samples/samples.json"
 
+# Douglas–Peucker tolerance (m): keeps turns, drops straight-run vertices
+ROUTE_TOLERANCE_M = 5.0
+
 # =========================
 # Load data
 # =========================
 df = pd.read_csv(CSV_PATH)
+n = len(df)
+
+# 强制字符串 ID（安全）; missing ids of text columns become "None"
+df["trip_id"] = df["trip_id"].where(pd.notnull(df["trip_id"]), None).astype(str)
+
 
-# 统一把所有 NaN → None，保证 JSON 不会出现 NaN
-df = df.where(pd.notnull(df), None)
+# =========================
+# Columns → JSON-safe lists（NaN → None in bulk）
+# =========================
+def column(name):
+    """Column as a list of Python scalars, NaN / NA / ±inf → None (all None if absent)"""
+    if name not in df.columns:
+        return [None] * n
+    s = df[name]
+    if s.dtype.kind == "f":
+        s = s.where(np.isfinite(s))
+    s = s.astype(object)
+    return s.where(s.notna(), None).tolist()
 
-# 强制字符串 ID（安全）
-df["trip_id"] = df["trip_id"].astype(str)
 
 # =========================
-# Geometry parser
+# Geometry（all WKTs parsed at once）
 # =========================
-def parse_geometry(wkt_str, trip_id):
-    """Parse LINESTRING WKT → [[lat, lng], ...] for Leaflet"""
-    if not isinstance(wkt_str, str) or not wkt_str.startswith("LINESTRING"):
-        print(f"[WARN] Invalid geometry for trip {trip_id}")
-        return None
+def parse_geometries(wkts, trip_ids):
+    """LINESTRING WKTs → [[lat, lng], ...] per row (None = skipped) for Leaflet"""
+    wkts = pd.Series(wkts, dtype=object)
+    is_linestring = wkts.str.startswith("LINESTRING", na=False).to_numpy(dtype=bool)
 
-    try:
-        geom = wkt.loads(wkt_str)
-        coords = [[lat, lng] for lng, lat in geom.coords]
+    geoms = np.full(len(wkts), None, dtype=object)
+    with np.errstate(invalid="ignore"):     # NaN coordinates are dropped later
+        geoms[is_linestring] = shapely.from_wkt(wkts[is_linestring].to_numpy(), on_invalid="ignore")
 
-        # 简单抽稀（demo）
-        if len(coords) > 400:
-            coords = coords[::3]
+    # routes are (lon, lat) pairs: non-empty Z / M / ZM lines are rejected,
+    # as when their coordinates were unpacked into two values
+    parsed = np.flatnonzero(pd.notnull(geoms))
+    extra_dims = np.zeros(len(wkts), dtype=bool)
+    extra_dims[parsed] = (
+        (shapely.get_coordinate_dimension(geoms[parsed]) > 2) & ~shapely.is_empty(geoms[parsed])
+    )
+    geoms[extra_dims] = None
 
-        return coords
+    # log rejected rows in row order (parse errors re-raised one by one for the message)
+    for i in np.flatnonzero(~is_linestring | pd.isnull(geoms)):
+        if not is_linestring[i]:
+            print(f"[WARN] Invalid geometry for trip {trip_ids[i]}")
+            continue
+        if extra_dims[i]:
+            print(f"[ERROR] Geometry parse failed for {trip_ids[i]}: too many values to unpack (expected 2)")
+            continue
+        try:
+            wkt.loads(wkts.iat[i])
+        except Exception as e:
+            print(f"[ERROR] Geometry parse failed for {trip_ids[i]}: {e}")
 
-    except Exception as e:
-        print(f"[ERROR] Geometry parse failed for {trip_id}: {e}")
-        return None
+    routes = simplify_routes(geoms, (ROUTE_TOLERANCE_M,))[0]
+
+    # parsed lines with < 2 finite vertices keep the vertices they have
+    # (LINESTRING EMPTY → route []), as before simplification
+    for i in np.flatnonzero(pd.notnull(geoms)):
+        if routes[i] is None:
+            coords = shapely.get_coordinates(geoms[i])
+            routes[i] = [[lat, lon] for lon, lat in coords[np.isfinite(coords).all(axis=1)].tolist()]
+    return routes
 
 
 # =========================
-# Duration (minutes)
+# Duration (minutes, one vector op; unparsable → None)
 # =========================
-def compute_duration_min(row):
-    try:
-        t0 = pd.to_datetime(row["local_datetime_start"])
-        t1 = pd.to_datetime(row["local_datetime_end"])
-        return round((t1 - t0).total_seconds() / 60, 1)
-    except Exception:
-        return None
+def compute_duration_min():
+    t0 = pd.to_datetime(df["local_datetime_start"], errors="coerce", format="mixed")
+    t1 = pd.to_datetime(df["local_datetime_end"], errors="coerce", format="mixed")
+    minutes = ((t1 - t0).dt.total_seconds() / 60).tolist()
+    # Python round (not np.round) keeps the exact decimal rounding of before
+    return [None if m != m else round(m, 1) for m in minutes]
 
 
 # =========================
@@ -73,85 +116,95 @@ def normalize_mode(m):
     return "other"
 
 
+def normalize_modes(modes):
+    """normalize_mode once per distinct value"""
+    codes, uniques = pd.factorize(pd.Series(modes, dtype=object))
+    lookup = np.array([normalize_mode(m) for m in uniques] + ["unknown"], dtype=object)
+    return lookup[codes].tolist()      # code -1 (missing) → last entry
+
+
+# =========================
+# Build samples（kept rows only, one dict at a time while writing）
 # =========================
-# Helper: ensure no NaN sneaks in
-# =========================
-def clean(x):
-    """Convert pandas NaN / None / float('nan') → None (JSON null)"""
-    if x is None:
-        return None
-    if isinstance(x, float) and pd.isna(x):
-        return None
-    return x
-
-
-# =========================
-# Build samples
-# =========================
-samples = []
-
-for _, r in df.iterrows():
-    route = parse_geometry(r["full_geometry_wkt"], r["trip_id"])
-    if route is None:
-        continue
-
-    duration = compute_duration_min(r)
-
-    sample = {
-        "id": r["trip_id"],
-        "mode": normalize_mode(r["travel_mode"]),
-        "route": route,
-
-        # ===== Numeric attributes =====
-        "duration_min": clean(duration),
-        "network_distance_km": clean(r.get("network_distance")),
-        "route_distance_km": clean(r.get("route_distance")),
-
-        # ===== OD =====
-        "origin": {
-            "lon": clean(r.get("orig_lon")),
-            "lat": clean(r.get("orig_lat")),
-            "geohash": clean(r.get("geohash7_orig"))
-        },
-        "destination": {
-            "lon": clean(r.get("dest_lon")),
-            "lat": clean(r.get("dest_lat")),
-            "geohash": clean(r.get("geohash7_dest"))
-        },
-
-        # ===== Transit context =====
-        "access": {
-            "stop_id": clean(r.get("access_stop_id")),
-            "stop_name": clean(r.get("access_stop"))
-        },
-        "egress": {
-            "stop_id": clean(r.get("egress_stop_id")),
-            "stop_name": clean(r.get("egress_stop"))
-        },
-
-        # ===== Metadata =====
-        "meta": {
-            "linked_trip_id": clean(r.get("linked_trip_id")),
-            "tour_id": clean(r.get("tour_id")),
-            "purpose": clean(r.get("trip_purpose")),
-            "weight": clean(r.get("trip_weight")),
-            "trip_count": clean(r.get("trip_count"))
+trip_ids = df["trip_id"].tolist()
+routes = parse_geometries(column("full_geometry_wkt"), trip_ids)
+keep = [i for i, route in enumerate(routes) if route is not None]
+
+
+def kept(values):
+    return [values[i] for i in keep]
+
+
+c = {
+    name: kept(column(name))
+    for name in [
+        "trip_id", "network_distance", "route_distance",
+        "orig_lon", "orig_lat", "geohash7_orig",
+        "dest_lon", "dest_lat", "geohash7_dest",
+        "access_stop_id", "access_stop", "egress_stop_id", "egress_stop",
+        "linked_trip_id", "tour_id", "trip_purpose", "trip_weight", "trip_count",
+    ]
+}
+c["mode"] = kept(normalize_modes(column("travel_mode")))
+c["route"] = kept(routes)
+c["duration_min"] = kept(compute_duration_min())
+
+
+def iter_samples():
+    for k in range(len(keep)):
+        yield {
+            "id": c["trip_id"][k],
+            "mode": c["mode"][k],
+            "route": c["route"][k],
+
+            # ===== Numeric attributes =====
+            "duration_min": c["duration_min"][k],
+            "network_distance_km": c["network_distance"][k],
+            "route_distance_km": c["route_distance"][k],
+
+            # ===== OD =====
+            "origin": {
+                "lon": c["orig_lon"][k],
+                "lat": c["orig_lat"][k],
+                "geohash": c["geohash7_orig"][k]
+            },
+            "destination": {
+                "lon": c["dest_lon"][k],
+                "lat": c["dest_lat"][k],
+                "geohash": c["geohash7_dest"][k]
+            },
+
+            # ===== Transit context =====
+            "access": {
+                "stop_id": c["access_stop_id"][k],
+                "stop_name": c["access_stop"][k]
+            },
+            "egress": {
+                "stop_id": c["egress_stop_id"][k],
+                "stop_name": c["egress_stop"][k]
+            },
+
+            # ===== Metadata =====
+            "meta": {
+                "linked_trip_id": c["linked_trip_id"][k],
+                "tour_id": c["tour_id"][k],
+                "purpose": c["trip_purpose"][k],
+                "weight": c["trip_weight"][k],
+                "trip_count": c["trip_count"][k]
+            }
         }
-    }
 
-    samples.append(sample)
 
 # =========================
-# Output JSON
+# Output JSON（same text as json.dump(out, f, indent=2), streamed）
 # =========================
 out = {
     "schema": "nova.complete_trip.sample.v1",
     "generated_at": datetime.utcnow().isoformat() + "Z",
-    "count": len(samples),
-    "samples": samples
+    "count": len(keep),
+    "samples": iter_samples()
 }
 
-with open(OUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(out, f, indent=2)
+write_json(out, OUT_JSON, indent=2)
 
-print(f"✅ Saved {len(samples)} samples → {OUT_JSON}")
+print(f"✅ Saved {len(keep)} samples → {OUT_JSON}")
@@ -0,0 +1,79 @@
+# ============================================================
+# Year / Any-Range OD Stats from Monthly Sketches
+# - Merges the per-month sketches written by the sample builder
+# - No trip data is re-read
+# - nova.complete_trip.od_stats.v1 fields + an "approximation" note;
+#   duration percentiles within the sketch's relative error (see
+#   pipeline/od_sketch.py)
+# - Written as {O}_to_{D}.stats.approx.json, never over the builder's
+#   exact {O}_to_{D}.stats.json
+# ============================================================
+
+# =========================
+# CONFIG
+# =========================
+BASE_DIR = "C:/Users/rli04/Villanova University/Complete-trip-coordinate - Documents/General"
+SKETCH_DIR = f"{BASE_DIR}/Salt_Lake/cache/od_sketch"
+
+# None = every month with a sketch; e.g. ["2020-01", "2020-02", "2020-03"]
+MONTHS = None
+
+OUTPUT_DIR = "./data/samples"
+# distinct from the builder's exact ".stats.json" (read by the front end)
+STATS_SUFFIX = ".stats.approx.json"
+# 2 = indented (readable), None = compact
+JSON_INDENT = 2
+
+# =========================
+# IMPORTS
+# =========================
+import glob
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from od_sketch import ODSketch, RELATIVE_ACCURACY
+from json_stream import write_json
+
+# =========================
+# MERGE
+# =========================
+paths = sorted(glob.glob(f"{SKETCH_DIR}/*.npz"))
+if MONTHS is not None:
+    paths = [p for p in paths if os.path.splitext(os.path.basename(p))[0] in MONTHS]
+
+sketch = ODSketch.merge([ODSketch.load(p) for p in paths])
+months = sketch.months
+
+if not months:
+    sys.exit(f"No sketches found in {SKETCH_DIR}")
+
+year = months[0][:4]
+all_year = months == [f"{year}-{m:02d}" for m in range(1, 13)]
+COVERAGE_TEMPORAL = f"year-{year}" if all_year else ",".join(months)
+
+print(f"Merged {len(paths)} monthly sketches → {len(sketch.summary)} OD pairs ({COVERAGE_TEMPORAL})")
+
+# =========================
+# EXPORT
+# =========================
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+for (ORIG, DEST), fields in sketch.stats().items():
+    stats = {
+        "schema": "nova.complete_trip.od_stats.v1",
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "od": {"origin": ORIG, "destination": DEST},
+        "coverage": {"temporal": COVERAGE_TEMPORAL, "spatial": "Salt Lake 6-county"},
+        **fields,
+        "approximation": {
+            "trip_duration_percentiles": "log-bucket sketch",
+            "relative_error": RELATIVE_ACCURACY
+        }
+    }
+
+    stats_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}{STATS_SUFFIX}"
+    write_json(stats, stats_path, indent=JSON_INDENT)
+
+    print(f"✓ Stats written → {stats_path}")
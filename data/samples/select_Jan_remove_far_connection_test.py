@@ -4,23 +4,68 @@
 # - Geometry built only for needed trips
 # - JSON-safe
 # - 100% OLD JSON schema compatible
+# - Checkpointed stages (tract join → OD filter → load → geometry →
+#   assembly → stats → export), reruns resume after the last one
 # ============================================================
 
 # =========================
 # CONFIG
 # =========================
-BASE_DIR = "C:/Users/rli04/Villanova University/Complete-trip-coordinate - Documents/General"
+import os
+
+# env overrides let the benchmark suite (data/bench) point the builder
+# at a synthetic tree
+BASE_DIR = os.environ.get(
+    "COMPLETE_TRIP_BASE_DIR",
+    "C:/Users/rli04/Villanova University/Complete-trip-coordinate - Documents/General"
+)
 PARQUET_DIR = f"{BASE_DIR}/Salt_Lake/delivery"
 TRACT_SHP = (
     f"{BASE_DIR}/Manuscript/Figure/Visualization-RL/"
     f"2-OD patterns by census track/six_counties_track.shp"
 )
+# geohash7 → GEOID lookup shared by all builders (grows incrementally)
+TRACT_CACHE = f"{BASE_DIR}/Salt_Lake/cache/geohash7_to_six_counties_track.parquet"
+# geohash-prefix cells → tract for unseen geohashes (rebuilt when the shapefile changes)
+TRACT_INDEX = f"{BASE_DIR}/Salt_Lake/cache/six_counties_track.prefix_index.npz"
+# input fingerprints + which outputs they produced (incremental rebuilds)
+MANIFEST_PATH = f"{BASE_DIR}/Salt_Lake/cache/manifest_select_Jan.json"
+# mergeable per-month OD stats sketches (see od_stats_from_sketches.py)
+SKETCH_DIR = f"{BASE_DIR}/Salt_Lake/cache/od_sketch"
+NETWORK_DIR = f"{BASE_DIR}/Salt_Lake/supplementInputs/network"
+# parsed link tables (.npy, memory-mapped; rebuilt when a link.csv changes)
+NETWORK_CACHE_DIR = f"{BASE_DIR}/Salt_Lake/cache/network"
+# built leg geometries keyed by (network, node sequence); None = no persistence
+ROUTE_CACHE = f"{BASE_DIR}/Salt_Lake/cache/route_geometry.parquet"
+ROUTE_CACHE_MAX = 500_000
+# per-stage Parquet / GeoParquet outputs; a failed run resumes after the
+# last completed stage. Removed after a successful export unless kept
+CHECKPOINT_DIR = f"{BASE_DIR}/Salt_Lake/cache/checkpoints/select_Jan"
+KEEP_CHECKPOINTS = False
 
 MONTHS = ["Jan"]
 MAX_DIST_MILES = 1.0
-
-OUTPUT_DIR = "./data/samples"
-import os
+# Douglas–Peucker tolerances (m), fine → coarse: leg "route" = finest,
+# leg "route_lods" = the coarser zoom levels
+ROUTE_LODS_M = (5.0, 25.0, 100.0)
+
+OUTPUT_DIR = os.environ.get("COMPLETE_TRIP_OUTPUT_DIR", "./data/samples")
+# per-stage run report (wall / CPU time, rows, peak RSS) → JSON; None = off
+RUN_REPORT = os.environ.get("COMPLETE_TRIP_RUN_REPORT")
+# cProfile one stage (e.g. "geometry") → <report>.<stage>.prof
+PROFILE_STAGE = os.environ.get("COMPLETE_TRIP_PROFILE_STAGE")
+# print the loaded table's footprint as object vs typed columns (diagnostic:
+# every batch is converted a second time); off unless the env var is set
+MEMORY_REPORT = bool(os.environ.get("COMPLETE_TRIP_MEMORY_REPORT"))
+# "json" → {O}_to_{D}.json (indent=2), "polyline" → {O}_to_{D}.polyline.json
+# (encoded-polyline routes, compact; see pipeline/route_codec.py)
+SAMPLE_FORMATS = ["json"]
+# JSON layout of sample / stats files: 2 = indented (published format),
+# None = compact (opt-in; no whitespace, smallest and fastest to write)
+JSON_INDENT = 2
+# lat / lon / route / tract geometry coordinates rounded to this many
+# decimals (e.g. 6 ≈ 0.1 m, opt-in); None = full float precision
+COORD_DECIMALS = None
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 OD_PAIRS = [
@@ -38,46 +83,69 @@ OD_PAIRS = [
     ("49035101402", "49035110106"),
 ]
 
+# optional pair list (e.g. "./data/OD/od_dashboard_topk.json") → replaces
+# OD_PAIRS; every pair is built from the same single scan of the trips
+OD_PAIRS_FILE = None
+OD_PAIRS_MONTHS = None      # e.g. ["2020-01"]; None = pairs of every month
+
 # =========================
 # IMPORTS
 # =========================
 import pandas as pd
 import numpy as np
 import geopandas as gpd
-import pygeohash as pgh
-from shapely.geometry import Point, LineString, mapping
-from shapely import wkt
+from shapely.geometry import mapping
 import glob
 import json
-import math
+import sys
 from datetime import datetime, timedelta
-from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from geometry_engine import LinkGeometryTable, RouteGeometryEngine
+from route_cache import RouteGeometryCache
+from od_pairs import build_od_index, first_last_tracts, load_od_pairs
+from ingest import month_files, iter_trip_batches, read_trips, isin_filter
+from tract_lookup import GeohashTractCache
+from geohash_codec import decode_geohashes
+from manifest import Manifest, params_hash
+from route_codec import write_compact_sample, COMPACT_SUFFIX
+from json_stream import write_json
+from route_simplify import simplify_routes, route_endpoints
+from od_stats import table_stats
+from linked_trips import (
+    LEG_COLUMNS, TRIP_COLUMNS, assemble_linked_trips, linked_trip_records,
+    pair_ranges, trip_months, trip_table
+)
+from od_sketch import ODSketch
+from stage_timer import StageTimer
+from checkpoint import CheckpointPipeline
+
+timer = StageTimer(enabled=bool(RUN_REPORT), profile_stage=PROFILE_STAGE, script=__file__)
+timer.start("setup")
 
 # =========================
 # UTILS
 # =========================
-def is_finite(x):
-    return x is not None and isinstance(x, (int, float)) and math.isfinite(x)
-
-def clean_num(x):
-    try:
-        x = float(x)
-        return x if math.isfinite(x) else None
-    except:
-        return None
-
-def safe_decode_geohash(gh):
-    try:
-        lat, lon = pgh.decode(gh)
-        if is_finite(lat) and is_finite(lon):
-            return lon, lat
-    except:
-        pass
-    return None, None
+def clean_str(x):
+    # typed loader: missing strings are pd.NA / NaN (categoricals) → null
+    return None if x is None or pd.isna(x) else x
 
 def to_iso(t):
     return t.isoformat() if t is not None else None
 
+def haversine_miles(lon1, lat1, lon2, lat2):
+    R = 3958.8  # Earth radius in miles
+    lon1, lat1, lon2, lat2 = map(
+        np.radians, [lon1, lat1, lon2, lat2]
+    )
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    )
+    return 2 * R * np.arcsin(np.sqrt(a))
+
 # =========================
 # LOAD DATA
 # =========================
@@ -92,24 +160,57 @@ USE_COLS = [
     "route_taken"
 ]
 
-dfs = []
-for m in MONTHS:
-    files = glob.glob(f"{PARQUET_DIR}/Salt_Lake-{m}-2020/*.snappy.parquet")
-    dfs.extend([pd.read_parquet(f, columns=USE_COLS) for f in files])
+KEY_COLS = [
+    "linked_trip_id", "local_datetime_start",
+    "geohash7_orig", "geohash7_dest"
+]
 
-df = pd.concat(dfs, ignore_index=True)
-df["local_datetime_start"] = pd.to_datetime(df["local_datetime_start"], errors="coerce")
-df["local_datetime_end"] = pd.to_datetime(df["local_datetime_end"], errors="coerce")
-df = df[df["local_datetime_end"] > df["local_datetime_start"]]
+files = month_files(PARQUET_DIR, MONTHS)
 
-df["duration_min"] = (
-    df["local_datetime_end"] - df["local_datetime_start"]
-).dt.total_seconds() / 60
+# "Jan" → "2020-01"; stats coverage = the months actually processed
+MONTH_LABELS = [pd.to_datetime(f"{m} 2020").strftime("%Y-%m") for m in MONTHS]
+COVERAGE_TEMPORAL = "year-2020" if len(MONTHS) == 12 else ",".join(MONTH_LABELS)
 
-df = df.sort_values(["linked_trip_id", "local_datetime_start"])
+if OD_PAIRS_FILE:
+    OD_PAIRS = load_od_pairs(OD_PAIRS_FILE, OD_PAIRS_MONTHS)
 
 # =========================
-# TRACT JOIN
+# INCREMENTAL（only OD pairs whose outputs are stale）
+# =========================
+LINK_FILES = [
+    f"{NETWORK_DIR}/auto-biggest-connected-graph/link.csv",
+    f"{NETWORK_DIR}/walk-biggest-connected-graph/link.csv",
+    f"{NETWORK_DIR}/UTA/link with flow.csv",
+]
+# .shp + .dbf/.shx/.prj sidecars
+TRACT_FILES = sorted(glob.glob(os.path.splitext(TRACT_SHP)[0] + ".*"))
+
+INPUTS = sorted(files) + LINK_FILES + TRACT_FILES
+PARAMS = {
+    "months": MONTHS, "max_dist_miles": MAX_DIST_MILES, "route_lods_m": ROUTE_LODS_M,
+    "json_indent": JSON_INDENT, "coord_decimals": COORD_DECIMALS,
+}
+
+def od_outputs(orig, dest):
+    outs = [f"{OUTPUT_DIR}/{orig}_to_{dest}.stats.json"]
+    if "json" in SAMPLE_FORMATS:
+        outs.append(f"{OUTPUT_DIR}/{orig}_to_{dest}.json")
+    if "polyline" in SAMPLE_FORMATS:
+        outs.append(f"{OUTPUT_DIR}/{orig}_to_{dest}{COMPACT_SUFFIX}")
+    return outs
+
+manifest = Manifest(MANIFEST_PATH)
+STALE_PAIRS = [
+    (o, d) for o, d in OD_PAIRS
+    if manifest.stale(od_outputs(o, d), INPUTS, PARAMS)
+]
+
+print(f"OD pairs to rebuild: {len(STALE_PAIRS)} / {len(OD_PAIRS)}")
+if not STALE_PAIRS:
+    sys.exit(0)
+
+# =========================
+# TRACTS（shapefile + geohash7 lookup, needed by every stage）
 # =========================
 tracts = gpd.read_file(TRACT_SHP).to_crs("EPSG:4326")
 tracts["GEOID"] = tracts["GEOID"].astype(str)
@@ -119,344 +220,370 @@ TRACT_GEOM = {
     for r in tracts.itertuples()
 }
 
-def gh_to_point(gh):
-    lat, lon = pgh.decode(gh)
-    return Point(lon, lat)
+# a sample needs both tract geometries to be drawn
+for o, d in STALE_PAIRS:
+    for tract in dict.fromkeys((o, d)):
+        if tract not in TRACT_GEOM:
+            print(f"[WARN] Tract {tract} not in {TRACT_SHP}, skipping OD pair {o} → {d}")
+STALE_PAIRS = [(o, d) for o, d in STALE_PAIRS if o in TRACT_GEOM and d in TRACT_GEOM]
+if not STALE_PAIRS:
+    sys.exit(0)
+
+# only geohashes never seen before are spatially joined
+tract_cache = GeohashTractCache(
+    TRACT_CACHE, tracts, tract_col="GEOID", predicate="within", index_path=TRACT_INDEX
+)
 
-gdf_o = gpd.GeoDataFrame(df, geometry=df["geohash7_orig"].apply(gh_to_point), crs="EPSG:4326")
-gdf_d = gpd.GeoDataFrame(df, geometry=df["geohash7_dest"].apply(gh_to_point), crs="EPSG:4326")
+def with_tracts(chunk):
+    tract_cache.update(chunk["geohash7_orig"])
+    tract_cache.update(chunk["geohash7_dest"])
+    chunk["GEOID_orig"] = tract_cache.map(chunk["geohash7_orig"]).values
+    chunk["GEOID_dest"] = tract_cache.map(chunk["geohash7_dest"]).values
+    return chunk
+
+# stage checkpoints are only reused for the same inputs, params and OD set
+pipe = CheckpointPipeline(
+    CHECKPOINT_DIR,
+    key=params_hash({
+        "inputs": [manifest.digest(p) for p in INPUTS],
+        "params": PARAMS,
+        "pairs": STALE_PAIRS,
+    }),
+    timer=timer
+)
 
-df["GEOID_orig"] = gpd.sjoin(gdf_o, tracts, how="left", predicate="within")["GEOID"].values
-df["GEOID_dest"] = gpd.sjoin(gdf_d, tracts, how="left", predicate="within")["GEOID"].values
+timer.stop(rows_out=len(tracts))
 
 # =========================
-# OD-FIRST FILTER
+# STAGE: TRACT JOIN（pass 1: key columns only, streamed）
 # =========================
-OD_SET = set(OD_PAIRS)
+@pipe.stage("tract_join")
+def tract_join():
+    timer.start("tract_join")
+    scanned_legs = 0
+
+    def key_chunks():
+        nonlocal scanned_legs
+        # end > start and non-null geohashes are pushed down to the scan
+        for chunk in iter_trip_batches(files, KEY_COLS, typed=True):
+            scanned_legs += len(chunk)
+            yield with_tracts(chunk)
+
+    od_ends = first_last_tracts(key_chunks())
+    tract_cache.save()
+    timer.stop(rows_in=scanned_legs, rows_out=len(od_ends))
+    return od_ends
 
-first = df.groupby("linked_trip_id").first()
-last = df.groupby("linked_trip_id").last()
-
-keep_ids = first.index[
-    [(o, d) in OD_SET for o, d in zip(first["GEOID_orig"], last["GEOID_dest"])]
-]
+# =========================
+# STAGE: OD-FIRST FILTER
+# =========================
+@pipe.stage("od_filter")
+def od_filter(tract_join):
+    timer.start("od_filter", rows_in=len(tract_join))
+    OD_SET = set(STALE_PAIRS)
 
-df = df[df["linked_trip_id"].isin(keep_ids)]
+    keep_ids = tract_join.index[
+        [(o, d) in OD_SET for o, d in zip(tract_join["GEOID_orig"], tract_join["GEOID_dest"])]
+    ]
+    timer.stop(rows_out=len(keep_ids))
+    return pd.DataFrame({"linked_trip_id": keep_ids})
 
 # =========================
-# BUILD GEOMETRY
+# STAGE: LOAD DATA（pass 2: selected linked trips only）
 # =========================
-auto_links = pd.read_csv(f"{BASE_DIR}/Salt_Lake/supplementInputs/network/auto-biggest-connected-graph/link.csv")
-walk_links = pd.read_csv(f"{BASE_DIR}/Salt_Lake/supplementInputs/network/walk-biggest-connected-graph/link.csv")
-transit_links = pd.read_csv(f"{BASE_DIR}/Salt_Lake/supplementInputs/network/UTA/link with flow.csv")
-
-auto_dict = {(int(r.from_osm_node_id), int(r.to_osm_node_id)): r.geometry for r in auto_links.itertuples()}
-walk_dict = {(int(r.from_osm_node_id), int(r.to_osm_node_id)): r.geometry for r in walk_links.itertuples()}
-transit_dict = {(int(r.from_node_id), int(r.to_node_id)): r.geometry for r in transit_links.itertuples()}
-
-def build_geometry(row):
-    nodes = [int(x) for x in str(row.route_taken).split(",") if x.strip().isdigit()]
-    if len(nodes) < 2:
-        return None
-
-    link_dict = (
-        auto_dict if row.travel_mode == "car"
-        else walk_dict if row.travel_mode == "walk/bike"
-        else transit_dict if row.travel_mode in ["bus", "rail"]
-        else None
+@pipe.stage("load")
+def load(od_filter):
+    timer.start("load")
+    df = read_trips(
+        files, USE_COLS,
+        extra_filter=lambda schema: isin_filter(schema, "linked_trip_id", od_filter["linked_trip_id"]),
+        typed=True, report=MEMORY_REPORT
     )
-    if link_dict is None:
-        return None
-
-    coords = []
-    for a, b in zip(nodes[:-1], nodes[1:]):
-        if (a, b) in link_dict:
-            try:
-                coords.extend(wkt.loads(link_dict[(a, b)]).coords)
-            except:
-                continue
+    df = df[df["local_datetime_end"] > df["local_datetime_start"]]
 
-    return LineString(coords) if len(coords) > 1 else None
-
-df["geometry"] = df.apply(build_geometry, axis=1)
-df = df[df["geometry"].notnull()]
-def haversine_miles(lon1, lat1, lon2, lat2):
-    R = 3958.8  # Earth radius in miles
-    lon1, lat1, lon2, lat2 = map(
-        np.radians, [lon1, lat1, lon2, lat2]
-    )
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = (
-        np.sin(dlat / 2) ** 2
-        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
-    )
-    return 2 * R * np.arcsin(np.sqrt(a))
+    df["duration_min"] = (
+        df["local_datetime_end"] - df["local_datetime_start"]
+    ).dt.total_seconds() / 60
 
-def leg_route_distance_ok(leg, max_dist_miles):
-    """
-    Check if origin/destination are close enough to route geometry
-    """
-    geom = leg.get("route")
-    if not geom or len(geom) < 2:
-        return False
-
-    # route geometry first/last point (lat, lon)
-    route_start_lat, route_start_lon = geom[0]
-    route_end_lat, route_end_lon = geom[-1]
-
-    # origin
-    o = leg["origin"]
-    d = leg["destination"]
-
-    if o["lat"] is None or o["lon"] is None:
-        return False
-    if d["lat"] is None or d["lon"] is None:
-        return False
-
-    dist_o = haversine_miles(
-        o["lon"], o["lat"],
-        route_start_lon, route_start_lat
-    )
-    dist_d = haversine_miles(
-        d["lon"], d["lat"],
-        route_end_lon, route_end_lat
-    )
+    df = df.sort_values(["linked_trip_id", "local_datetime_start"])
 
-    return dist_o <= max_dist_miles and dist_d <= max_dist_miles
+    df["GEOID_orig"] = tract_cache.map(df["geohash7_orig"]).values
+    df["GEOID_dest"] = tract_cache.map(df["geohash7_dest"]).values
+    timer.stop(rows_out=len(df))
+    return df
 
 # =========================
-# BUILD SAMPLES（🔒 对齐 leg 时间语义）
+# STAGE: BUILD GEOMETRY + FAR-CONNECTION FILTER
 # =========================
-def build_route(geom):
-    coords = [[lat, lon] for lon, lat in geom.coords if is_finite(lat) and is_finite(lon)]
-    return coords[::3] if len(coords) >= 2 else None
-
-samples = []
-
-for r in df.itertuples():
-    route = build_route(r.geometry)
-    if route is None:
-        continue
+@pipe.stage("geometry")
+def geometry(load):
+    timer.start("geometry", rows_in=len(load))
+    # link WKTs parsed once into flat arrays, then memory-mapped on later runs
+    geometry_engine = RouteGeometryEngine({
+        "auto": LinkGeometryTable.cached(
+            LINK_FILES[0], "from_osm_node_id", "to_osm_node_id", f"{NETWORK_CACHE_DIR}/auto"
+        ),
+        "walk": LinkGeometryTable.cached(
+            LINK_FILES[1], "from_osm_node_id", "to_osm_node_id", f"{NETWORK_CACHE_DIR}/walk"
+        ),
+        "transit": LinkGeometryTable.cached(
+            LINK_FILES[2], "from_node_id", "to_node_id", f"{NETWORK_CACHE_DIR}/transit"
+        ),
+    })
 
-    o_lon, o_lat = safe_decode_geohash(r.geohash7_orig)
-    d_lon, d_lat = safe_decode_geohash(r.geohash7_dest)
+    # repeated routes (same network + node sequence) are built once; the cache
+    # is only reused while the link files are unchanged
+    route_cache = RouteGeometryCache(
+        ROUTE_CACHE, ROUTE_CACHE_MAX,
+        signature=params_hash([manifest.digest(p) for p in LINK_FILES])
+    )
+    geoms = np.asarray(geometry_engine.build(
+        load["travel_mode"].to_numpy(),
+        load["route_taken"].to_numpy(),
+        cache=route_cache
+    ), dtype=object)
+    route_cache.save()
+    print("Route geometry cache: {hits} hits / {misses} built ({entries} cached)".format(**route_cache.stats()))
+
+    built = pd.notnull(geoms)
+    df = load[built].assign(geometry=geoms[built])
+
+    # linked_trip_id → (first GEOID_orig, last GEOID_dest) over legs with geometry
+    od_index = build_od_index(df)
+
+    # batch geohash decode (invalid → NaN → None)
+    df["o_lat"], df["o_lon"] = decode_geohashes(df["geohash7_orig"])
+    df["d_lat"], df["d_lon"] = decode_geohashes(df["geohash7_dest"])
+
+    # a leg passes if its origin / destination lie within MAX_DIST_MILES of
+    # the route's first / last point (missing coordinates → NaN → fail);
+    # a linked trip is kept only if ALL its legs with a route pass
+    has_route, route_ends = route_endpoints(df["geometry"].to_numpy())
+
+    legs = df[has_route]
+    dist_o = haversine_miles(legs["o_lon"].to_numpy(), legs["o_lat"].to_numpy(), route_ends[:, 1], route_ends[:, 0])
+    dist_d = haversine_miles(legs["d_lon"].to_numpy(), legs["d_lat"].to_numpy(), route_ends[:, 3], route_ends[:, 2])
+
+    leg_ok = pd.Series((dist_o <= MAX_DIST_MILES) & (dist_d <= MAX_DIST_MILES), index=legs.index)
+    trip_ok = leg_ok.groupby(legs["linked_trip_id"]).all()
+    legs = legs[legs["linked_trip_id"].isin(trip_ok.index[trip_ok.to_numpy()])]
+
+    od = od_index.reindex(legs["linked_trip_id"].to_numpy())
+    legs = legs.assign(od_orig=od["GEOID_orig"].to_numpy(), od_dest=od["GEOID_dest"].to_numpy())
+    timer.stop(rows_out=len(legs))
+    return gpd.GeoDataFrame(legs, geometry="geometry", crs="EPSG:4326")
 
-    start_dt = r.local_datetime_start
-    duration = clean_num(r.duration_min)
+# =========================
+# STAGE: BUILD LINKED TRIPS（🔒 对齐 leg 时间语义）
+# =========================
+def text_values(s):
+    """Column → objects, NA → None"""
+    s = s.astype(object)
+    return s.where(s.notna(), None)
+
+def num_values(s):
+    """Column → float64, unparsable / non-finite → NaN (= null)"""
+    x = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isfinite(x), x, np.nan)
+
+def mode_values(s):
+    """str(clean_str(mode)).lower().strip(), once per distinct value"""
+    codes, uniques = pd.factorize(s)
+    lookup = np.array([str(clean_str(m)).lower().strip() for m in uniques] + ["none"], dtype=object)
+    return lookup[codes]    # code -1 (missing) → last entry
+
+def legs_to_frame(legs):
+    return legs.assign(
+        route=[json.dumps(r) for r in legs["route"]],
+        route_lods=[json.dumps(r) for r in legs["route_lods"]],
+    )
 
-    end_dt = (
-        start_dt + timedelta(minutes=duration)
-        if start_dt is not None and duration is not None
-        else None
+def legs_from_frame(frame):
+    return frame.assign(
+        route=[json.loads(r) for r in frame["route"]],
+        route_lods=[json.loads(r) for r in frame["route_lods"]],
     )
 
-    samples.append({
-        "id": str(r.trip_id),
-        "mode": str(r.travel_mode).lower().strip(),
-        "route": route,
-        "start_time": to_iso(start_dt),
-        "end_time": to_iso(end_dt),          # 🔒 ALIGN
-        "duration_min": duration,            # 🔒 ALIGN
-        "network_distance_km": clean_num(r.network_distance),
-        "route_distance_km": clean_num(r.route_distance),
-        "origin": {
-            "lon": o_lon,
-            "lat": o_lat,
-            "geohash": r.geohash7_orig
-        },
-        "destination": {
-            "lon": d_lon,
-            "lat": d_lat,
-            "geohash": r.geohash7_dest
-        },
-        "access": {
-            "stop_id": clean_num(r.access_stop_id),
-            "stop_name": r.access_stop
-        },
-        "egress": {
-            "stop_id": clean_num(r.egress_stop_id),
-            "stop_name": r.egress_stop
-        },
-        "meta": {
-            "linked_trip_id": r.linked_trip_id,
-            "tour_id": r.tour_id,
-            "purpose": r.trip_purpose,
-            "weight": clean_num(r.trip_weight)
-        }
+@pipe.stage("assembly", to_frame=legs_to_frame, from_frame=legs_from_frame)
+def assembly(geometry):
+    timer.start("grouping", rows_in=len(geometry))
+
+    # one row per leg, columns already JSON-clean (NaN / None = null)
+    legs = pd.DataFrame({
+        "id": text_values(geometry["trip_id"]).astype(str).to_numpy(),
+        "mode": mode_values(geometry["travel_mode"]),
+        "local_datetime_start": geometry["local_datetime_start"].to_numpy(),
+        "duration_min": num_values(geometry["duration_min"]),
+        "network_distance_km": num_values(geometry["network_distance"]),
+        "route_distance_km": num_values(geometry["route_distance"]),
+        "orig_lon": num_values(geometry["o_lon"]),
+        "orig_lat": num_values(geometry["o_lat"]),
+        "orig_geohash": text_values(geometry["geohash7_orig"]).to_numpy(),
+        "dest_lon": num_values(geometry["d_lon"]),
+        "dest_lat": num_values(geometry["d_lat"]),
+        "dest_geohash": text_values(geometry["geohash7_dest"]).to_numpy(),
+        "access_stop_id": num_values(geometry["access_stop_id"]),
+        "access_stop_name": text_values(geometry["access_stop"]).to_numpy(),
+        "egress_stop_id": num_values(geometry["egress_stop_id"]),
+        "egress_stop_name": text_values(geometry["egress_stop"]).to_numpy(),
+        "linked_trip_id": geometry["linked_trip_id"].to_numpy(dtype=object),
+        "tour_id": text_values(geometry["tour_id"]).to_numpy(),
+        "purpose": text_values(geometry["trip_purpose"]).to_numpy(),
+        "weight": num_values(geometry["trip_weight"]),
+        "od_orig": geometry["od_orig"].to_numpy(dtype=object),
+        "od_dest": geometry["od_dest"].to_numpy(dtype=object),
+        "geometry": geometry["geometry"].to_numpy(),
     })
 
+    # exported linked trips only, trip by trip in export order (OD pair,
+    # weight desc); leg order by start time = the old ISO-string sort
+    legs = assemble_linked_trips(legs, STALE_PAIRS, order_by="local_datetime_start")
+
+    # routes of the exported legs, simplified at once (one list per LOD)
+    ROUTE_LODS = simplify_routes(legs["geometry"].to_numpy(), ROUTE_LODS_M)
+    legs["route"] = ROUTE_LODS[0]
+    legs["route_lods"] = [[lods[i] for lods in ROUTE_LODS[1:]] for i in range(len(legs))]
+
+    start = legs["local_datetime_start"].tolist()
+    duration = legs["duration_min"].tolist()
+    legs["start_time"] = [to_iso(t) for t in start]
+    legs["end_time"] = [                         # 🔒 ALIGN
+        to_iso(t + timedelta(minutes=d)) if d == d else None
+        for t, d in zip(start, duration)
+    ]
+
+    legs = legs[LEG_COLUMNS + TRIP_COLUMNS]
+    timer.stop(rows_out=int((legs["leg_index"] == 0).sum()))
+    return legs
+
 # =========================
-# GROUP + BUILD LINKED TRIPS（🔒 对齐 destination.end_time）
+# STAGE: OD STATS + MONTHLY SKETCHES
 # =========================
-groups = defaultdict(list)
-for s in samples:
-    groups[s["meta"]["linked_trip_id"]].append(s)
-
-linked_trips_full = []
-
-for lid, trips in groups.items():
-    trips = sorted(trips, key=lambda x: x["start_time"])
-    if not all(
-        leg_route_distance_ok(t, MAX_DIST_MILES)
-        for t in trips
-    ):
-        continue
-
-    for i, t in enumerate(trips):
-        t["leg_index"] = i
-
-    origin = {
-        **trips[0]["origin"],
-        "start_time": trips[0]["start_time"]
+def stats_to_frame(od_stats_by_pair):
+    rows = [(o, d, json.dumps(fields, allow_nan=False)) for (o, d), fields in od_stats_by_pair.items()]
+    return pd.DataFrame(rows, columns=["origin", "destination", "fields"])
+
+def stats_from_frame(frame):
+    return {
+        (o, d): json.loads(fields)
+        for o, d, fields in zip(frame["origin"], frame["destination"], frame["fields"])
     }
 
-    destination = {
-        **trips[-1]["destination"],
-        "end_time": trips[-1]["end_time"]    # 🔒 ALIGN（不再 fallback）
-    }
+@pipe.stage("stats", to_frame=stats_to_frame, from_frame=stats_from_frame)
+def stats(assembly):
+    legs = assembly
+    timer.start("stats", rows_in=int((legs["leg_index"] == 0).sum()))
 
-    transfers = [
-        {
-            "lat": t["destination"]["lat"],
-            "lon": t["destination"]["lon"],
-            "geohash": t["destination"]["geohash"]
-        }
-        for t in trips[:-1]
-        if t["destination"]["lat"] is not None and t["destination"]["lon"] is not None
-    ]
+    # duration / segments / modes / histogram for every OD in one grouped pass
+    OD_STATS = table_stats(trip_table(legs, STALE_PAIRS))
 
-    weight = max(t["meta"]["weight"] or 0 for t in trips)
+    # per-month sketches → year / any-range stats without reprocessing
+    os.makedirs(SKETCH_DIR, exist_ok=True)
+    months = trip_months(legs)
+    for label in MONTH_LABELS:
+        month_legs = legs if len(MONTH_LABELS) == 1 else legs[months == label]
+        sketch = ODSketch.from_table(trip_table(month_legs, STALE_PAIRS), [label])
 
-    linked_trips_full.append({
-        "linked_trip_id": lid,
-        "origin": origin,
-        "destination": destination,
-        "transfers": transfers,
-        "legs": trips,
-        "weight": weight
-    })
+        sketch_path = f"{SKETCH_DIR}/{label}.npz"
+        if os.path.exists(sketch_path):
+            sketch = ODSketch.load(sketch_path).update(sketch, pairs=STALE_PAIRS)
+        sketch.save(sketch_path)
 
-linked_trips_full = sorted(linked_trips_full, key=lambda x: -x["weight"])
+    timer.stop(rows_out=len(OD_STATS))
+    return OD_STATS
 
 # =========================
-# EXPORT（不变）
+# STAGE: EXPORT（不变）
 # =========================
-for ORIG, DEST in OD_PAIRS:
-    subset = [
-        lt for lt in linked_trips_full
-        if df.loc[df["linked_trip_id"] == lt["linked_trip_id"], "GEOID_orig"].iloc[0] == ORIG
-        and df.loc[df["linked_trip_id"] == lt["linked_trip_id"], "GEOID_dest"].iloc[-1] == DEST
-    ]
-
-    out = {
-        "schema": "nova.complete_trip.sample.v2",
-        "generated_at": datetime.utcnow().isoformat() + "Z",
-        "od": {
-            "origin": {
-                "tract_id": ORIG,
-                "geometry": TRACT_GEOM[ORIG]
+@pipe.stage("export", checkpoint=False)
+def export(assembly, stats):
+    legs, OD_STATS = assembly, stats
+    timer.start("export", rows_in=len(STALE_PAIRS))
+    pair_rows = pair_ranges(legs, STALE_PAIRS)
+
+    for ORIG, DEST in STALE_PAIRS:
+        # nested JSON objects only while writing, one linked trip at a time
+        first, end = pair_rows[(ORIG, DEST)]
+        subset = legs.iloc[first:end]
+        n_trips = int((subset["leg_index"] == 0).sum())
+
+        out = {
+            "schema": "nova.complete_trip.sample.v2",
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "od": {
+                "origin": {
+                    "tract_id": ORIG,
+                    "geometry": TRACT_GEOM[ORIG]
+                },
+                "destination": {
+                    "tract_id": DEST,
+                    "geometry": TRACT_GEOM[DEST]
+                }
             },
-            "destination": {
-                "tract_id": DEST,
-                "geometry": TRACT_GEOM[DEST]
-            }
-        },
-        "count": len(subset),
-        "linked_trips": subset
-    }
-
-    out_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}.json"
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(out, f, indent=2, allow_nan=False)
-
-    print(f"Saved {len(subset)} linked trips → {out_path}")
+            "count": n_trips,
+            "linked_trips": None
+        }
 
-    # =========================
-    # OD-LEVEL STATS (STRICTLY OLD DEFINITION)
-    # =========================
+        if "json" in SAMPLE_FORMATS:
+            out_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}.json"
+            out["linked_trips"] = linked_trip_records(subset, ROUTE_LODS_M[1:])
+            write_json(out, out_path, indent=JSON_INDENT, coord_decimals=COORD_DECIMALS)
 
-    if subset:
-        # 1️⃣ per linked trip aggregation
-        trip_durations = []
-        trip_segments = []
-        trip_modes = []
+            print(f"Saved {n_trips} linked trips → {out_path}")
 
-        for lt in subset:
-            legs = lt["legs"]
+        if "polyline" in SAMPLE_FORMATS:
+            out_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}{COMPACT_SUFFIX}"
+            out["linked_trips"] = linked_trip_records(subset, ROUTE_LODS_M[1:])
+            write_compact_sample(out, out_path, coord_decimals=COORD_DECIMALS)
 
-            # total duration = sum of leg durations
-            total_dur = sum(
-                leg["duration_min"]
-                for leg in legs
-                if leg["duration_min"] is not None
-            )
+            print(f"Saved {n_trips} linked trips (polyline) → {out_path}")
 
-            trip_durations.append(total_dur)
-            trip_segments.append(len(legs))
-            trip_modes.append(set(leg["mode"] for leg in legs))
+        # =========================
+        # OD-LEVEL STATS (STRICTLY OLD DEFINITION, all ODs computed at once)
+        # =========================
 
-        dur = np.array(trip_durations)
-        segments = np.array(trip_segments)
-        modes = trip_modes
+        if n_trips:
+            fields = OD_STATS[(ORIG, DEST)]
+            stats_out = {
+                "schema": "nova.complete_trip.od_stats.v1",
+                "generated_at": datetime.utcnow().isoformat() + "Z",
+                "od": {"origin": ORIG, "destination": DEST},
+                "coverage": {"temporal": COVERAGE_TEMPORAL, "spatial": "Salt Lake 6-county"},
+                **fields
+            }
 
-        def pct(a, q): return float(np.percentile(a, q))
+        else:
+            stats_out = {
+                "schema": "nova.complete_trip.od_stats.v1",
+                "generated_at": datetime.utcnow().isoformat() + "Z",
+                "od": {"origin": ORIG, "destination": DEST},
+                "coverage": {"temporal": COVERAGE_TEMPORAL, "spatial": "Salt Lake 6-county"},
+                "counts": {"linked_trips": 0},
+                "note": "No linked trips after distance + OD filter"
+            }
 
-        BIN_WIDTH = 5
-        MAX_TIME = 180
+        # 写 stats
+        stats_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}.stats.json"
+        write_json(stats_out, stats_path, indent=JSON_INDENT)
 
-        bins = np.arange(0, MAX_TIME + BIN_WIDTH, BIN_WIDTH)
-        dur_capped = np.clip(dur, 0, MAX_TIME)
-        hist_counts, bin_edges = np.histogram(dur_capped, bins=bins)
+        print(f"✓ Stats written → {stats_path}")
 
-        travel_time_hist = {
-            "bin_width_min": BIN_WIDTH,
-            "max_time_min": MAX_TIME,
-            "bin_edges_min": bin_edges.tolist(),
-            "counts": hist_counts.tolist()
-        }
+        for path in od_outputs(ORIG, DEST):
+            manifest.record(path, INPUTS, PARAMS)
 
-        stats = {
-            "schema": "nova.complete_trip.od_stats.v1",
-            "generated_at": datetime.utcnow().isoformat() + "Z",
-            "od": {"origin": ORIG, "destination": DEST},
-            "coverage": {"temporal": "year-2020", "spatial": "Salt Lake 6-county"},
-            "counts": {"linked_trips": int(len(dur))},
-            "trip_duration_min": {
-                "min": float(dur.min()),
-                "mean": float(dur.mean()),
-                "p25": pct(dur, 25),
-                "median": pct(dur, 50),
-                "p75": pct(dur, 75),
-                "max": float(dur.max())
-            },
-            "segments": {
-                "avg": float(segments.mean()),
-                "p75": int(pct(segments, 75)),
-                "max": int(segments.max())
-            },
-            "mode_involvement": {
-                "car": float(sum("car" in m for m in modes) / len(modes)),
-                "bus": float(sum("bus" in m for m in modes) / len(modes)),
-                "rail": float(sum("rail" in m for m in modes) / len(modes)),
-                "walk": float(sum("walk/bike" in m for m in modes) / len(modes))
-            },
-            "travel_time_distribution": travel_time_hist
-        }
+    manifest.save()
+    timer.stop(rows_out=int((legs["leg_index"] == 0).sum()))
 
-    else:
-        stats = {
-            "schema": "nova.complete_trip.od_stats.v1",
-            "generated_at": datetime.utcnow().isoformat() + "Z",
-            "od": {"origin": ORIG, "destination": DEST},
-            "coverage": {"temporal": "year-2020", "spatial": "Salt Lake 6-county"},
-            "counts": {"linked_trips": 0},
-            "note": "No linked trips after distance + OD filter"
-        }
+# =========================
+# RUN（resumes after the last valid checkpoint）
+# =========================
+pipe.run()
 
-    # 写 stats
-    stats_path = f"{OUTPUT_DIR}/{ORIG}_to_{DEST}.stats.json"
-    with open(stats_path, "w", encoding="utf-8") as f:
-        json.dump(stats, f, indent=2, allow_nan=False)
+# outputs are recorded in the manifest; checkpoints only serve failed runs
+if not KEEP_CHECKPOINTS:
+    pipe.clear()
 
-    print(f"✓ Stats written → {stats_path}")
+if RUN_REPORT:
+    timer.save(RUN_REPORT)
+    print(timer.summary())
+    print(f"✓ Run report → {RUN_REPORT}")
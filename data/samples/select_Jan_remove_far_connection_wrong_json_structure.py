@@ -15,6 +15,8 @@ TRACT_SHP = (
     f"{BASE_DIR}/Manuscript/Figure/Visualization-RL/"
     f"2-OD patterns by census track/six_counties_track.shp"
 )
+# geohash7 → GEOID lookup shared by all builders (grows incrementally)
+TRACT_CACHE = f"{BASE_DIR}/Salt_Lake/cache/geohash7_to_six_counties_track.parquet"
 
 MONTHS = ["Jan"]
 MAX_DIST_MILES = 1.0
@@ -45,15 +47,19 @@ OD_PAIRS = [
 import pandas as pd
 import numpy as np
 import geopandas as gpd
-import pygeohash as pgh
-from shapely.geometry import Point, LineString, mapping
+from shapely.geometry import LineString, mapping
 from shapely import wkt
 import glob
 import json
 import math
+import sys
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from tract_lookup import GeohashTractCache
+from geohash_codec import decode_geohashes
+
 # =========================
 # UTILS
 # =========================
@@ -75,15 +81,6 @@ def haversine_miles(lon1, lat1, lon2, lat2):
     a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
     return 2 * R * np.arcsin(np.sqrt(a))
 
-def safe_decode_geohash(gh):
-    try:
-        lat, lon = pgh.decode(gh)
-        if is_finite(lat) and is_finite(lon):
-            return lon, lat
-    except:
-        pass
-    return None, None
-
 def to_iso(t):
     return t.isoformat() if t is not None else None
 
@@ -128,15 +125,14 @@ TRACT_GEOM = {
     for r in tracts.itertuples()
 }
 
-def gh_to_point(gh):
-    lat, lon = pgh.decode(gh)
-    return Point(lon, lat)
-
-gdf_o = gpd.GeoDataFrame(df, geometry=df["geohash7_orig"].apply(gh_to_point), crs="EPSG:4326")
-gdf_d = gpd.GeoDataFrame(df, geometry=df["geohash7_dest"].apply(gh_to_point), crs="EPSG:4326")
+# only geohashes never seen before are spatially joined
+tract_cache = GeohashTractCache(TRACT_CACHE, tracts, tract_col="GEOID", predicate="within")
+tract_cache.update(df["geohash7_orig"])
+tract_cache.update(df["geohash7_dest"])
+tract_cache.save()
 
-df["GEOID_orig"] = gpd.sjoin(gdf_o, tracts, how="left", predicate="within")["GEOID"].values
-df["GEOID_dest"] = gpd.sjoin(gdf_d, tracts, how="left", predicate="within")["GEOID"].values
+df["GEOID_orig"] = tract_cache.map(df["geohash7_orig"]).values
+df["GEOID_dest"] = tract_cache.map(df["geohash7_dest"]).values
 
 # =========================
 # OD-FIRST FILTER
@@ -200,14 +196,18 @@ def build_route(geom):
     coords = [[lat, lon] for lon, lat in geom.coords if is_finite(lat) and is_finite(lon)]
     return coords[::3] if len(coords) >= 2 else None
 
+# batch geohash decode (invalid → NaN → None)
+df["o_lat"], df["o_lon"] = decode_geohashes(df["geohash7_orig"])
+df["d_lat"], df["d_lon"] = decode_geohashes(df["geohash7_dest"])
+
 samples = []
 for r in df.itertuples():
     route = build_route(r.geometry)
     if route is None:
         continue
 
-    o_lon, o_lat = safe_decode_geohash(r.geohash7_orig)
-    d_lon, d_lat = safe_decode_geohash(r.geohash7_dest)
+    o_lon, o_lat = clean_num(r.o_lon), clean_num(r.o_lat)
+    d_lon, d_lat = clean_num(r.d_lon), clean_num(r.d_lat)
 
     samples.append({
         "id": str(r.trip_id),
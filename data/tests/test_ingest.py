@@ -0,0 +1,61 @@
+# ============================================================
+# Streaming ingestion: typed schema of empty vs non-empty reads
+#
+#   python -m pytest data/tests
+# ============================================================
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from ingest import isin_filter, read_trips
+
+COLUMNS = [
+    "linked_trip_id", "travel_mode", "local_datetime_start", "local_datetime_end",
+    "network_distance", "geohash7_orig", "geohash7_dest", "trip_weight",
+]
+
+
+def write_month(path):
+    pd.DataFrame({
+        "linked_trip_id": ["a", "a", "b"],
+        "travel_mode": ["walk", "bus", "auto"],
+        "local_datetime_start": pd.to_datetime(["2020-01-02 08:00", "2020-01-02 08:10", "2020-01-02 09:00"]),
+        "local_datetime_end": pd.to_datetime(["2020-01-02 08:09", "2020-01-02 08:30", "2020-01-02 09:20"]),
+        "network_distance": [0.5, 2.0, 7.25],
+        "geohash7_orig": ["9x0abcd", "9x0abce", "9x0abcf"],
+        "geohash7_dest": ["9x0abce", "9x0abcf", "9x0abcd"],
+        "trip_weight": [1.0, 1.0, 2.5],
+    }).to_parquet(path, index=False)
+
+
+@pytest.mark.parametrize("typed", [True, False])
+def test_empty_read_keeps_schema(tmp_path, typed):
+    path = str(tmp_path / "part-0.parquet")
+    write_month(path)
+
+    full = read_trips([path], COLUMNS, typed=typed)
+    empty = read_trips(
+        [path], COLUMNS, typed=typed,
+        extra_filter=lambda schema: isin_filter(schema, "linked_trip_id", ["missing"])
+    )
+
+    assert len(full) == 3 and len(empty) == 0
+    assert list(empty.columns) == COLUMNS
+    assert empty.dtypes.astype(str).tolist() == full.dtypes.astype(str).tolist()
+
+    # what the builder's load stage does with the result
+    minutes = (empty["local_datetime_end"] - empty["local_datetime_start"]).dt.total_seconds() / 60
+    assert len(minutes) == 0
+
+
+def test_no_files_gives_typed_columns():
+    empty = read_trips([], COLUMNS, typed=True)
+
+    assert list(empty.columns) == COLUMNS
+    assert isinstance(empty["travel_mode"].dtype, pd.CategoricalDtype)
+    assert str(empty["network_distance"].dtype) == "float32"
+    assert pd.api.types.is_datetime64_any_dtype(empty["local_datetime_start"])
@@ -0,0 +1,107 @@
+# ============================================================
+# Incremental OD aggregation (manifest + geohash → tract lookup)
+# - Tiny synthetic delivery: one month, two tracts
+# - A changed tract layer must rebuild the month AND re-join its
+#   geohashes (the lookup must not keep the old assignments)
+#
+#   python -m pytest data/tests
+# ============================================================
+
+import os
+import sys
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely import box
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from geohash_codec import encode_geohashes
+from ingest import month_folders
+from manifest import Manifest
+from od_aggregate import aggregate_od_incremental, aggregate_od_months, stale_months
+from tract_lookup import GeohashTractCache
+
+WEST, EAST = (-111.95, -111.90), (-111.90, -111.85)
+LAT = (40.60, 40.65)
+
+
+def write_tracts(path, west_id, east_id):
+    gpd.GeoDataFrame(
+        {"GEOID": [west_id, east_id]},
+        geometry=[box(WEST[0], LAT[0], WEST[1], LAT[1]), box(EAST[0], LAT[0], EAST[1], LAT[1])],
+        crs="EPSG:4326"
+    ).to_file(path, driver="GeoJSON")
+
+
+def write_month(root):
+    month_dir = os.path.join(root, "Salt_Lake-2020-01")
+    os.makedirs(month_dir)
+    west, east = encode_geohashes([40.62, 40.63], [-111.93, -111.87])
+    pd.DataFrame({
+        "trip_id": ["t1", "t2", "t3"],
+        "linked_trip_id": ["a", "b", "b"],
+        "travel_mode": ["walk", "auto", "auto"],
+        "local_datetime_start": pd.to_datetime(["2020-01-02 08:00", "2020-01-02 09:00", "2020-01-02 09:30"]),
+        "trip_weight": [1.0, 2.0, 2.0],
+        "geohash7_orig": [west, east, east],
+        "geohash7_dest": [east, west, west],
+    }).to_parquet(os.path.join(month_dir, "part-0.parquet"), index=False)
+
+
+def run(tmp_path):
+    """One notebook-style incremental run → (months rebuilt, OD table)"""
+    census = tmp_path / "tracts.geojson"
+    lookup = str(tmp_path / "cache" / "geohash7_to_tract.parquet")
+    cache_dir = str(tmp_path / "cache" / "od_months")
+    month_files = month_folders(str(tmp_path / "delivery"))
+
+    tracts = gpd.read_file(census)
+    geohash2tract = GeohashTractCache(lookup, tracts, tract_col="GEOID", predicate="intersects")
+    manifest = Manifest(str(tmp_path / "cache" / "od_manifest.json"))
+
+    stale = stale_months(month_files, cache_dir, manifest, [str(census)], geohash2tract.signature)
+    for files in stale.values():
+        for f in files:
+            df = pd.read_parquet(f, columns=["geohash7_orig", "geohash7_dest"])
+            geohash2tract.update(df["geohash7_orig"])
+            geohash2tract.update(df["geohash7_dest"])
+    geohash2tract.save()
+
+    od, _ = aggregate_od_incremental(
+        month_files, lookup, cache_dir, manifest,
+        shared_inputs=[str(census)], workers=1, signature=geohash2tract.signature
+    )
+    pairs = od.set_index(["origin_tract", "destination_tract"])["unlinked_count"].to_dict()
+    return len(stale), pairs
+
+
+def test_tract_layer_change_rebuilds_with_new_tracts(tmp_path):
+    write_month(str(tmp_path / "delivery"))
+    write_tracts(tmp_path / "tracts.geojson", "W", "E")
+
+    assert run(tmp_path) == (1, {("E", "W"): 2, ("W", "E"): 1})
+    assert run(tmp_path) == (0, {("E", "W"): 2, ("W", "E"): 1})
+
+    # same geometries, new ids: every cached assignment is out of date
+    write_tracts(tmp_path / "tracts.geojson", "W2", "E2")
+    assert run(tmp_path) == (1, {("E2", "W2"): 2, ("W2", "E2"): 1})
+
+
+def test_lookup_of_another_layer_is_refused(tmp_path):
+    write_month(str(tmp_path / "delivery"))
+    write_tracts(tmp_path / "tracts.geojson", "W", "E")
+    run(tmp_path)
+
+    write_tracts(tmp_path / "tracts.geojson", "W2", "E2")
+    tracts = gpd.read_file(tmp_path / "tracts.geojson")
+    signature = GeohashTractCache(
+        str(tmp_path / "cache" / "unused.parquet"), tracts, tract_col="GEOID", predicate="intersects"
+    ).signature
+
+    with pytest.raises(ValueError):
+        aggregate_od_months(
+            month_folders(str(tmp_path / "delivery")),
+            str(tmp_path / "cache" / "geohash7_to_tract.parquet"),
+            workers=1, signature=signature
+        )
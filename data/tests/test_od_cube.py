@@ -0,0 +1,99 @@
+# ============================================================
+# OD Cube queries vs pandas on the source tables
+# - Sparse tables: most month / hour / mode / tract labels are
+#   unoccupied for any given slice
+#
+#   python -m pytest data/tests
+# ============================================================
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from od_cube import DIMS, MEASURES, TOTAL, ODCube
+
+TRACTS = [f"490351{k:05d}" for k in range(40)]
+
+
+def sparse_tables(seed=0, n=300):
+    """(monthly OD table, hourly OD table) with few occupied cells"""
+    rng = np.random.default_rng(seed)
+    hourly = pd.DataFrame({
+        "month": rng.choice(["2020-01", "2020-02", "2020-03"], n),
+        "hour": rng.choice([0, 7, 8, 17, 23], n),
+        "origin_tract": rng.choice(TRACTS, n),
+        "destination_tract": rng.choice(TRACTS[::3], n),
+        "travel_mode": rng.choice(["auto", "bus", "walk"], n),
+    }).drop_duplicates(["month", "hour", "origin_tract", "destination_tract", "travel_mode"])
+    for m in MEASURES:
+        hourly[m] = rng.integers(0, 5, len(hourly)).astype(np.float64)
+    hourly.loc[hourly.sample(frac=0.2, random_state=seed).index, "linked_count"] = np.nan
+
+    od = hourly.groupby(
+        ["month", "origin_tract", "destination_tract", "travel_mode"], as_index=False
+    )[MEASURES].sum(min_count=1)
+    return od, hourly.reset_index(drop=True)
+
+
+def expected(table, by, measure, **filters):
+    df = table.copy()
+    df[MEASURES] = df[MEASURES].fillna(0)
+    df[TOTAL] = df["linked_weighted_flow"] + df["unlinked_weighted_flow"]
+    for dim, want in filters.items():
+        df = df[df[DIMS[dim]].isin(np.atleast_1d(want))]
+    cols = [DIMS[d] for d in by]
+    return df.groupby(cols, as_index=False)[measure].sum()
+
+
+@pytest.mark.parametrize("by, measure, filters", [
+    (["hour"], TOTAL, {}),
+    (["origin"], TOTAL, {"month": "2020-02"}),
+    (["destination", "month"], "linked_count", {}),
+    (["hour", "mode"], TOTAL, {"origin": TRACTS[5]}),
+    (["origin", "destination"], "unlinked_count", {"mode": ["bus", "walk"], "hour": 8}),
+])
+def test_marginal_matches_groupby(by, measure, filters):
+    od, hourly = sparse_tables()
+    cube = ODCube.from_frames(od, hourly)
+
+    got = cube.marginal(by, measure, **filters)
+    table = hourly if "hour" in by or "hour" in filters else od
+    want = expected(table, by, measure, **filters)
+
+    assert list(got.columns) == list(want.columns)
+    for col in want.columns[:-1]:
+        assert got[col].astype(str).tolist() == want[col].astype(str).tolist()
+    np.testing.assert_allclose(got[measure].to_numpy(), want[measure].to_numpy())
+
+
+@pytest.mark.parametrize("per, filters", [
+    ("hour", {}),
+    ("hour", {"mode": "bus"}),
+    ("month", {}),
+    (None, {"hour": [7, 8]}),
+])
+def test_top_k_matches_sort(per, filters):
+    od, hourly = sparse_tables()
+    cube = ODCube.from_frames(od, hourly)
+
+    got = cube.top_k(3, per=per, **filters)
+
+    table = hourly if per == "hour" or "hour" in filters else od
+    df = table.copy()
+    df[MEASURES] = df[MEASURES].fillna(0)
+    df[TOTAL] = df["linked_weighted_flow"] + df["unlinked_weighted_flow"]
+    for dim, want in filters.items():
+        df = df[df[DIMS[dim]].isin(np.atleast_1d(want))]
+    df = df[df["origin_tract"] != df["destination_tract"]].reset_index(drop=True)
+
+    groups = [df] if per is None else [g for _, g in df.groupby(DIMS[per])]
+    picked = pd.concat([g.sort_values(TOTAL, ascending=False, kind="stable").head(3) for g in groups])
+    want = picked.sort_index().sort_values(TOTAL, ascending=False, kind="stable")
+
+    keys = ["month", "origin_tract", "destination_tract", "travel_mode"] + (["hour"] if "hour" in got else [])
+    assert got[keys].astype(str).values.tolist() == want[keys].astype(str).values.tolist()
+    np.testing.assert_allclose(got[TOTAL].to_numpy(), want[TOTAL].to_numpy())
@@ -0,0 +1,128 @@
+# ============================================================
+# Encoded-polyline sample payloads
+# - Reference vector of the polyline algorithm
+# - write_compact_sample → read_sample round trip: routes (every
+#   LOD) within the quantization step, all other fields unchanged
+#
+#   python -m pytest data/tests
+# ============================================================
+
+import json
+import os
+import sys
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from route_codec import (
+    COMPACT_SUFFIX, decode_polyline, encode_polyline, read_sample, write_compact_sample
+)
+from route_simplify import ROUTE_LOD_TOLERANCES_M, simplify_routes
+
+# the algorithm's published example
+REFERENCE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+REFERENCE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_reference_vector():
+    assert encode_polyline(REFERENCE_POINTS) == REFERENCE_POLYLINE
+    np.testing.assert_allclose(decode_polyline(REFERENCE_POLYLINE), REFERENCE_POINTS)
+
+
+def test_empty_route():
+    assert encode_polyline([]) == ""
+    assert decode_polyline("") == []
+
+
+def random_lines(seed=0, n=6):
+    """Wiggly (lon, lat) LineStrings around Salt Lake City"""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for k in range(n):
+        steps = rng.normal(0, 0.0004, (int(rng.integers(2, 200)), 2))
+        lines.append(shapely.linestrings(np.cumsum(steps, axis=0) + [-111.89 + k * 0.01, 40.76]))
+    return lines
+
+
+def sample_dict():
+    lods = simplify_routes(random_lines(), ROUTE_LOD_TOLERANCES_M)
+    legs = [
+        {
+            "id": f"leg{i}",
+            "mode": "walk",
+            "route": lods[0][i],
+            "route_lods": [
+                {"tolerance_m": tol, "route": lod[i]}
+                for tol, lod in zip(ROUTE_LOD_TOLERANCES_M[1:], lods[1:])
+            ],
+            "duration_min": 3.5 + i,
+            "origin": {"lon": -111.9, "lat": 40.7, "geohash": "9x0abcd"},
+            "meta": {"linked_trip_id": f"lt{i // 2}", "weight": None},
+        }
+        for i in range(len(lods[0]))
+    ]
+    # no route at all, and an empty one
+    legs.append({"id": "none", "mode": "bus", "route": None, "route_lods": [{"tolerance_m": 25.0, "route": None}]})
+    legs.append({"id": "empty", "mode": "bus", "route": [], "route_lods": [{"tolerance_m": 25.0, "route": []}]})
+
+    return {
+        "schema": "nova.complete_trip.sample.v2",
+        "od": {"origin": {"tract_id": "49035114000", "geometry": None}},
+        "count": 2,
+        "linked_trips": [
+            {"linked_trip_id": "lt0", "legs": legs[:3], "weight": 1.5},
+            {"linked_trip_id": "lt1", "legs": legs[3:], "weight": 0},
+        ],
+    }
+
+
+def routes_of(sample):
+    """Every route in the sample (leg routes and all LODs), in order"""
+    return [
+        obj["route"]
+        for lt in sample["linked_trips"]
+        for leg in lt["legs"]
+        for obj in [leg] + leg["route_lods"]
+    ]
+
+
+def without_routes(sample):
+    out = json.loads(json.dumps(sample))
+    for lt in out["linked_trips"]:
+        for leg in lt["legs"]:
+            for obj in [leg] + leg["route_lods"]:
+                obj["route"] = "<route>"
+    return out
+
+
+def test_compact_sample_round_trip(tmp_path):
+    sample = sample_dict()
+    path = str(tmp_path / f"a_to_b{COMPACT_SUFFIX}")
+
+    # linked trips streamed from a generator, as the builder does
+    write_compact_sample({**sample, "linked_trips": iter(sample["linked_trips"])}, path)
+    back = read_sample(path)
+
+    assert without_routes(back) == without_routes(sample)
+
+    before, after = routes_of(sample), routes_of(back)
+    assert len(before) == len(after)
+    assert any(r is None for r in before) and any(r == [] for r in before)
+    for r0, r1 in zip(before, after):
+        if r0 is None or r0 == []:
+            assert r1 == r0
+            continue
+        assert len(r1) == len(r0)
+        np.testing.assert_allclose(r1, r0, rtol=0, atol=1e-5)
+
+
+def test_every_lod_is_encoded(tmp_path):
+    path = str(tmp_path / f"a_to_b{COMPACT_SUFFIX}")
+    write_compact_sample(sample_dict(), path)
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    assert raw["route_encoding"]["format"] == "polyline"
+    encoded = [r for r in routes_of(raw) if r is not None]
+    assert encoded and all(isinstance(r, str) for r in encoded)